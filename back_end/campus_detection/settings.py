@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -243,6 +244,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'webapi.tasks.check_terminal_connections',
         'schedule': 60.0,  # 每分钟执行一次
     },
+    'generate_all_area_usage_patterns': {
+        'task': 'llm.tasks.generate_all_area_usage_patterns',
+        'schedule': crontab(hour=3, minute=0),  # 每天凌晨3点刷新全部区域使用模式
+    },
 }
 
 
@@ -0,0 +1,230 @@
+"""
+Agent 回答缓存
+- 缓存键 = 规范化问题 + 历史窗口摘要 + 模型类型 + 人流快照代次（occupancy epoch）
+- 命中时直接回放完整事件流，跳过规划/工具/生成
+- 任一区域人数相对代次基线变化超过阈值时递增代次，旧回答自然失效
+- 可选：配置本地向量模型后，用 numpy 余弦相似度匹配近似问题
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "llm_answer_cache:"
+EPOCH_KEY = CACHE_PREFIX + "occupancy_epoch"
+BASELINE_PREFIX = CACHE_PREFIX + "baseline:"
+
+ANSWER_TTL = int(os.getenv("LLM_ANSWER_CACHE_TTL", "600"))
+# 人数变化超过 max(绝对阈值, 基线 * 相对阈值) 时递增代次
+OCCUPANCY_ABS_THRESHOLD = int(os.getenv("LLM_ANSWER_CACHE_ABS_THRESHOLD", "5"))
+OCCUPANCY_REL_THRESHOLD = float(os.getenv("LLM_ANSWER_CACHE_REL_THRESHOLD", "0.2"))
+# 单条回答事件流的最大字节数，过大的不缓存
+MAX_ENTRY_BYTES = 256 * 1024
+# 参与缓存键的历史条数（与规划器使用的历史窗口一致）
+HISTORY_WINDOW = 5
+
+# 可选的语义匹配：未配置模型名时禁用
+EMBEDDING_MODEL = os.getenv("LLM_ANSWER_CACHE_EMBEDDING_MODEL", "")
+SIMILARITY_THRESHOLD = float(os.getenv("LLM_ANSWER_CACHE_SIMILARITY", "0.92"))
+SEMANTIC_INDEX_SIZE = 2000
+
+_PUNCT_RE = re.compile(r"[\s　,，.。!！?？;；:：、~～\"'“”‘’()（）【】\[\]]+")
+
+
+def normalize_query(text: str) -> str:
+    """全角转半角、小写、去除空白与标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCT_RE.sub("", text)
+
+
+def _history_digest(history: Optional[List[Dict]]) -> str:
+    window = []
+    for msg in (history or [])[-HISTORY_WINDOW:]:
+        if isinstance(msg, dict) and msg.get("content"):
+            window.append(f"{msg.get('role', '')}:{normalize_query(str(msg.get('content')))}")
+    if not window:
+        return "-"
+    return hashlib.md5("\n".join(window).encode("utf-8")).hexdigest()
+
+
+def get_occupancy_epoch() -> int:
+    try:
+        return int(cache.get(EPOCH_KEY) or 0)
+    except Exception:
+        return 0
+
+
+def _bump_epoch() -> None:
+    try:
+        cache.incr(EPOCH_KEY)
+    except ValueError:
+        cache.set(EPOCH_KEY, 1, timeout=None)
+
+
+def record_occupancy(area_id: int, count: int) -> bool:
+    """记录区域最新人数；相对基线变化超过阈值时递增代次，返回是否递增"""
+    key = f"{BASELINE_PREFIX}{area_id}"
+    try:
+        baseline = cache.get(key)
+        if baseline is None:
+            cache.set(key, count, timeout=None)
+            return False
+        threshold = max(OCCUPANCY_ABS_THRESHOLD, baseline * OCCUPANCY_REL_THRESHOLD)
+        if abs(count - baseline) < threshold:
+            return False
+        cache.set(key, count, timeout=None)
+        _bump_epoch()
+        _semantic_index.clear()
+        logger.debug(f"区域 {area_id} 人数 {baseline} -> {count}，回答缓存代次递增")
+        return True
+    except Exception as e:
+        logger.warning(f"更新人流快照代次失败: {e}")
+        return False
+
+
+class SemanticIndex:
+    """进程内向量索引：规范化问题向量 -> 精确缓存键前缀"""
+
+    def __init__(self, model_name: str, threshold: float, max_size: int):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.model = None
+        self.disabled = not model_name
+        self.vectors = None
+        self.entries: List[tuple] = []  # (scope, normalized_query)
+
+    def _encode(self, text: str):
+        if self.disabled:
+            return None
+        if self.model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(self.model_name)
+            except Exception as e:
+                logger.warning(f"加载向量模型失败，禁用语义缓存: {e}")
+                self.disabled = True
+                return None
+        import numpy as np
+        vector = np.asarray(self.model.encode(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, scope: str, normalized: str) -> None:
+        vector = self._encode(normalized)
+        if vector is None:
+            return
+        import numpy as np
+        with self.lock:
+            if (scope, normalized) in self.entries:
+                return
+            if self.vectors is None:
+                self.vectors = vector[np.newaxis, :]
+            else:
+                self.vectors = np.vstack([self.vectors, vector])
+            self.entries.append((scope, normalized))
+            if len(self.entries) > self.max_size:
+                self.vectors = self.vectors[-self.max_size:]
+                self.entries = self.entries[-self.max_size:]
+
+    def search(self, scope: str, normalized: str) -> Optional[str]:
+        """返回同一作用域内最相似且超过阈值的问题"""
+        if self.disabled or self.vectors is None:
+            return None
+        vector = self._encode(normalized)
+        if vector is None:
+            return None
+        import numpy as np
+        with self.lock:
+            if self.vectors is None:
+                return None
+            scores = self.vectors @ vector
+            mask = np.array([entry[0] == scope for entry in self.entries])
+            if not mask.any():
+                return None
+            scores = np.where(mask, scores, -1.0)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self.entries[best][1]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.vectors = None
+            self.entries = []
+
+
+_semantic_index = SemanticIndex(EMBEDDING_MODEL, SIMILARITY_THRESHOLD, SEMANTIC_INDEX_SIZE)
+
+
+class AnswerCache:
+    """单次请求的缓存句柄：先 lookup，未命中时在流结束后 store"""
+
+    def __init__(self, message: str, history: Optional[List[Dict]], model_type: Optional[str]):
+        self.normalized = normalize_query(message)
+        self.scope = f"{model_type or 'default'}:{get_occupancy_epoch()}:{_history_digest(history)}"
+
+    def _key(self, normalized: str) -> str:
+        digest = hashlib.md5(f"{self.scope}|{normalized}".encode("utf-8")).hexdigest()
+        return f"{CACHE_PREFIX}answer:{digest}"
+
+    def lookup(self) -> Optional[List[str]]:
+        """返回缓存的事件列表；先精确匹配，再尝试语义匹配"""
+        if not self.normalized:
+            return None
+        try:
+            events = cache.get(self._key(self.normalized))
+            if events is None:
+                similar = _semantic_index.search(self.scope, self.normalized)
+                if similar:
+                    events = cache.get(self._key(similar))
+            return events
+        except Exception as e:
+            logger.warning(f"读取回答缓存失败: {e}")
+            return None
+
+    def store(self, events: List[str]) -> None:
+        """仅缓存正常结束（无错误事件）的回答"""
+        if not self.normalized or not events:
+            return
+        size = 0
+        for event in events:
+            size += len(event)
+            if size > MAX_ENTRY_BYTES:
+                return
+            try:
+                if json.loads(event).get("type") == "error":
+                    return
+            except (TypeError, ValueError, AttributeError):
+                continue
+        try:
+            cache.set(self._key(self.normalized), events, timeout=ANSWER_TTL)
+            _semantic_index.add(self.scope, self.normalized)
+        except Exception as e:
+            logger.warning(f"写入回答缓存失败: {e}")
+
+
+def connect_occupancy_signals() -> None:
+    """新人流数据写入时更新代次基线"""
+    from django.apps import apps
+    from django.db.models.signals import post_save
+
+    historical_model = apps.get_model("webapi", "HistoricalData")
+
+    def _on_historical_saved(sender, instance, created, **kwargs):
+        if created:
+            record_occupancy(instance.area_id, instance.detected_count)
+
+    post_save.connect(_on_historical_saved, sender=historical_model, weak=False,
+                      dispatch_uid="llm_answer_cache_historical_save")
@@ -3,4 +3,12 @@ from django.apps import AppConfig
 
 class LlmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'llm'
\ No newline at end of file
+    name = 'llm'
+
+    def ready(self):
+        # 数据写入时使工具结果缓存失效
+        from .tool_cache import connect_invalidation_signals
+        connect_invalidation_signals()
+        # 人流数据明显变化时使回答缓存失效
+        from .answer_cache import connect_occupancy_signals
+        connect_occupancy_signals()
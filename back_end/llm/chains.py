@@ -10,6 +10,7 @@ from __future__ import annotations
 from typing import List, Dict, Any, AsyncGenerator, Optional
 import json
 import logging
+import os
 import asyncio
 
 from langchain.schema import SystemMessage, HumanMessage, AIMessage, BaseMessage
@@ -18,7 +19,9 @@ from langchain.prompts import ChatPromptTemplate
 from .utils import get_llm_client, stream_chat_response, run_llm_with_retry
 from .prompts import get_chat_prompt_with_history, get_agent_planner_prompt
 from .memory import ChatMemoryStore, normalize_frontend_history
+from .context import build_history_context, build_observation_context
 from . import tools as campus_tools
+from .intent_router import route_intent
 from channels.db import database_sync_to_async
 
 logger = logging.getLogger(__name__)
@@ -112,6 +115,62 @@ async def _execute_tool(tool_name: str, parameters: Dict[str, Any]) -> Dict[str,
         return {"error": str(e)}
 
 
+# 同一轮规划中并发执行的工具数量上限
+TOOL_CONCURRENCY = int(os.getenv("LLM_TOOL_CONCURRENCY", "4"))
+
+
+def _format_observation(index: int, tool_name: str, result: Dict[str, Any]) -> tuple:
+    """将工具执行结果转换为 (观察文本, 前端事件)"""
+    if result.get("success"):
+        # 将结果序列化，提供预览内容（避免过长）
+        try:
+            result_json = json.dumps(result["result"], ensure_ascii=False)
+        except Exception:
+            result_json = str(result.get("result"))
+        preview = result_json if len(result_json) <= 1200 else (result_json[:1200] + "...")
+        return f"工具 {tool_name} 执行成功，结果: {preview}", {
+            "type": "observation",
+            "index": index,
+            "tool": tool_name,
+            "success": True,
+            "content": f"✅ {tool_name} 执行成功",
+            "result_preview": preview
+        }
+    error_msg = result.get('error', '未知错误')
+    return f"工具 {tool_name} 执行失败: {error_msg}", {
+        "type": "observation",
+        "index": index,
+        "tool": tool_name,
+        "success": False,
+        "content": f"❌ {tool_name} 执行失败: {error_msg}",
+        "error": error_msg
+    }
+
+
+async def _execute_tools_concurrently(
+    tool_calls: List[Dict[str, Any]],
+    concurrency: int = TOOL_CONCURRENCY
+) -> AsyncGenerator[tuple, None]:
+    """并发执行一组工具调用，按完成顺序产出 (序号, 观察文本, 前端事件)"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _run(index: int, tool_call: Dict[str, Any]):
+        tool_name = tool_call.get("tool", "")
+        async with semaphore:
+            result = await _execute_tool(tool_name, tool_call.get("parameters", {}) or {})
+        return (index, *_format_observation(index, tool_name, result))
+
+    tasks = [asyncio.create_task(_run(index, tool_call)) for index, tool_call in enumerate(tool_calls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # 客户端中途断开时取消尚未完成的工具调用
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
 async def _llm_plan_next_action_streaming(
     user_input: str, 
     history: str, 
@@ -318,14 +377,10 @@ async def stream_route_and_respond(user_input: str, history: List[Dict] | None =
         planner_model = model_type if use_custom else "fast"
         generation_model = model_type if use_custom else "analysis"
 
-        # 准备历史信息
-        history_text = ""
-        if history:
-            for msg in history[-5:]:  # 限制历史长度
-                role = msg.get("role", "")
-                content = msg.get("content", "")
-                history_text += f"{role}: {content}\n"
+        # 准备历史信息：按 token 预算保留最近轮次，更早轮次压缩为摘要
+        history_text = build_history_context(history)
         
+        observation_blocks: List[str] = []
         observations = ""
         max_iterations = 3  # 最大迭代次数，防止无限循环
         iteration = 0
@@ -341,18 +396,24 @@ async def stream_route_and_respond(user_input: str, history: List[Dict] | None =
                 "model": planner_model  # 新增：标注使用的规划模型
             }, ensure_ascii=False) + "\n"
             
-            # 流式规划，实时输出思考过程
+            # 首轮先尝试规则快速路由，意图明确时跳过规划LLM
             plan = {}
-            async for event_type, data in _llm_plan_next_action_streaming(user_input, history_text, observations, planner_model):
-                if event_type == "thinking_chunk":
-                    # 输出实时思考过程
-                    yield json.dumps({
-                        "type": "planning_progress",
-                        "content": data
-                    }, ensure_ascii=False) + "\n"
-                elif event_type == "final_plan":
-                    plan = data
-                    break
+            routed = route_intent(user_input) if iteration == 1 else None
+            if routed:
+                plan = routed["plan"]
+                logger.info(f"快速路由命中: {routed['intent']} (置信度 {routed['confidence']:.2f})")
+            else:
+                # 流式规划，实时输出思考过程
+                async for event_type, data in _llm_plan_next_action_streaming(user_input, history_text, observations, planner_model):
+                    if event_type == "thinking_chunk":
+                        # 输出实时思考过程
+                        yield json.dumps({
+                            "type": "planning_progress",
+                            "content": data
+                        }, ensure_ascii=False) + "\n"
+                    elif event_type == "final_plan":
+                        plan = data
+                        break
             
             # 步骤3: 展示思考过程
             yield json.dumps({
@@ -370,60 +431,37 @@ async def stream_route_and_respond(user_input: str, history: List[Dict] | None =
                 "action": action,
                 "tool_calls": tool_calls,
                 "outline": outline,
-                "model": planner_model  # 新增：标注规划输出所用模型
+                "model": planner_model,  # 新增：标注规划输出所用模型
+                "router": "rule" if routed else "llm"
             }, ensure_ascii=False) + "\n"
             
             # 根据规划执行不同的行动
             if action == "call_tool":
-                used_fuzzy = False
-                
-                for tool_call in tool_calls:
-                    tool_name = tool_call.get("tool", "")
-                    parameters = tool_call.get("parameters", {})
-                    tool_reasoning = tool_call.get("reasoning", "")
-                    
+                # 先按规划顺序宣告所有工具调用
+                for index, tool_call in enumerate(tool_calls):
                     # 步骤4: 工具执行
                     yield json.dumps({
                         "type": "tool_execution",
-                        "tool": tool_name,
-                        "parameters": parameters,
-                        "message": f"🔧 执行工具: {tool_name}",
-                        "reasoning": tool_reasoning
+                        "index": index,
+                        "tool": tool_call.get("tool", ""),
+                        "parameters": tool_call.get("parameters", {}),
+                        "message": f"🔧 执行工具: {tool_call.get('tool', '')}",
+                        "reasoning": tool_call.get("reasoning", "")
                     }, ensure_ascii=False) + "\n"
-                    
-                    # 执行工具
-                    result = await _execute_tool(tool_name, parameters)
-                    
+
+                # 并发执行工具（受信号量限制），按完成顺序推送观察结果
+                step_observations: List[str] = [""] * len(tool_calls)
+                async for index, observation, event in _execute_tools_concurrently(tool_calls):
                     # 步骤5: 观察结果
-                    if result.get("success"):
-                        # 将结果序列化，提供预览内容（避免过长）
-                        try:
-                            result_json = json.dumps(result["result"], ensure_ascii=False)
-                        except Exception:
-                            result_json = str(result.get("result"))
-                        preview = result_json if len(result_json) <= 1200 else (result_json[:1200] + "...")
-                        observation = f"工具 {tool_name} 执行成功，结果: {preview}"
-                        yield json.dumps({
-                            "type": "observation",
-                            "tool": tool_name,
-                            "success": True,
-                            "content": f"✅ {tool_name} 执行成功",
-                            "result_preview": preview
-                        }, ensure_ascii=False) + "\n"
-                    else:
-                        error_msg = result.get('error', '未知错误')
-                        observation = f"工具 {tool_name} 执行失败: {error_msg}"
-                        yield json.dumps({
-                            "type": "observation", 
-                            "tool": tool_name,
-                            "success": False,
-                            "content": f"❌ {tool_name} 执行失败: {error_msg}",
-                            "error": error_msg
-                        }, ensure_ascii=False) + "\n"
-                        
-                    observations += observation + "\n"
-                    if tool_name.startswith("fuzzy_search"):
-                        used_fuzzy = True
+                    step_observations[index] = observation
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+
+                # 下一轮提示词中的观察结果保持规划顺序，保证结果可复现；整体受 token 预算限制
+                observation_blocks.extend(step_observations)
+                observations = build_observation_context(observation_blocks)
+                used_fuzzy = any(
+                    tool_call.get("tool", "").startswith("fuzzy_search") for tool_call in tool_calls
+                )
                 
                 # 判断是否需要继续规划
                 if used_fuzzy and iteration < max_iterations:
@@ -442,7 +480,8 @@ async def stream_route_and_respond(user_input: str, history: List[Dict] | None =
                 break
             
             else:
-                observations += f"未知行动类型: {action}\n"
+                observation_blocks.append(f"未知行动类型: {action}")
+                observations = build_observation_context(observation_blocks)
                 break
         
         # 步骤6: 生成最终回答
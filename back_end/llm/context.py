@@ -0,0 +1,124 @@
+"""
+上下文组装
+- 本地估算 token 数（无需分词器）：中日韩字符按 1 token 计，其余字符约 4 个计 1 token
+- 历史对话按预算打包：最近的轮次原文保留，更早的轮次滚动压缩为摘要行，超出部分丢弃
+- 工具观察结果按预算打包：新的观察优先完整保留，旧的观察截断
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional
+
+# 各部分的 token 预算
+HISTORY_TOKEN_BUDGET = 800
+OBSERVATION_TOKEN_BUDGET = 3000
+# 历史预算中留给更早轮次摘要的比例
+SUMMARY_BUDGET_RATIO = 0.25
+# 每条摘要行保留的最大 token 数
+SUMMARY_LINE_TOKENS = 40
+
+TRUNCATED_MARK = "…(已截断)"
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def _char_cost(ch: str) -> float:
+    return 1.0 if _CJK_RE.match(ch) else 0.25
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, mark: str = TRUNCATED_MARK) -> str:
+    """将文本截断到预算内（线性扫描），被截断时追加标记"""
+    if max_tokens <= 0 or not text:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(mark)
+    used = 0.0
+    for index, ch in enumerate(text):
+        used += _char_cost(ch)
+        if used > budget:
+            return text[:index] + mark
+    return text
+
+
+def _format_turn(message: Dict) -> Optional[str]:
+    role = message.get("role", "")
+    content = (message.get("content") or "").strip()
+    if not content:
+        return None
+    return f"{role}: {content}"
+
+
+def build_history_context(history: Optional[List[Dict]], budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    按 token 预算组装历史对话
+    从最新一轮向前原文保留，直到用完 (1 - SUMMARY_BUDGET_RATIO) 的预算；
+    之后的更早轮次各压缩为一行摘要，填满剩余预算后丢弃
+    """
+    turns = [turn for turn in (_format_turn(m) for m in (history or []) if isinstance(m, dict)) if turn]
+    if not turns:
+        return ""
+
+    verbatim_budget = int(budget * (1 - SUMMARY_BUDGET_RATIO))
+    recent: List[str] = []
+    used = 0
+    index = len(turns) - 1
+    while index >= 0:
+        cost = estimate_tokens(turns[index]) + 1
+        if used + cost > verbatim_budget:
+            # 最新一轮过长时截断保留，避免丢失当前话题
+            if not recent:
+                recent.append(truncate_to_tokens(turns[index], verbatim_budget))
+                used = estimate_tokens(recent[0]) + 1
+                index -= 1
+            break
+        recent.append(turns[index])
+        used += cost
+        index -= 1
+
+    summary_lines: List[str] = []
+    summary_budget = budget - used
+    while index >= 0 and summary_budget > 0:
+        line = truncate_to_tokens(turns[index], min(SUMMARY_LINE_TOKENS, summary_budget), mark="…")
+        cost = estimate_tokens(line) + 1
+        if not line or cost > summary_budget:
+            break
+        summary_lines.append(line)
+        summary_budget -= cost
+        index -= 1
+
+    parts = []
+    if summary_lines:
+        parts.append("更早对话摘要:\n" + "\n".join(f"- {line}" for line in reversed(summary_lines)))
+    parts.append("\n".join(reversed(recent)))
+    return "\n".join(parts) + "\n"
+
+
+def build_observation_context(blocks: List[str], budget: int = OBSERVATION_TOKEN_BUDGET) -> str:
+    """
+    按 token 预算组装工具观察结果（blocks 按产生顺序排列）
+    从最新的观察向前分配预算，超出预算的旧观察被截断或省略，输出保持原顺序
+    """
+    kept: List[str] = []
+    remaining = budget
+    for block in reversed([b for b in blocks if b]):
+        if remaining <= 0:
+            break
+        text = truncate_to_tokens(block, remaining)
+        if not text:
+            break
+        kept.append(text)
+        remaining -= estimate_tokens(text) + 1
+    omitted = len([b for b in blocks if b]) - len(kept)
+    lines = list(reversed(kept))
+    if omitted > 0:
+        lines.insert(0, f"（更早的 {omitted} 条观察结果因长度限制已省略）")
+    return "\n".join(lines) + ("\n" if lines else "")
@@ -0,0 +1,269 @@
+"""
+规则快速路由
+- 对常见、意图明确的问题（问候、身份、资源链接、推荐区域、区域是否拥挤、告警、指定终端状态）
+  直接给出与规划器相同格式的计划，跳过一次规划LLM调用
+- 关键词/正则给出基础置信度，可选的字符 n-gram 朴素贝叶斯分类器用于复核
+- 命中多个意图、问题过长或置信度不足时返回 None，交由LLM规划器处理
+"""
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+# 置信度达到该阈值才走快速路径
+FAST_PATH_THRESHOLD = 0.8
+# 超过该长度的问题通常包含复合需求，交给规划器
+MAX_FAST_PATH_LENGTH = 60
+
+# 建筑类型关键词（与工具的 category 枚举一致）
+CATEGORY_KEYWORDS = [
+    ("library", ("图书馆",)),
+    ("study", ("自习",)),
+    ("cafeteria", ("食堂", "餐厅", "饭堂")),
+    ("teaching", ("教学楼", "教室")),
+    ("dorm", ("宿舍", "公寓")),
+    ("lab", ("实验室", "实验楼")),
+    ("sports", ("体育", "运动", "健身", "球场")),
+    ("office", ("办公",)),
+]
+
+# 校园资源关键词（与 get_campus_resources 的关键词表对应）
+RESOURCE_KEYWORDS = (
+    "教务", "选课", "成绩", "课表", "研究生", "门户", "vpn", "学工", "奖学金",
+    "校园卡", "充值", "场地预约", "座位预约", "借书", "续借", "新闻", "通知",
+)
+
+_GREETING_RE = re.compile(r"^\s*(你好|您好|hi|hello|hey|嗨|哈喽|在吗|早上好|晚上好|下午好)[\s!！。~,，?？]*$", re.I)
+_IDENTITY_RE = re.compile(r"(你是谁|你叫什么|介绍一下你自己|你能做什么|你有什么功能|你会什么)")
+_LINK_RE = re.compile(r"(链接|网址|网站|入口|地址|怎么登录|在哪(里|儿)?(查|办|登录|预约))")
+_QUIET_RE = re.compile(r"(推荐|哪里|哪儿|哪个|找).{0,12}(人少|空闲|安静|不拥挤|人不多|有空位|空位)|(人少|空闲|安静|不拥挤)的.{0,8}(地方|区域|自习室|教室|图书馆|食堂)")
+_RECOMMEND_RE = re.compile(r"^(请|帮我|给我)?推荐(一下|一个|几个|个)?(?P<target>[^，,。？?！!\s]{1,8})[\s。!！?？]*$")
+_OCCUPANCY_RE = re.compile(
+    r"^(请问|现在|目前)?(?P<area>[^，,。？?！!\s]{1,12}?)(现在|目前|这会儿|此刻)?的?"
+    r"(人多吗|人多不多|人多么|挤吗|挤不挤|拥挤吗|拥不拥挤|人满了吗)[\s。!！?？]*$"
+)
+_ALERT_RE = re.compile(r"(告警|报警|警报|异常情况)")
+_TERMINAL_RE = re.compile(r"终端\s*#?\s*(\d+)")
+_STATUS_WORDS_RE = re.compile(r"(状态|运行|在线|离线|cpu|内存|磁盘|怎么样|情况)", re.I)
+
+
+class NgramIntentClassifier:
+    """字符 n-gram 朴素贝叶斯分类器，用少量种子语料复核规则结果"""
+
+    def __init__(self, n: int = 2, alpha: float = 1.0):
+        self.n = n
+        self.alpha = alpha
+        self.class_counts: Counter = Counter()
+        self.gram_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.vocab: set = set()
+
+    def _grams(self, text: str) -> List[str]:
+        text = f"^{text.strip().lower()}$"
+        return [text[i:i + self.n] for i in range(max(1, len(text) - self.n + 1))]
+
+    def fit(self, samples: Dict[str, List[str]]) -> "NgramIntentClassifier":
+        for label, texts in samples.items():
+            for text in texts:
+                grams = self._grams(text)
+                self.class_counts[label] += 1
+                self.gram_counts[label].update(grams)
+                self.vocab.update(grams)
+        return self
+
+    def predict(self, text: str) -> tuple:
+        """返回 (最可能的意图, 后验概率)"""
+        if not self.class_counts:
+            return None, 0.0
+        grams = self._grams(text)
+        total = sum(self.class_counts.values())
+        vocab_size = len(self.vocab) or 1
+        scores = {}
+        for label, count in self.class_counts.items():
+            gram_total = sum(self.gram_counts[label].values())
+            score = math.log(count / total)
+            for gram in grams:
+                score += math.log((self.gram_counts[label][gram] + self.alpha) / (gram_total + self.alpha * vocab_size))
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        peak = scores[best]
+        norm = sum(math.exp(v - peak) for v in scores.values())
+        return best, 1.0 / norm
+
+
+# 种子语料：每类少量典型问法
+SEED_SAMPLES = {
+    "greeting": ["你好", "您好", "hello", "在吗", "嗨", "早上好"],
+    "identity": ["你是谁", "你叫什么名字", "介绍一下你自己", "你能做什么", "你有什么功能"],
+    "resources": ["教务系统的网址是什么", "校园卡在哪里充值", "选课入口在哪", "vpn怎么登录", "图书馆座位预约链接", "学工系统地址"],
+    "quiet_areas": ["推荐一个人少的自习室", "哪里的图书馆人少", "现在哪个食堂不拥挤", "找个安静的地方学习", "哪儿有空位",
+                    "推荐自习室", "推荐一个图书馆", "推荐几个食堂"],
+    "area_occupancy": ["图书馆现在人多吗", "食堂人多吗", "二食堂挤吗", "自习室人多不多", "一教现在拥挤吗", "体育馆人满了吗"],
+    "alerts": ["最近有什么告警", "有没有报警信息", "查看最新警报", "最近有异常情况吗"],
+    "terminal_status": ["终端1状态怎么样", "终端2在线吗", "终端3的cpu和内存", "查看终端1运行情况"],
+    "other": ["图书馆三楼现在多少人", "帮我分析一下今天的人流趋势", "明天会下雨吗", "写一首诗", "二食堂温度多少", "对比一下两个自习室"],
+}
+
+_classifier: Optional[NgramIntentClassifier] = None
+
+
+def get_classifier() -> NgramIntentClassifier:
+    """惰性构建分类器"""
+    global _classifier
+    if _classifier is None:
+        _classifier = NgramIntentClassifier().fit(SEED_SAMPLES)
+    return _classifier
+
+
+def _detect_category(text: str) -> Optional[str]:
+    for category, words in CATEGORY_KEYWORDS:
+        if any(word in text for word in words):
+            return category
+    return None
+
+
+def _is_bare_category(text: str) -> bool:
+    """文本只是建筑类型名（如“食堂”“自习室”），没有指明具体区域"""
+    return any(text.replace(word, "", 1) in ("", "室", "楼", "馆", "区")
+               for _, words in CATEGORY_KEYWORDS for word in words if word in text)
+
+
+def _match_rules(text: str) -> List[Dict[str, Any]]:
+    """返回所有命中的规则意图及其计划"""
+    lowered = text.lower()
+    matches = []
+
+    if _GREETING_RE.match(text):
+        matches.append({
+            "intent": "greeting",
+            "confidence": 0.95,
+            "plan": {
+                "reasoning": "用户在打招呼，无需调用工具",
+                "action": "direct_response",
+                "tool_calls": [],
+                "outline": ["友好地回应问候", "简要说明可以提供的帮助（人流查询、环境监测、资源导航等）"],
+            },
+        })
+
+    if _IDENTITY_RE.search(text):
+        matches.append({
+            "intent": "identity",
+            "confidence": 0.9,
+            "plan": {
+                "reasoning": "用户询问助手身份与能力",
+                "action": "call_tool",
+                "tool_calls": [{"tool": "get_general_campus_info", "parameters": {}, "reasoning": "获取助手身份与能力说明"}],
+                "outline": ["介绍助手身份", "列出主要能力", "给出提问示例"],
+            },
+        })
+
+    keyword = next((word for word in RESOURCE_KEYWORDS if word in lowered), None)
+    if keyword and _LINK_RE.search(text):
+        matches.append({
+            "intent": "resources",
+            "confidence": 0.9,
+            "plan": {
+                "reasoning": f"用户需要“{keyword}”相关的校园服务入口",
+                "action": "call_tool",
+                "tool_calls": [{"tool": "get_campus_resources", "parameters": {"query": keyword}, "reasoning": "查询校园服务资源链接"}],
+                "outline": ["给出对应服务名称与链接", "说明用途", "必要时提示需校内网络或VPN"],
+            },
+        })
+
+    recommend_match = _RECOMMEND_RE.match(text)
+    recommend_category = _detect_category(recommend_match.group("target")) if recommend_match else None
+    if _QUIET_RE.search(text) or recommend_category:
+        category = _detect_category(text)
+        parameters: Dict[str, Any] = {"limit": 5}
+        if category:
+            parameters["category"] = category
+        matches.append({
+            "intent": "quiet_areas",
+            "confidence": 0.85 if category else 0.8,
+            "plan": {
+                "reasoning": "用户希望找到当前人少、适合前往的区域",
+                "action": "call_tool",
+                "tool_calls": [{"tool": "get_suggested_areas", "parameters": parameters, "reasoning": "按实际人流负荷推荐区域"}],
+                "outline": ["列出人流最少的几个区域", "给出当前人数与负荷比例", "给出前往建议"],
+            },
+        })
+
+    occupancy_match = _OCCUPANCY_RE.match(text)
+    if occupancy_match:
+        area_text = occupancy_match.group("area")
+        category = _detect_category(area_text)
+        if category and _is_bare_category(area_text):
+            # 只说了建筑类型（如“图书馆”“食堂”），列出该类型所有区域的人流负荷
+            tool_call = {"tool": "get_suggested_areas", "parameters": {"limit": 10, "category": category},
+                         "reasoning": "获取该类型各区域的当前人数与负荷"}
+        else:
+            parameters = {"query": area_text}
+            if category:
+                parameters["category"] = category
+            tool_call = {"tool": "fuzzy_search_areas", "parameters": parameters,
+                         "reasoning": "搜索区域并获取当前人数与容量"}
+        matches.append({
+            "intent": "area_occupancy",
+            "confidence": 0.85,
+            "plan": {
+                "reasoning": f"用户询问“{area_text}”当前是否拥挤",
+                "action": "call_tool",
+                "tool_calls": [tool_call],
+                "outline": ["给出当前人数与容量", "按负荷比例判断是否拥挤", "拥挤时建议同类型人少的区域"],
+            },
+        })
+
+    if _ALERT_RE.search(text) and not _TERMINAL_RE.search(text):
+        matches.append({
+            "intent": "alerts",
+            "confidence": 0.85,
+            "plan": {
+                "reasoning": "用户询问最新告警信息",
+                "action": "call_tool",
+                "tool_calls": [{"tool": "get_recent_alerts", "parameters": {"limit": 10}, "reasoning": "获取最新告警列表"}],
+                "outline": ["按时间列出最新告警", "标注告警等级与是否已处理", "给出处理建议"],
+            },
+        })
+
+    terminal_match = _TERMINAL_RE.search(text)
+    if terminal_match and _STATUS_WORDS_RE.search(text):
+        terminal_id = int(terminal_match.group(1))
+        matches.append({
+            "intent": "terminal_status",
+            "confidence": 0.9,
+            "plan": {
+                "reasoning": f"用户询问终端 {terminal_id} 的运行状态",
+                "action": "call_tool",
+                "tool_calls": [{"tool": "get_terminal_status", "parameters": {"terminal_id": terminal_id}, "reasoning": "获取终端运行状态"}],
+                "outline": ["说明终端在线状态", "给出CPU/内存/磁盘使用情况", "列出下属节点状态"],
+            },
+        })
+
+    return matches
+
+
+def route_intent(user_input: str, use_classifier: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    快速路由：返回 {"intent", "confidence", "plan"}；不确定时返回 None
+    """
+    text = (user_input or "").strip()
+    if not text or len(text) > MAX_FAST_PATH_LENGTH:
+        return None
+
+    matches = _match_rules(text)
+    # 多个意图同时命中说明是复合需求，交给规划器
+    if len(matches) != 1:
+        return None
+    match = matches[0]
+
+    if use_classifier:
+        label, prob = get_classifier().predict(text)
+        if label == match["intent"]:
+            match["confidence"] = min(0.99, match["confidence"] + 0.05 * prob)
+        elif label == "other" and prob > 0.6:
+            match["confidence"] -= 0.2
+
+    if match["confidence"] < FAST_PATH_THRESHOLD:
+        return None
+    return match
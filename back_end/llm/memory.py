@@ -1,13 +1,13 @@
 """
 会话记忆模块
-- 提供基于缓存的轻量记忆
+- 基于 Redis 原生 list 的轻量记忆：追加与裁剪在同一事务管道中原子完成
 - 可选持久化到数据库（使用 GeneratedContent 作为简单备份示例）
 """
 from __future__ import annotations
 
 from typing import List, Dict, Optional
-from django.core.cache import cache
 from django.utils import timezone
+from django_redis import get_redis_connection
 import json
 import logging
 
@@ -25,45 +25,72 @@ MAX_HISTORY = 20
 
 
 class ChatMemoryStore:
-    """简单的聊天记忆存取封装"""
+    """聊天记忆存取封装（每个会话一个有上限的 Redis list，最新消息在表尾）"""
 
     @staticmethod
     def _key(session_id: str) -> str:
-        return f"{CACHE_PREFIX}{session_id}"
+        return f"{CACHE_PREFIX}list:{session_id}"
+
+    @staticmethod
+    def _decode(raw_items) -> List[Dict]:
+        history = []
+        for raw in raw_items:
+            try:
+                history.append(json.loads(raw))
+            except (TypeError, ValueError):
+                continue
+        return history
 
     @classmethod
-    def get_history(cls, session_id: str) -> List[Dict]:
-        data = cache.get(cls._key(session_id))
-        if not data:
-            return []
+    def get_history(cls, session_id: str, limit: int = MAX_HISTORY) -> List[Dict]:
         try:
-            return json.loads(data)
-        except Exception:
+            conn = get_redis_connection("default")
+            return cls._decode(conn.lrange(cls._key(session_id), -limit, -1))
+        except Exception as e:
+            logger.warning(f"读取会话记忆失败: {e}")
             return []
 
     @classmethod
-    def append(cls, session_id: str, role: str, content: str, ttl: int = DEFAULT_TTL_SEC) -> List[Dict]:
-        history = cls.get_history(session_id)
-        history.append({"role": role, "content": content, "ts": timezone.now().isoformat()})
-        # 裁剪长度
-        if len(history) > MAX_HISTORY:
-            history = history[-MAX_HISTORY:]
-        cache.set(cls._key(session_id), json.dumps(history, ensure_ascii=False), ttl)
-        return history
+    def append(cls, session_id: str, role: str, content: str, ttl: int = DEFAULT_TTL_SEC) -> int:
+        """追加一条消息（RPUSH + LTRIM + EXPIRE 原子完成），返回当前条数"""
+        entry = json.dumps({"role": role, "content": content, "ts": timezone.now().isoformat()}, ensure_ascii=False)
+        try:
+            key = cls._key(session_id)
+            pipe = get_redis_connection("default").pipeline(transaction=True)
+            pipe.rpush(key, entry)
+            pipe.ltrim(key, -MAX_HISTORY, -1)
+            pipe.expire(key, ttl)
+            pipe.llen(key)
+            return pipe.execute()[-1]
+        except Exception as e:
+            logger.warning(f"写入会话记忆失败: {e}")
+            return 0
 
     @classmethod
     def set_history(cls, session_id: str, history: List[Dict], ttl: int = DEFAULT_TTL_SEC):
         # 只保留必要字段
         compact = [
-            {"role": h.get("role"), "content": h.get("content"), "ts": h.get("ts")}
+            json.dumps({"role": h.get("role"), "content": h.get("content"), "ts": h.get("ts")}, ensure_ascii=False)
             for h in history[-MAX_HISTORY:]
             if h.get("role") in ("user", "assistant") and h.get("content")
         ]
-        cache.set(cls._key(session_id), json.dumps(compact, ensure_ascii=False), ttl)
+        try:
+            key = cls._key(session_id)
+            pipe = get_redis_connection("default").pipeline(transaction=True)
+            pipe.delete(key)
+            if compact:
+                pipe.rpush(key, *compact)
+                pipe.expire(key, ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"覆盖会话记忆失败: {e}")
 
     @classmethod
     def clear(cls, session_id: str):
-        cache.delete(cls._key(session_id))
+        try:
+            get_redis_connection("default").delete(cls._key(session_id))
+        except Exception as e:
+            logger.warning(f"清除会话记忆失败: {e}")
 
     @classmethod
     def persist_snapshot(cls, session_id: str, tag: str = ""):
@@ -1,19 +1,22 @@
 from celery import shared_task
 from django.conf import settings
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 import logging
 import asyncio
 import pandas as pd
 import numpy as np
-from django.db.models import Avg, Count
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
 import os
 import re
 
 # 使用我们的工具函数替代直接导入ChatOpenAI
-from .utils import get_llm_client, run_llm_with_retry
+from .utils import get_llm_client, run_llm_with_retry, AsyncRateLimiter, close_loop_clients
 
 from webapi.models import Area, Alert, HistoricalData, TemperatureHumidityData, CustomUser
 from .models import LLMAnalysis, AlertAnalysis, AreaUsagePattern, GeneratedContent, UserRecommendation
@@ -257,21 +260,199 @@ async def generate_analysis_text(area_name, analysis_data):
     # 使用我们的重试工具函数
     return await run_llm_with_retry(messages, temperature=0.3)
 
-@shared_task
-def analyze_area_data(area_id):
-    """分析区域数据并生成报告"""
+def _resolve_alert_level(crowd_analysis, env_analysis):
+    """确定整体警报状态（保存为字符串枚举：normal|warning|critical）"""
+    alert_messages = []
+    levels = []
+
+    # crowd level
+    if crowd_analysis.get("status") in ("warning", "critical"):
+        levels.append(crowd_analysis.get("status"))
+        alert_messages.append(crowd_analysis.get("message"))
+
+    # temperature level
+    temp_status = env_analysis["temperature"].get("status")
+    if temp_status in ("warning_low", "warning_high", "critical_low", "critical_high"):
+        levels.append("critical" if temp_status.startswith("critical") else "warning")
+        alert_messages.append(env_analysis["temperature"].get("message"))
+
+    # humidity level
+    hum_status = env_analysis["humidity"].get("status")
+    if hum_status in ("warning_low", "warning_high", "critical_low", "critical_high"):
+        levels.append("critical" if hum_status.startswith("critical") else "warning")
+        alert_messages.append(env_analysis["humidity"].get("message"))
+
+    if "critical" in levels:
+        alert_level = "critical"
+    elif "warning" in levels:
+        alert_level = "warning"
+    else:
+        alert_level = "normal"
+    return alert_level, "; ".join(m for m in alert_messages if m) if alert_messages else None
+
+
+def _series_stats(df, column):
+    """按区域聚合某一列（忽略空值）：最新值、均值、最大、最小"""
+    sub = df.dropna(subset=[column])
+    if sub.empty:
+        return pd.DataFrame(columns=["current", "average", "max", "min"])
+    return sub.groupby("area_id", sort=False)[column].agg(
+        current="last", average="mean", max="max", min="min"
+    )
+
+
+def compute_area_statistics(area_ids, hours=24):
+    """
+    批量计算多个区域的人流与温湿度统计
+    两次查询取出全部数据，用 pandas 分组聚合代替逐区域的 Python 循环；
+    返回 {area_id: (crowd_analysis, env_analysis)}，格式与单区域分析函数一致
+    """
+    area_ids = list(area_ids)
+    time_threshold = datetime.now() - timedelta(hours=hours)
+    results = {}
+
+    # 人流量
+    crowd_df = pd.DataFrame.from_records(
+        HistoricalData.objects.filter(area_id__in=area_ids, timestamp__gte=time_threshold)
+        .order_by("area_id", "timestamp").values_list("area_id", "detected_count"),
+        columns=["area_id", "detected_count"],
+    )
+    crowd_stats = {}
+    if not crowd_df.empty:
+        grouped = crowd_df.groupby("area_id", sort=False)["detected_count"]
+        stats = grouped.agg(current="last", average="mean", max="max", min="min", data_points="size")
+        # 趋势：最近3条与最早3条的均值比较
+        earlier = crowd_df[grouped.cumcount() < 3].groupby("area_id")["detected_count"].mean()
+        recent = crowd_df[grouped.cumcount(ascending=False) < 3].groupby("area_id")["detected_count"].mean()
+        enough = stats["data_points"] >= 3
+        stats["trend"] = np.select(
+            [enough & (recent > earlier * 1.2), enough & (recent < earlier * 0.8)],
+            ["increasing", "decreasing"], default="stable",
+        )
+        stats["status"] = np.select(
+            [stats["current"] >= ANALYSIS_CONFIG["crowd"]["critical_threshold"],
+             stats["current"] >= ANALYSIS_CONFIG["crowd"]["warning_threshold"]],
+            ["critical", "warning"], default="normal",
+        )
+        crowd_stats = stats.to_dict("index")
+
+    crowd_messages = {
+        "critical": "Critically high crowd level detected",
+        "warning": "High crowd level detected",
+        "normal": "Normal crowd levels",
+    }
+
+    # 温湿度
+    env_df = pd.DataFrame.from_records(
+        TemperatureHumidityData.objects.filter(area_id__in=area_ids, timestamp__gte=time_threshold)
+        .order_by("area_id", "timestamp").values_list("area_id", "temperature", "humidity"),
+        columns=["area_id", "temperature", "humidity"],
+    )
+    temp_stats, humidity_stats = {}, {}
+    if not env_df.empty:
+        env_df[["temperature", "humidity"]] = env_df[["temperature", "humidity"]].astype(float)
+        temp_cfg = ANALYSIS_CONFIG["temperature"]
+        temps = _series_stats(env_df, "temperature")
+        if not temps.empty:
+            temps["status"] = np.select(
+                [temps["current"] <= temp_cfg["critical_low"], temps["current"] >= temp_cfg["critical_high"],
+                 temps["current"] <= temp_cfg["warning_low"], temps["current"] >= temp_cfg["warning_high"]],
+                ["critical_low", "critical_high", "warning_low", "warning_high"], default="comfortable",
+            )
+            temp_stats = temps.to_dict("index")
+        hum_cfg = ANALYSIS_CONFIG["humidity"]
+        hums = _series_stats(env_df, "humidity")
+        if not hums.empty:
+            hums["status"] = np.select(
+                [hums["current"] <= hum_cfg["warning_low"], hums["current"] >= hum_cfg["warning_high"]],
+                ["warning_low", "warning_high"], default="comfortable",
+            )
+            humidity_stats = hums.to_dict("index")
+
+    env_messages = {
+        "temperature": {
+            "critical_low": "Critically low temperature detected",
+            "critical_high": "Critically high temperature detected",
+            "warning_low": "Low temperature detected",
+            "warning_high": "High temperature detected",
+            "comfortable": "Temperature is within comfortable range",
+        },
+        "humidity": {
+            "warning_low": "Low humidity detected",
+            "warning_high": "High humidity detected",
+            "comfortable": "Humidity is within comfortable range",
+        },
+    }
+
+    def _env_entry(kind, row):
+        return {
+            "current": float(row["current"]),
+            "average": float(row["average"]),
+            "max": float(row["max"]),
+            "min": float(row["min"]),
+            "status": str(row["status"]),
+            "message": env_messages[kind][row["status"]],
+            "alert": row["status"] != "comfortable",
+        }
+
+    empty_env = analyze_temperature_humidity_data([])
+    for area_id in area_ids:
+        row = crowd_stats.get(area_id)
+        if row is None:
+            crowd_analysis = analyze_crowd_data([])
+        else:
+            crowd_analysis = {
+                "current": int(row["current"]),
+                "average": float(row["average"]),
+                "max": int(row["max"]),
+                "min": int(row["min"]),
+                "status": str(row["status"]),
+                "message": crowd_messages[row["status"]],
+                "trend": str(row["trend"]),
+                "alert": row["status"] != "normal",
+                "data_points": int(row["data_points"]),
+            }
+        env_analysis = {
+            "temperature": _env_entry("temperature", temp_stats[area_id]) if area_id in temp_stats else dict(empty_env["temperature"]),
+            "humidity": _env_entry("humidity", humidity_stats[area_id]) if area_id in humidity_stats else dict(empty_env["humidity"]),
+        }
+        results[area_id] = (crowd_analysis, env_analysis)
+    return results
+
+
+async def _generate_analysis_texts(items, concurrency=8, rate_per_minute=120):
+    """在同一事件循环上并发生成分析文本，受并发数与速率限制；失败项返回异常对象"""
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = AsyncRateLimiter(rate_per_minute / 60.0, burst=concurrency)
+
+    async def _one(area_name, analysis_data):
+        async with semaphore:
+            await limiter.acquire()
+            return await generate_analysis_text(area_name, analysis_data)
+
     try:
-        area = Area.objects.get(pk=area_id)
-        
-        # 获取各类型数据
-        crowd_data = get_crowd_data(area_id)
-        temp_humidity_data = get_temperature_humidity_data(area_id)
-        
-        # 分析各类型数据
-        crowd_analysis = analyze_crowd_data(crowd_data)
-        env_analysis = analyze_temperature_humidity_data(temp_humidity_data)
-        
-        # 整合分析结果
+        return await asyncio.gather(
+            *(_one(area_name, analysis_data) for area_name, analysis_data in items),
+            return_exceptions=True,
+        )
+    finally:
+        # asyncio.run 结束后事件循环即关闭，需在此释放该循环上的连接
+        await close_loop_clients()
+
+
+def run_area_analysis(area_ids=None, concurrency=8, rate_per_minute=120):
+    """批量分析区域数据：批量查询 + 向量化统计 + 并发LLM调用 + bulk_create"""
+    areas = Area.objects.select_related("type").order_by("id")
+    if area_ids is not None:
+        areas = areas.filter(pk__in=area_ids)
+    areas = list(areas)
+    if not areas:
+        return {"analyzed": 0, "failed": 0}
+
+    statistics = compute_area_statistics([area.id for area in areas])
+    prepared = []
+    for area in areas:
+        crowd_analysis, env_analysis = statistics[area.id]
         analysis_data = {
             "area": {
                 "id": area.id,
@@ -284,59 +465,59 @@ def analyze_area_data(area_id):
             "crowd": crowd_analysis,
             "environment": env_analysis
         }
-        
-        # 确定整体警报状态（保存为字符串枚举：normal|warning|critical）
-        alert_messages = []
-        levels = []
-        
-        # crowd level
-        if crowd_analysis.get("status") in ("warning", "critical"):
-            levels.append(crowd_analysis.get("status"))
-            alert_messages.append(crowd_analysis.get("message"))
-        
-        # temperature level
-        temp_status = env_analysis["temperature"].get("status")
-        if temp_status in ("warning_low", "warning_high", "critical_low", "critical_high"):
-            levels.append("critical" if temp_status.startswith("critical") else "warning")
-            alert_messages.append(env_analysis["temperature"].get("message"))
-        
-        # humidity level
-        hum_status = env_analysis["humidity"].get("status")
-        if hum_status in ("warning_low", "warning_high", "critical_low", "critical_high"):
-            levels.append("critical" if hum_status.startswith("critical") else "warning")
-            alert_messages.append(env_analysis["humidity"].get("message"))
-        
-        if "critical" in levels:
-            alert_level = "critical"
-        elif "warning" in levels:
-            alert_level = "warning"
-        else:
-            alert_level = "normal"
-        
-        # 使用LLM生成分析文本
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            analysis_text = loop.run_until_complete(generate_analysis_text(area.name, analysis_data))
-        finally:
-            loop.close()
-        
-        # 保存分析结果
-        LLMAnalysis.objects.create(
+        alert_level, alert_message = _resolve_alert_level(crowd_analysis, env_analysis)
+        prepared.append((area, analysis_data, alert_level, alert_message))
+
+    texts = asyncio.run(_generate_analysis_texts(
+        [(area.name, analysis_data) for area, analysis_data, _, _ in prepared],
+        concurrency=concurrency,
+        rate_per_minute=rate_per_minute,
+    ))
+
+    analyses = []
+    failed = 0
+    for (area, analysis_data, alert_level, alert_message), text in zip(prepared, texts):
+        if isinstance(text, BaseException):
+            failed += 1
+            logger.error(f"Error generating analysis for area {area.name}: {str(text)}")
+            continue
+        analyses.append(LLMAnalysis(
             area=area,
-            analysis_text=analysis_text,
+            analysis_text=text,
             analysis_data=json.dumps(analysis_data, ensure_ascii=False),
             alert_status=alert_level,
-            alert_message="; ".join(m for m in alert_messages if m) if alert_messages else None
-        )
-        
-        logger.info(f"Completed analysis for area: {area.name}")
-        return True
-    
+            alert_message=alert_message
+        ))
+    LLMAnalysis.objects.bulk_create(analyses, batch_size=200)
+
+    logger.info(f"Completed batch analysis: {len(analyses)} areas analyzed, {failed} failed")
+    return {"analyzed": len(analyses), "failed": failed}
+
+
+@shared_task
+def analyze_area_data(area_id):
+    """分析区域数据并生成报告"""
+    try:
+        if not Area.objects.filter(pk=area_id).exists():
+            logger.error(f"Area with id {area_id} not found")
+            return False
+        result = run_area_analysis([area_id], concurrency=1)
+        return result["analyzed"] == 1
+
     except Exception as e:
         logger.error(f"Error analyzing area data: {str(e)}")
         return False
 
+
+@shared_task
+def analyze_areas_batch(area_ids=None, concurrency=8, rate_per_minute=120):
+    """批量分析多个区域（未指定时分析全部区域）"""
+    try:
+        return run_area_analysis(area_ids, concurrency=concurrency, rate_per_minute=rate_per_minute)
+    except Exception as e:
+        logger.error(f"Error in batch area analysis: {str(e)}")
+        return {"analyzed": 0, "failed": 0, "error": str(e)}
+
 @shared_task
 def analyze_alert(alert_id):
     """分析告警并生成处理建议"""
@@ -470,64 +651,105 @@ def analyze_alert(alert_id):
         logger.error(f"Error analyzing alert: {str(e)}")
         return False
 
+USAGE_PATTERN_DAYS = 30
+USAGE_PATTERN_DEFAULTS = {
+    'average_duration': 45.0,  # 假设平均停留时间，实际应该基于更复杂的分析
+    'typical_user_groups': "学生、教职工",  # 假设用户群体，实际应该基于更复杂的分析
+}
+
+
+def compute_usage_patterns(area_ids=None, days=USAGE_PATTERN_DAYS):
+    """
+    一次分组聚合计算区域使用模式
+    数据库按 (区域, 小时, 星期) 汇总人数总和与条数，每个区域最多 24×7 行；
+    再由汇总结果精确还原按小时、按星期的平均人流量
+    返回 {area_id: {daily_pattern, weekly_pattern, peak_hours, quiet_hours}}
+    """
+    end_time = timezone.now()
+    start_time = end_time - timedelta(days=days)
+    queryset = HistoricalData.objects.filter(timestamp__gte=start_time, timestamp__lte=end_time)
+    if area_ids is not None:
+        queryset = queryset.filter(area_id__in=area_ids)
+
+    # 按 UTC 提取小时与星期再在 pandas 中换算到本地时区：
+    # MySQL 按本地时区提取会生成 CONVERT_TZ，未加载时区表时结果全为 NULL
+    rows = (
+        queryset
+        .annotate(hour=ExtractHour('timestamp', tzinfo=dt_timezone.utc),
+                  iso_weekday=ExtractIsoWeekDay('timestamp', tzinfo=dt_timezone.utc))
+        .values('area_id', 'hour', 'iso_weekday')
+        .annotate(total=Sum('detected_count'), samples=Count('id'))
+        .values_list('area_id', 'hour', 'iso_weekday', 'total', 'samples')
+    )
+    data = pd.DataFrame.from_records(rows, columns=['area_id', 'hour', 'iso_weekday', 'total', 'samples'])
+    if data.empty:
+        return {}
+    if data[['hour', 'iso_weekday']].isna().any().any():
+        logger.error("Usage pattern aggregation returned NULL hour/weekday; rows dropped")
+        data = data.dropna(subset=['hour', 'iso_weekday'])
+
+    # 本地时区相对 UTC 的整点偏移（Asia/Shanghai 为 +8，无夏令时）
+    offset_hours = int(timezone.localtime(end_time).utcoffset().total_seconds() // 3600)
+    local_hour = data['hour'].astype(int) + offset_hours
+    data['hour'] = local_hour % 24
+    # 星期按 pandas dayofweek 约定：周一为0，跨零点时顺延或回退一天
+    data['day_of_week'] = (data['iso_weekday'].astype(int) - 1 + local_hour // 24) % 7
+
+    hourly = data.groupby(['area_id', 'hour'])[['total', 'samples']].sum()
+    hourly['mean'] = hourly['total'] / hourly['samples']
+    weekly = data.groupby(['area_id', 'day_of_week'])[['total', 'samples']].sum()
+    weekly['mean'] = weekly['total'] / weekly['samples']
+
+    patterns = {}
+    for area_id, area_hourly in hourly['mean'].groupby(level='area_id'):
+        daily_pattern = {int(hour): float(value) for (_, hour), value in area_hourly.items()}
+        ranked = sorted(daily_pattern.items(), key=lambda x: x[1], reverse=True)
+        patterns[area_id] = {
+            'daily_pattern': daily_pattern,
+            # 高峰时段 (人流量最高的3个小时) 与低谷时段 (人流量最低的3个小时)
+            'peak_hours': [{"hour": hour, "average_crowd": crowd} for hour, crowd in ranked[:3]],
+            'quiet_hours': [{"hour": hour, "average_crowd": crowd} for hour, crowd in sorted(daily_pattern.items(), key=lambda x: x[1])[:3]],
+        }
+    for area_id, area_weekly in weekly['mean'].groupby(level='area_id'):
+        patterns[area_id]['weekly_pattern'] = {int(day): float(value) for (_, day), value in area_weekly.items()}
+    return patterns
+
+
+def save_usage_patterns(patterns):
+    """批量写入使用模式（按区域唯一键冲突时更新）"""
+    objects = [
+        AreaUsagePattern(area_id=area_id, **pattern, **USAGE_PATTERN_DEFAULTS)
+        for area_id, pattern in patterns.items()
+    ]
+    # MySQL 不支持指定冲突目标，由 area 的唯一键（OneToOne）判定冲突
+    conflict_target = {}
+    if connection.features.supports_update_conflicts_with_target:
+        conflict_target['unique_fields'] = ['area']
+    AreaUsagePattern.objects.bulk_create(
+        objects,
+        batch_size=500,
+        update_conflicts=True,
+        **conflict_target,
+        update_fields=['daily_pattern', 'weekly_pattern', 'peak_hours', 'quiet_hours',
+                       'average_duration', 'typical_user_groups', 'last_updated'],
+    )
+    return len(objects)
+
+
 @shared_task
 def generate_area_usage_pattern(area_id):
     """生成区域使用模式分析"""
     try:
         area = Area.objects.get(pk=area_id)
         
-        # 获取最近30天的历史数据
-        end_time = datetime.now()
-        start_time = end_time - timedelta(days=30)
-        
-        # 获取人流量数据
-        historical_data = HistoricalData.objects.filter(
-            area=area,
-            timestamp__gte=start_time,
-            timestamp__lte=end_time
-        ).order_by('timestamp')
-        
-        if not historical_data:
+        patterns = compute_usage_patterns([area.id])
+        if area.id not in patterns:
             logger.warning(f"No historical data for area {area.name} to analyze usage pattern")
             return False
         
-        # 转换为DataFrame处理
-        data = pd.DataFrame(list(historical_data.values('detected_count', 'timestamp')))
-        data.columns = ['crowd', 'timestamp']
-        
-        # 提取时间特征
-        data['hour'] = data['timestamp'].dt.hour
-        data['day_of_week'] = data['timestamp'].dt.dayofweek
-        data['date'] = data['timestamp'].dt.date
-        
-        # 计算日内模式 (每小时平均人流量)
-        daily_pattern = data.groupby('hour')['crowd'].mean().to_dict()
-        
-        # 计算周内模式 (每天平均人流量)
-        weekly_pattern = data.groupby('day_of_week')['crowd'].mean().to_dict()
-        
-        # 计算高峰时段 (人流量最高的3个小时)
-        peak_hours = sorted(daily_pattern.items(), key=lambda x: x[1], reverse=True)[:3]
-        peak_hours = [{"hour": hour, "average_crowd": crowd} for hour, crowd in peak_hours]
-        
-        # 计算低谷时段 (人流量最低的3个小时)
-        quiet_hours = sorted(daily_pattern.items(), key=lambda x: x[1])[:3]
-        quiet_hours = [{"hour": hour, "average_crowd": crowd} for hour, crowd in quiet_hours]
+        save_usage_patterns(patterns)
         
-        # 创建或更新区域使用模式
-        pattern, created = AreaUsagePattern.objects.update_or_create(
-            area=area,
-            defaults={
-                'daily_pattern': daily_pattern,
-                'weekly_pattern': weekly_pattern,
-                'peak_hours': peak_hours,
-                'quiet_hours': quiet_hours,
-                'average_duration': 45.0,  # 假设平均停留时间，实际应该基于更复杂的分析
-                'typical_user_groups': "学生、教职工"  # 假设用户群体，实际应该基于更复杂的分析
-            }
-        )
-        
-        logger.info(f"{'Created' if created else 'Updated'} usage pattern for area: {area.name}")
+        logger.info(f"Updated usage pattern for area: {area.name}")
         return True
         
     except Area.DoesNotExist:
@@ -537,92 +759,139 @@ def generate_area_usage_pattern(area_id):
         logger.error(f"Error generating area usage pattern: {str(e)}")
         return False
 
+
 @shared_task
-def generate_personalized_recommendations():
-    """为所有活跃用户生成个性化推荐"""
+def generate_all_area_usage_patterns():
+    """一次扫描最近30天数据，刷新全部区域的使用模式（由 Celery beat 每晚调度）"""
     try:
-        # 获取用户
-        active_users = CustomUser.objects.all()[:100]  # 简化处理，获取前100个用户
-        
-        recommendations_created = 0
-        
-        for user in active_users:
-            # 获取用户的收藏区域
-            favorite_areas = user.favorite_areas.all()
-            favorite_building_ids = set(favorite_areas.values_list('type', flat=True))
-            
-            # 如果用户有收藏区域，推荐同类型的其他区域
-            recommended_areas = []
-            
-            if favorite_areas.exists():
-                # 找出同建筑类型但用户未收藏的区域
-                similar_areas = Area.objects.filter(
-                    type__id__in=favorite_building_ids
-                ).exclude(
-                    id__in=favorite_areas.values_list('id', flat=True)
-                ).order_by('?')[:3]  # 随机选择3个
-                
-                recommended_areas.extend(list(similar_areas))
-            
-            # 如果推荐数量不足3个，补充一些人流量适中的区域
-            if len(recommended_areas) < 3:
-                try:
-                    # 获取所有区域的检测到的人数
-                    areas_with_data = []
-                    for area in Area.objects.exclude(id__in=[a.id for a in recommended_areas + list(favorite_areas)]):
-                        node = area.bound_node
-                        if node and node.detected_count is not None:
-                            areas_with_data.append({
-                                "area": area,
-                                "crowd": node.detected_count
-                            })
-                    
-                    # 选择人流量适中的区域
-                    if areas_with_data:
-                        # 排序并选择中间的几个区域
-                        sorted_areas = sorted(areas_with_data, key=lambda x: x["crowd"])
-                        middle_start = max(0, len(sorted_areas)//2 - 1)
-                        middle_areas = sorted_areas[middle_start:middle_start+(3-len(recommended_areas))]
-                        recommended_areas.extend([item["area"] for item in middle_areas])
-                
-                except Exception as e:
-                    logger.warning(f"Error getting crowd data for recommendations: {str(e)}")
-            
-            # 如果仍然不足3个，随机补充
-            if len(recommended_areas) < 3:
-                remaining = 3 - len(recommended_areas)
-                random_areas = Area.objects.exclude(
-                    id__in=[a.id for a in recommended_areas + list(favorite_areas)]
-                ).order_by('?')[:remaining]
-                
-                recommended_areas.extend(list(random_areas))
-            
-            # 创建推荐记录
-            for area in recommended_areas:
-                # 生成推荐理由
-                if area.type.id in favorite_building_ids:
+        patterns = compute_usage_patterns()
+        saved = save_usage_patterns(patterns)
+        logger.info(f"Updated usage patterns for {saved} areas")
+        return saved
+    except Exception as e:
+        logger.error(f"Error generating usage patterns for all areas: {str(e)}")
+        return 0
+
+
+# 推荐打分参数
+RECOMMENDATION_CONFIG = {
+    "per_user": 3,             # 每个用户推荐的区域数
+    "preference_weight": 0.6,  # 收藏建筑偏好权重
+    "occupancy_weight": 0.4,   # 人流适中程度权重
+    "user_chunk_size": 2000,   # 分块打分，限制 用户×区域 矩阵的内存
+}
+
+
+def _moderate_occupancy_scores(crowd_counts):
+    """人流适中程度：按人数排名的百分位，越接近中位数得分越高（0-1）"""
+    n = len(crowd_counts)
+    if n <= 1:
+        return np.ones(n)
+    ranks = np.empty(n)
+    ranks[np.argsort(crowd_counts, kind="stable")] = np.arange(n)
+    percentile = ranks / (n - 1)
+    return 1.0 - np.abs(percentile - 0.5) * 2
+
+
+def build_recommendations(user_ids, seed=None):
+    """
+    向量化推荐打分
+    - 收藏关系构成 用户×建筑类型 偏好矩阵，再映射到 用户×区域
+    - 区域人流适中程度作为全体用户共享的区域特征
+    - 已收藏区域不参与推荐，每个用户取得分最高的若干区域
+    返回 [(user_id, area, score, reason)]
+    """
+    areas = list(Area.objects.select_related("type", "bound_node").order_by("id"))
+    if not areas or not user_ids:
+        return []
+
+    area_index = {area.id: i for i, area in enumerate(areas)}
+    type_ids = sorted({area.type_id for area in areas})
+    type_index = {type_id: i for i, type_id in enumerate(type_ids)}
+    area_type = np.array([type_index[area.type_id] for area in areas])
+    crowd = np.array([
+        area.bound_node.detected_count if area.bound_node and area.bound_node.detected_count is not None else 0
+        for area in areas
+    ], dtype=float)
+    occupancy = _moderate_occupancy_scores(crowd)
+
+    user_ids = list(user_ids)
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+    # 收藏关系：一次查询取出全部 (用户, 区域)
+    through = CustomUser.favorite_areas.through
+    pairs = np.array([
+        (user_index[user_id], area_index[area_id])
+        for user_id, area_id in through.objects.values_list("customuser_id", "area_id")
+        if user_id in user_index and area_id in area_index
+    ], dtype=int).reshape(-1, 2)
+
+    # 用户×建筑类型 偏好计数
+    preference = np.zeros((len(user_ids), len(type_ids)))
+    if len(pairs):
+        np.add.at(preference, (pairs[:, 0], area_type[pairs[:, 1]]), 1)
+    favorite_counts = preference.sum(axis=1, keepdims=True)
+    preference_share = np.divide(preference, favorite_counts, out=np.zeros_like(preference), where=favorite_counts > 0)
+
+    cfg = RECOMMENDATION_CONFIG
+    per_user = min(cfg["per_user"], len(areas))
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for start in range(0, len(user_ids), cfg["user_chunk_size"]):
+        stop = min(start + cfg["user_chunk_size"], len(user_ids))
+        area_pref = preference_share[start:stop][:, area_type]  # 用户×区域
+        scores = cfg["preference_weight"] * area_pref + cfg["occupancy_weight"] * occupancy[np.newaxis, :]
+        # 微小随机扰动，打破同分区域的固定顺序
+        scores += rng.random(scores.shape) * 1e-3
+
+        chunk_pairs = pairs[(pairs[:, 0] >= start) & (pairs[:, 0] < stop)]
+        scores[chunk_pairs[:, 0] - start, chunk_pairs[:, 1]] = -np.inf
+
+        top = np.argpartition(-scores, per_user - 1, axis=1)[:, :per_user]
+        for row, area_columns in enumerate(top):
+            ordered = area_columns[np.argsort(-scores[row, area_columns])]
+            for column in ordered:
+                score = scores[row, column]
+                if not np.isfinite(score):
+                    continue
+                area = areas[column]
+                if area_pref[row, column] > 0:
                     reason = f"基于您对{area.type.name}的偏好推荐"
-                    score = 0.85
                 else:
                     reason = "这个区域当前人流量适中，环境舒适"
-                    score = 0.75
-                
-                # 删除旧的推荐
-                UserRecommendation.objects.filter(user=user, area=area).delete()
-                
-                # 保存推荐记录
-                UserRecommendation.objects.create(
-                    user=user,
-                    area=area,
-                    score=score,
-                    reason=reason
-                )
-                
-                recommendations_created += 1
-        
-        logger.info(f"Generated {recommendations_created} recommendations for {len(active_users)} users")
+                results.append((user_ids[start + row], area, round(float(min(score, 1.0)), 3), reason))
+    return results
+
+
+@shared_task
+def generate_personalized_recommendations():
+    """为所有活跃用户生成个性化推荐"""
+    try:
+        user_ids = list(CustomUser.objects.filter(is_active=True).values_list("id", flat=True))
+        recommendations = build_recommendations(user_ids)
+
+        # 删除旧的未点击推荐；已点击的推荐作为反馈记录保留，
+        # 但与本次推荐相同 (用户, 区域) 的记录被新推荐替换，避免同一区域重复出现
+        new_pairs = {(user_id, area.id) for user_id, area, _, _ in recommendations}
+        with transaction.atomic():
+            UserRecommendation.objects.filter(user__is_active=True, clicked=False).delete()
+            replaced_ids = [
+                rec_id for rec_id, user_id, area_id in UserRecommendation.objects.filter(
+                    user__is_active=True, clicked=True
+                ).values_list("id", "user_id", "area_id")
+                if (user_id, area_id) in new_pairs
+            ]
+            if replaced_ids:
+                UserRecommendation.objects.filter(id__in=replaced_ids).delete()
+            UserRecommendation.objects.bulk_create([
+                UserRecommendation(user_id=user_id, area=area, score=score, reason=reason)
+                for user_id, area, score, reason in recommendations
+            ], batch_size=1000)
+
+        logger.info(f"Generated {len(recommendations)} recommendations for {len(user_ids)} users")
         return True
     
     except Exception as e:
         logger.error(f"Error generating personalized recommendations: {str(e)}")
-        return False
\ No newline at end of file
+        return False
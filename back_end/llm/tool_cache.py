@@ -0,0 +1,196 @@
+"""
+工具结果缓存
+- 按工具配置TTL，参数规范化后生成缓存键（大小写、空白、数字字符串不影响命中）
+- 低频数据（区域、告警、公告）写入时通过信号递增全局主题代次，使相关缓存立即失效
+- 终端持续写入的实时数据（人流、环境、终端状态）不做全局失效：
+  按区域的工具（scope='area_id'）只在该区域写入时失效，其余工具依靠TTL过期
+- 记录每个工具的命中/未命中次数，提供命中率统计
+"""
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import logging
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "llm_tool_cache:"
+GENERATION_PREFIX = CACHE_PREFIX + "gen:"
+
+# 低频数据主题 -> 会触发全局失效的模型名
+TOPIC_MODELS = {
+    "alerts": ("Alert",),
+    "areas": ("Area", "Building"),
+    "notices": ("Notice",),
+}
+
+# 实时数据主题 -> 按区域失效的模型名（模型需有 area_id 字段）
+SCOPED_TOPIC_MODELS = {
+    "crowd": ("HistoricalData",),
+    "environment": ("TemperatureHumidityData",),
+}
+
+# 终端持续写入的主题，不参与全局失效
+LIVE_TOPICS = frozenset(SCOPED_TOPIC_MODELS) | {"terminals"}
+
+# TTL 不超过该值（秒）的工具完全依靠TTL，不订阅实时主题
+LIVE_TTL = 15
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _normalize_value(value: Any) -> Any:
+    """规范化参数值，使语义相同的调用命中同一缓存"""
+    if isinstance(value, str):
+        text = " ".join(value.strip().lower().split())
+        if text.lstrip("-").isdigit():
+            return int(text)
+        return text
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(v) for k, v in value.items()}
+    return value
+
+
+def _record(tool_name: str, hit: bool) -> None:
+    with _stats_lock:
+        entry = _stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+        entry["hits" if hit else "misses"] += 1
+
+
+def get_tool_cache_stats() -> Dict[str, Any]:
+    """获取各工具的缓存命中统计（当前进程）"""
+    with _stats_lock:
+        tools = {name: dict(entry) for name, entry in _stats.items()}
+    total_hits = sum(entry["hits"] for entry in tools.values())
+    total_calls = total_hits + sum(entry["misses"] for entry in tools.values())
+    for entry in tools.values():
+        calls = entry["hits"] + entry["misses"]
+        entry["hit_rate"] = round(entry["hits"] / calls, 3) if calls else 0.0
+    return {
+        "tools": tools,
+        "total_calls": total_calls,
+        "hit_rate": round(total_hits / total_calls, 3) if total_calls else 0.0,
+    }
+
+
+def invalidate_topics(topics: Iterable[str]) -> None:
+    """递增主题代次，使依赖这些主题的缓存全部失效"""
+    for topic in topics:
+        key = GENERATION_PREFIX + topic
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 代次键不存在时初始化
+            cache.set(key, 1, timeout=None)
+        except Exception as e:
+            logger.warning(f"递增工具缓存代次失败 {topic}: {e}")
+
+
+def _scoped_topic(topic: str, scope_value: Any) -> str:
+    return f"{topic}:area:{scope_value}"
+
+
+def _topic_generations(topics: Iterable[str]) -> str:
+    keys = [GENERATION_PREFIX + topic for topic in topics]
+    if not keys:
+        return ""
+    values = cache.get_many(keys)
+    return ".".join(str(values.get(key, 0)) for key in keys)
+
+
+def cached_tool(ttl: int, topics: Iterable[str] = (), scope: str | None = None) -> Callable:
+    """
+    工具结果缓存装饰器；ttl 为秒，topics 为依赖的数据主题
+    scope 为区域ID参数名，指定后实时主题按该区域的写入失效
+    """
+    topics = tuple(topics)
+    global_topics = tuple(topic for topic in topics if topic not in LIVE_TOPICS)
+    scoped_topics = tuple(topic for topic in topics if topic in SCOPED_TOPIC_MODELS) if scope and ttl > LIVE_TTL else ()
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        tool_name = func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                params = json.dumps(_normalize_value(dict(bound.arguments)), sort_keys=True, ensure_ascii=False, default=str)
+                digest = hashlib.md5(params.encode("utf-8")).hexdigest()
+                generation_topics = list(global_topics)
+                scope_value = bound.arguments.get(scope) if scoped_topics else None
+                if scope_value is not None:
+                    generation_topics += [_scoped_topic(topic, _normalize_value(scope_value)) for topic in scoped_topics]
+                cache_key = f"{CACHE_PREFIX}{tool_name}:{_topic_generations(generation_topics)}:{digest}"
+                cached = cache.get(cache_key)
+            except Exception as e:
+                logger.warning(f"读取工具缓存失败 {tool_name}: {e}")
+                return func(*args, **kwargs)
+
+            if cached is not None:
+                _record(tool_name, True)
+                return cached
+
+            _record(tool_name, False)
+            result = func(*args, **kwargs)
+            try:
+                cache.set(cache_key, result, timeout=ttl)
+            except Exception as e:
+                logger.warning(f"写入工具缓存失败 {tool_name}: {e}")
+            return result
+
+        wrapper.uncached = func
+        wrapper.cache_ttl = ttl
+        wrapper.cache_topics = topics
+        wrapper.cache_scope = scope
+        return wrapper
+
+    return decorator
+
+
+def connect_invalidation_signals() -> None:
+    """连接数据写入信号：低频模型保存/删除时使主题全局失效，实时数据只使所属区域失效"""
+    from django.apps import apps
+    from django.db.models.signals import post_save, post_delete
+
+    model_topics: Dict[str, list] = {}
+    for topic, model_names in TOPIC_MODELS.items():
+        for model_name in model_names:
+            model_topics.setdefault(model_name, []).append(topic)
+
+    for model_name, topics in model_topics.items():
+        model = apps.get_model("webapi", model_name)
+
+        def _invalidate(sender, topics=tuple(topics), **kwargs):
+            invalidate_topics(topics)
+
+        post_save.connect(_invalidate, sender=model, weak=False, dispatch_uid=f"llm_tool_cache_{model_name}_save")
+        post_delete.connect(_invalidate, sender=model, weak=False, dispatch_uid=f"llm_tool_cache_{model_name}_delete")
+
+    scoped_model_topics: Dict[str, list] = {}
+    for topic, model_names in SCOPED_TOPIC_MODELS.items():
+        for model_name in model_names:
+            scoped_model_topics.setdefault(model_name, []).append(topic)
+
+    for model_name, topics in scoped_model_topics.items():
+        model = apps.get_model("webapi", model_name)
+
+        def _invalidate_area(sender, instance=None, topics=tuple(topics), **kwargs):
+            area_id = getattr(instance, "area_id", None)
+            if area_id is not None:
+                invalidate_topics(_scoped_topic(topic, area_id) for topic in topics)
+
+        post_save.connect(_invalidate_area, sender=model, weak=False, dispatch_uid=f"llm_tool_cache_{model_name}_save")
+        post_delete.connect(_invalidate_area, sender=model, weak=False, dispatch_uid=f"llm_tool_cache_{model_name}_delete")
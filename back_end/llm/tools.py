@@ -9,10 +9,12 @@ from webapi.models import Area, HardwareNode, ProcessTerminal, Alert, Historical
 
 from .utils import run_llm_with_retry
 from .prompts import get_device_status_prompt
+from .tool_cache import cached_tool
 
 
 # 模糊搜索和匹配工具
 
+@cached_tool(ttl=60, topics=("areas", "crowd"))
 def fuzzy_search_areas(query: str, category: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     基于查询词模糊搜索区域
@@ -70,6 +72,7 @@ def fuzzy_search_areas(query: str, category: Optional[str] = None) -> List[Dict[
     return matches[:10]  # 返回前10个匹配结果
 
 
+@cached_tool(ttl=600, topics=("areas",))
 def fuzzy_search_buildings(query: str) -> List[Dict[str, Any]]:
     """基于查询词模糊搜索建筑"""
     if not query.strip():
@@ -102,6 +105,7 @@ def fuzzy_search_buildings(query: str) -> List[Dict[str, Any]]:
     return matches[:5]
 
 
+@cached_tool(ttl=30, topics=("terminals",))
 def fuzzy_search_terminals(query: str) -> List[Dict[str, Any]]:
     """基于查询词模糊搜索终端"""
     if not query.strip():
@@ -138,6 +142,7 @@ def fuzzy_search_terminals(query: str) -> List[Dict[str, Any]]:
 
 # 基础数据工具
 
+@cached_tool(ttl=15, topics=("areas", "crowd", "environment", "alerts", "terminals"))
 def get_area_status(area_id: int) -> Dict[str, Any]:
     """获取指定区域的综合状态数据"""
     try:
@@ -192,6 +197,7 @@ def get_area_status(area_id: int) -> Dict[str, Any]:
     }
 
 
+@cached_tool(ttl=15, topics=("areas", "crowd"))
 def get_suggested_areas(limit: int = 5, category: Optional[str] = None) -> List[Dict[str, Any]]:
     """根据实际人流负荷推荐区域，可选按建筑类型过滤"""
     qs = Area.objects.filter(id__lt=20).select_related('bound_node', 'type')
@@ -218,6 +224,7 @@ def get_suggested_areas(limit: int = 5, category: Optional[str] = None) -> List[
     return suggestions[:limit]
 
 
+@cached_tool(ttl=10, topics=("terminals",))
 def get_terminal_status(terminal_id: int) -> Dict[str, Any]:
     """从ProcessTerminal模型获取真实终端状态（不新增字段）"""
     try:
@@ -279,6 +286,7 @@ async def summarize_terminal_status(terminal_id: int) -> str:
     return await run_llm_with_retry(messages, temperature=0.2, model_type="analysis")
 
 
+@cached_tool(ttl=60, topics=("crowd",), scope="area_id")
 def get_area_extremes(area_id: int, hours: int = 24) -> Dict[str, Any]:
     """获取指定时间窗口内该区域的人流极值与时间点（基于HistoricalData）"""
     try:
@@ -306,6 +314,7 @@ def get_area_extremes(area_id: int, hours: int = 24) -> Dict[str, Any]:
     }
 
 
+@cached_tool(ttl=30, topics=("crowd",), scope="area_id")
 def get_area_trend(area_id: int, hours: int = 6, interval_minutes: int = 30) -> List[Dict[str, Any]]:
     """返回时间序列趋势（简化：按interval聚合均值），用于画趋势或给LLM做分析"""
     try:
@@ -322,6 +331,7 @@ def get_area_trend(area_id: int, hours: int = 6, interval_minutes: int = 30) ->
     } for h in qs]
 
 
+@cached_tool(ttl=30, topics=("alerts",))
 def get_recent_alerts(area_id: int | None = None, limit: int = 10) -> List[Dict[str, Any]]:
     """获取最新告警列表（不造字段）"""
     qs = Alert.objects.all().order_by("-timestamp")
@@ -341,6 +351,7 @@ def get_recent_alerts(area_id: int | None = None, limit: int = 10) -> List[Dict[
     return data
 
 
+@cached_tool(ttl=60, topics=("environment",), scope="area_id")
 def get_environment_snapshots(area_id: int, hours: int = 6, limit: int = 50) -> List[Dict[str, Any]]:
     """获取温湿度历史切片（基于TemperatureHumidityData）"""
     try:
@@ -356,6 +367,7 @@ def get_environment_snapshots(area_id: int, hours: int = 6, limit: int = 50) ->
     } for r in qs]
 
 
+@cached_tool(ttl=300, topics=("notices",))
 def get_notices(area_id: int | None = None, limit: int = 10) -> List[Dict[str, Any]]:
     """获取公告（Notice），结合区域多对多关系"""
     qs = Notice.objects.all().order_by("-timestamp")
@@ -374,6 +386,7 @@ def get_notices(area_id: int | None = None, limit: int = 10) -> List[Dict[str, A
     return results
 
 
+@cached_tool(ttl=30, topics=("environment",))
 def get_terminal_latest_co2(terminal_id: int, limit: int = 10) -> List[Dict[str, Any]]:
     """获取终端CO2历史记录切片（基于CO2Data）"""
     qs = CO2Data.objects.filter(terminal__terminal_id=terminal_id).order_by("-timestamp")[:limit]
@@ -385,6 +398,7 @@ def get_terminal_latest_co2(terminal_id: int, limit: int = 10) -> List[Dict[str,
 
 # 资源导航工具
 
+@cached_tool(ttl=3600)
 def get_campus_resources(query: str = "") -> List[Dict[str, Any]]:
     """
     根据用户查询关键词返回相关的校园服务资源
@@ -479,6 +493,7 @@ def get_campus_resources(query: str = "") -> List[Dict[str, Any]]:
     return matching_services[:5]  # 返回最相关的5个服务
 
 
+@cached_tool(ttl=3600)
 def get_general_campus_info() -> Dict[str, Any]:
     """
     提供校园基础信息和AI助手身份说明
@@ -15,12 +15,17 @@ router.register(r'generated-content', GeneratedContentViewSet, basename='generat
 
 from django.http import JsonResponse
 from .utils import get_model_info
+from .tool_cache import get_tool_cache_stats
 
 def model_info_view(request):
     return JsonResponse(get_model_info())
 
+def tool_cache_stats_view(request):
+    return JsonResponse(get_tool_cache_stats())
+
 urlpatterns = [
     path('', include(router.urls)),
     path('chat/', AgentChatView.as_view(), name='agent-chat'),
     path('model-info/', model_info_view, name='model-info'),
+    path('tool-cache-stats/', tool_cache_stats_view, name='tool-cache-stats'),
 ]
\ No newline at end of file
@@ -3,9 +3,16 @@ LLM 公共工具模块
 提供统一的LLM客户端和流式响应接口，支持多模型配置
 """
 import os
+import json
+import time
 import logging
 import asyncio
-from typing import Optional, List, AsyncGenerator
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional, List, AsyncGenerator, Dict, Tuple
+
+import httpx
 
 # 强制使用pydantic v1的验证器重用，避免langchain相关问题
 import pydantic.v1.config
@@ -67,6 +74,174 @@ MODEL_CONFIGS = {
 }
 
 
+# 连接池与并发配置
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # 每个模型同时进行的请求数
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+
+try:
+    import h2  # noqa: F401  安装 h2 后启用 HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _resolve_config(model_type: str) -> Tuple[str, dict]:
+    """获取模型配置；未配置时回退到默认配置"""
+    config = MODEL_CONFIGS.get(model_type)
+    if config is None:
+        model_type, config = "default", MODEL_CONFIGS["default"]
+    if not config["model"] or not config["api_key"]:
+        logger.warning(f"Model type '{model_type}' not configured, falling back to default")
+        model_type, config = "default", MODEL_CONFIGS["default"]
+    return model_type, config
+
+
+class LLMClientSlot:
+    """
+    单个模型（模型类型 + API地址）的共享资源：
+    - 进程内共享的同步 HTTP 客户端
+    - 每个事件循环一个异步 HTTP 客户端与并发信号量（异步对象不能跨事件循环复用）
+    - 在途请求数与排队等待时间统计
+    """
+
+    def __init__(self, model_type: str, api_base: str, max_concurrency: int):
+        self.model_type = model_type
+        self.api_base = api_base
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+        self.sync_client: Optional[httpx.Client] = None
+        self.loop_state = weakref.WeakKeyDictionary()  # loop -> (AsyncClient, Semaphore)
+        self.stats = {
+            "in_flight": 0,
+            "queued": 0,
+            "requests": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    @staticmethod
+    def _client_kwargs() -> dict:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "timeout": httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0),
+            "limits": httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+            ),
+        }
+
+    def get_sync_client(self) -> httpx.Client:
+        with self.lock:
+            if self.sync_client is None:
+                self.sync_client = httpx.Client(**self._client_kwargs())
+            return self.sync_client
+
+    def _get_loop_state(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None, None
+        with self.lock:
+            state = self.loop_state.get(loop)
+            if state is None:
+                state = (httpx.AsyncClient(**self._client_kwargs()), asyncio.Semaphore(self.max_concurrency))
+                self.loop_state[loop] = state
+            return state
+
+    def get_async_client(self) -> Optional[httpx.AsyncClient]:
+        """当前事件循环的异步客户端；不在事件循环中时返回 None（由SDK自行创建）"""
+        return self._get_loop_state()[0]
+
+    async def close_loop_client(self):
+        """关闭并移除当前事件循环的异步客户端（事件循环结束前调用，避免连接泄漏）"""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            state = self.loop_state.pop(loop, None)
+        if state is not None:
+            await state[0].aclose()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """按模型限制并发，超出时排队并记录等待时间"""
+        _, semaphore = self._get_loop_state()
+        start = time.perf_counter()
+        with self.lock:
+            self.stats["queued"] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            with self.lock:
+                self.stats["queued"] -= 1
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.stats["in_flight"] += 1
+            self.stats["requests"] += 1
+            self.stats["wait_ms_total"] += wait_ms
+            self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait_ms)
+        try:
+            yield
+        finally:
+            semaphore.release()
+            with self.lock:
+                self.stats["in_flight"] -= 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            event_loops = len(self.loop_state)
+        requests = stats["requests"]
+        stats["wait_ms_avg"] = round(stats["wait_ms_total"] / requests, 2) if requests else 0.0
+        stats["wait_ms_total"] = round(stats["wait_ms_total"], 2)
+        stats["wait_ms_max"] = round(stats["wait_ms_max"], 2)
+        stats.update({
+            "model_type": self.model_type,
+            "api_base": self.api_base,
+            "max_concurrency": self.max_concurrency,
+            "event_loops": event_loops,
+        })
+        return stats
+
+
+_client_slots: Dict[Tuple[str, str], LLMClientSlot] = {}
+_client_slots_lock = threading.Lock()
+
+
+def get_client_slot(model_type: str = "default") -> LLMClientSlot:
+    """按（模型类型, API地址）获取进程内共享的客户端资源"""
+    model_type, config = _resolve_config(model_type)
+    key = (model_type, config["api_base"])
+    with _client_slots_lock:
+        slot = _client_slots.get(key)
+        if slot is None:
+            slot = LLMClientSlot(model_type, config["api_base"], LLM_MAX_CONCURRENCY)
+            _client_slots[key] = slot
+        return slot
+
+
+async def close_loop_clients():
+    """关闭各模型在当前事件循环上创建的异步客户端；用于 asyncio.run 包裹的一次性任务"""
+    with _client_slots_lock:
+        slots = list(_client_slots.values())
+    for slot in slots:
+        try:
+            await slot.close_loop_client()
+        except Exception as e:
+            logger.warning(f"Failed to close async client for {slot.model_type}: {e}")
+
+
+def get_llm_pool_stats() -> dict:
+    """获取各模型连接池的在途请求与排队统计"""
+    with _client_slots_lock:
+        slots = list(_client_slots.values())
+    return {
+        "http2": HTTP2_AVAILABLE,
+        "models": [slot.get_stats() for slot in slots],
+    }
+
+
 def get_llm_client(
     temperature: float = 0.7,
     streaming: bool = False,
@@ -85,14 +260,11 @@ def get_llm_client(
     Returns:
         配置好的ChatOpenAI实例
     """
-    # 获取模型配置
-    config = MODEL_CONFIGS.get(model_type, MODEL_CONFIGS["default"])
-    
-    # 如果指定模型配置为空，回退到默认配置
-    if not config["model"] or not config["api_key"]:
-        logger.warning(f"Model type '{model_type}' not configured, falling back to default")
-        config = MODEL_CONFIGS["default"]
-    
+    # 获取模型配置（未配置时回退到默认配置）
+    resolved_type, config = _resolve_config(model_type)
+    # 复用共享的 keep-alive 连接，避免每次调用重新握手
+    slot = get_client_slot(resolved_type)
+
     llm = ChatOpenAI(
         temperature=temperature,
         streaming=streaming,
@@ -100,11 +272,159 @@ def get_llm_client(
         model=config["model"],
         openai_api_key=config["api_key"],
         openai_api_base=config["api_base"],
-        max_tokens=config["max_tokens"]
+        max_tokens=config["max_tokens"],
+        http_client=slot.get_sync_client(),
+        http_async_client=slot.get_async_client(),
     )
     return llm
 
 
+class AsyncRateLimiter:
+    """
+    令牌桶限速器（单事件循环内使用）
+    rate 为每秒允许的请求数，burst 为可累积的突发量
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ThinkTagFilter:
+    """
+    流式过滤 <think>...</think> 的增量状态机
+    每个字符只处理一次；仅在chunk末尾可能是半个标签时保留最多 len(标签)-1 个字符
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self.inside = False
+        self.pending = ""  # 可能是标签前缀的尾部字符
+
+    @staticmethod
+    def _partial_suffix(text: str, tag: str) -> int:
+        """text 末尾与 tag 前缀重合的长度"""
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if tag.startswith(text[-size:]):
+                return size
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        text = self.pending + chunk
+        self.pending = ""
+        out = []
+        pos = 0
+        while pos < len(text):
+            tag = self.CLOSE_TAG if self.inside else self.OPEN_TAG
+            idx = text.find(tag, pos)
+            if idx == -1:
+                keep = self._partial_suffix(text[pos:], tag)
+                end = len(text) - keep
+                if not self.inside:
+                    out.append(text[pos:end])
+                self.pending = text[end:]
+                break
+            if not self.inside:
+                out.append(text[pos:idx])
+            self.inside = not self.inside
+            pos = idx + len(tag)
+        return "".join(out)
+
+    def flush(self) -> str:
+        """流结束时输出残留的非标签字符"""
+        tail, self.pending = self.pending, ""
+        return "" if self.inside else tail
+
+
+async def coalesce_stream_events(
+    source: AsyncGenerator[str, None],
+    window: float = 0.03,
+    max_chars: int = 512,
+) -> AsyncGenerator[str, None]:
+    """
+    合并相邻的文本事件（逐行JSON）：
+    - content / planning_progress 事件在时间窗口或字符数达到上限时合并为一帧
+    - 其它事件先冲刷已合并的文本，再原样透传，保持事件顺序
+    """
+    mergeable = {"content": "text", "planning_progress": "content"}
+    pending_type = None
+    pending_parts: List[str] = []
+    pending_size = 0
+    deadline = 0.0
+
+    def _flush():
+        nonlocal pending_type, pending_parts, pending_size
+        field = mergeable[pending_type]
+        frame = json.dumps({"type": pending_type, field: "".join(pending_parts)}, ensure_ascii=False) + "\n"
+        pending_type, pending_parts, pending_size = None, [], 0
+        return frame
+
+    loop = asyncio.get_running_loop()
+    iterator = source.__aiter__()
+    next_task = None
+    try:
+        while True:
+            if next_task is None:
+                next_task = asyncio.ensure_future(iterator.__anext__())
+            if pending_type is not None:
+                # 有待合并的文本时最多等待到窗口结束
+                done, _ = await asyncio.wait({next_task}, timeout=max(0.0, deadline - loop.time()))
+                if not done:
+                    yield _flush()
+                    continue
+            try:
+                item = await next_task
+            except StopAsyncIteration:
+                break
+            finally:
+                if next_task.done():
+                    next_task = None
+
+            event = None
+            try:
+                event = json.loads(item)
+            except (TypeError, ValueError):
+                pass
+            event_type = event.get("type") if isinstance(event, dict) else None
+            field = mergeable.get(event_type)
+            if field and set(event.keys()) == {"type", field} and isinstance(event[field], str):
+                if pending_type is not None and pending_type != event_type:
+                    yield _flush()
+                if pending_type is None:
+                    pending_type = event_type
+                    deadline = loop.time() + window
+                pending_parts.append(event[field])
+                pending_size += len(event[field])
+                if pending_size >= max_chars:
+                    yield _flush()
+                continue
+
+            if pending_type is not None:
+                yield _flush()
+            yield item
+        if pending_type is not None:
+            yield _flush()
+    finally:
+        if next_task is not None and not next_task.done():
+            next_task.cancel()
+
+
 async def stream_chat_response(
     messages: List[BaseMessage],
     temperature: float = 0.7,
@@ -126,45 +446,26 @@ async def stream_chat_response(
             callbacks=[callback],
             model_type=model_type
         )
-        task = asyncio.create_task(llm.agenerate([messages]))
+        slot = get_client_slot(model_type)
+
+        async def _generate():
+            async with slot.acquire():
+                return await llm.agenerate([messages])
+
+        task = asyncio.create_task(_generate())
 
         # 仅在推理类模型时，过滤<think>内容
-        filter_think = model_type in ("reasoning", "deep_reasoning")
-        inside_think = False
-        buffer = ""
+        think_filter = ThinkTagFilter() if model_type in ("reasoning", "deep_reasoning") else None
 
         async for chunk in callback.aiter():
-            text = str(chunk)
-            if filter_think:
-                buffer += text
-                out = []
-                i = 0
-                while i < len(buffer):
-                    if not inside_think and buffer.startswith("<think>", i):
-                        inside_think = True
-                        i += len("<think>")
-                        continue
-                    if inside_think:
-                        end_idx = buffer.find("</think>", i)
-                        if end_idx == -1:
-                            # 尚未读到结束标签，整段丢弃，等待更多chunk
-                            i = len(buffer)
-                            buffer = buffer  # 保留以便下次继续匹配
-                            break
-                        else:
-                            # 跳过结束标签
-                            inside_think = False
-                            i = end_idx + len("</think>")
-                            continue
-                    # 正常输出字符
-                    out.append(buffer[i])
-                    i += 1
-                # 如果所有内容都被消费且不在think中，清空缓冲
-                if not inside_think:
-                    buffer = buffer[i:]
-                yield "".join(out)
-            else:
+            text = think_filter.feed(str(chunk)) if think_filter else str(chunk)
+            # 不输出空chunk
+            if text:
                 yield text
+        if think_filter:
+            tail = think_filter.flush()
+            if tail:
+                yield tail
         await task
     except Exception as e:
         logger.error(f"流式生成回答出错: {str(e)}", exc_info=True)
@@ -190,10 +491,12 @@ async def run_llm_with_retry(
         temperature=temperature,
         model_type=model_type
     )
+    slot = get_client_slot(model_type)
     retries = 0
     while retries < max_retries:
         try:
-            response = await llm.agenerate([messages])
+            async with slot.acquire():
+                response = await llm.agenerate([messages])
             text = response.generations[0][0].text
             # 推理类模型会返回<think>...</think>，对终端用户隐藏
             if model_type in ("reasoning", "deep_reasoning"):
@@ -225,5 +528,6 @@ def get_model_info() -> dict:
                 "configured": bool(v["model"] and v["api_key"])
             }
             for k, v in MODEL_CONFIGS.items()
-        }
+        },
+        "pool": get_llm_pool_stats()
     }
\ No newline at end of file
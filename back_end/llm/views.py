@@ -5,7 +5,7 @@ from rest_framework.views import View
 from django.http import StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
 import json
 import logging
 import asyncio
@@ -17,11 +17,13 @@ from .serializers import (
 )
 from webapi.models import Area, Alert, CustomUser
 from .tasks import (
-    analyze_area_data, analyze_alert,
+    analyze_area_data, analyze_areas_batch, analyze_alert,
     generate_area_usage_pattern, generate_personalized_recommendations
 )
 from .agent import get_agent_response
-from .utils import get_model_info
+from .answer_cache import AnswerCache
+from .memory import ChatMemoryStore
+from .utils import get_model_info, coalesce_stream_events
 
 
 class LLMAnalysisViewSet(viewsets.ReadOnlyModelViewSet):
@@ -48,6 +50,16 @@ class LLMAnalysisViewSet(viewsets.ReadOnlyModelViewSet):
 
         return Response({"message": "Analysis task has been started. Please check back later for the result."}, status=status.HTTP_202_ACCEPTED)
 
+    @action(detail=False, methods=['post'], url_path='analyze-batch')
+    def analyze_batch(self, request):
+        area_ids = request.data.get('area_ids')
+        if area_ids is not None and not isinstance(area_ids, list):
+            return Response({"error": "area_ids must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        task = analyze_areas_batch.delay(area_ids)
+
+        return Response({"message": "Batch analysis task has been started.", "task_id": task.id}, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=True, methods=['get'], url_path='latest-analysis')
     def latest_analysis(self, request, pk=None):
         try:
@@ -229,6 +241,19 @@ class ModelInfoView(View):
         return Response(model_info)
 
 
+def _collect_answer_text(events):
+    """从事件流中拼接最终回答文本"""
+    parts = []
+    for event in events:
+        try:
+            payload = json.loads(event)
+        except (TypeError, ValueError):
+            continue
+        if isinstance(payload, dict) and payload.get("type") == "content":
+            parts.append(payload.get("text", ""))
+    return "".join(parts).strip()
+
+
 class AgentChatView(View):
     async def post(self, request, *args, **kwargs):
         body_bytes = request.body
@@ -252,12 +277,41 @@ class AgentChatView(View):
                 content_type="application/json"
             )
 
+        # 可选的服务端会话记忆：前端未携带历史时从会话记忆中读取
+        session_id = data.get("session_id")
+        if session_id and not chat_history:
+            chat_history = await sync_to_async(ChatMemoryStore.get_history, thread_sensitive=False)(session_id)
+
+        # 回答缓存：相同问题且人流快照未明显变化时直接回放事件流
+        answer_cache = await sync_to_async(AnswerCache, thread_sensitive=False)(user_message, chat_history, model_type)
+        cached_events = await sync_to_async(answer_cache.lookup, thread_sensitive=False)()
+
+        async def remember(events):
+            """将本轮问答追加到会话记忆"""
+            if not session_id:
+                return
+            answer = _collect_answer_text(events)
+            await sync_to_async(ChatMemoryStore.append, thread_sensitive=False)(session_id, "user", user_message)
+            if answer:
+                await sync_to_async(ChatMemoryStore.append, thread_sensitive=False)(session_id, "assistant", answer)
+
         async def stream_generator():
             try:
-                async for chunk in get_agent_response(user_message, chat_history, model_type=model_type):
-                    data_out = chunk if isinstance(chunk, str) else json.dumps(chunk, ensure_ascii=False)
-                    yield f"data: {data_out}\n\n"
+                if cached_events is not None:
+                    for data_out in cached_events:
+                        yield f"data: {data_out}\n\n"
                     await asyncio.sleep(0)
+                    await remember(cached_events)
+                    return
+
+                events = []
+                # 相邻文本事件按约30ms窗口合并为一帧，减少SSE帧数
+                agent_stream = get_agent_response(user_message, chat_history, model_type=model_type)
+                async for data_out in coalesce_stream_events(agent_stream):
+                    events.append(data_out)
+                    yield f"data: {data_out}\n\n"
+                await sync_to_async(answer_cache.store, thread_sensitive=False)(events)
+                await remember(events)
             except Exception as e:
                 import traceback
                 traceback_str = traceback.format_exc()
@@ -276,5 +330,6 @@ class AgentChatView(View):
         response['Expires'] = '0'
         response['X-Accel-Buffering'] = 'no'  # 禁用nginx缓冲
         response['Connection'] = 'keep-alive'
+        response['X-Answer-Cache'] = 'hit' if cached_events is not None else 'miss'
         
         return response
\ No newline at end of file
@@ -8,11 +8,20 @@ from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
 from .models import ProcessTerminal, HardwareNode, Area, HistoricalData
+from .terminal_logs import push_terminal_logs, replace_terminal_logs
 
 logger = logging.getLogger('django')
 
 class TerminalConsumer(AsyncWebsocketConsumer):
     """终端WebSocket消费者，处理终端连接和消息"""
+
+    # 系统状态中需要同步到 ProcessTerminal 的字段
+    SYSTEM_STATUS_FIELDS = (
+        'cpu_usage', 'memory_usage', 'disk_usage', 'disk_free', 'disk_total',
+        'memory_available', 'memory_total', 'push_running', 'pull_running',
+        'model_loaded', 'nodes', 'co2_level', 'system_uptime', 'frame_rate',
+        'total_frames', 'terminal_id', 'mode', 'last_detection',
+    )
     
     async def connect(self):
         """处理WebSocket连接"""
@@ -89,7 +98,7 @@ class TerminalConsumer(AsyncWebsocketConsumer):
             logger.debug(f"从终端 {self.terminal_id} 接收到消息类型: {message_type}")
             
             # 检查是否为检测端特有的消息类型
-            detector_message_types = ['system_status', 'heartbeat', 'nodes_data', 'log', 'command_response']
+            detector_message_types = ['system_status', 'heartbeat', 'nodes_data', 'log', 'logs_batch', 'command_response']
             if message_type in detector_message_types and not self.is_detector:
                 # 如果收到检测端特有消息类型，标记当前连接为检测端
                 self.is_detector = True
@@ -131,6 +140,18 @@ class TerminalConsumer(AsyncWebsocketConsumer):
                 )
                 # 新增：检测端已确认上线后，立即下发待发命令队列
                 await self.flush_pending_commands()
+
+            # 按消息类型分发到对应的处理方法
+            handler = {
+                'system_status': self.handle_system_status,
+                'heartbeat': self.handle_heartbeat,
+                'nodes_data': self.handle_nodes_data,
+                'log': self.handle_log_message,
+                'logs_batch': self.handle_logs_batch,
+                'command_response': self.handle_command_response,
+            }.get(message_type)
+            if handler:
+                await handler(data)
         except json.JSONDecodeError:
             logger.error(f"收到无效的JSON数据: {text_data[:100]}...")
         except Exception as e:
@@ -160,20 +181,37 @@ class TerminalConsumer(AsyncWebsocketConsumer):
         )
     
     async def handle_system_status(self, data):
-        """处理系统状态更新消息"""
+        """处理系统状态更新消息（支持全量与增量两种格式）"""
         status_data = data.get('status', {})
-        if not status_data:
+        is_delta = bool(data.get('delta', False))
+        if not status_data and not is_delta:
             return
-            
+
+        cache_key = f"terminal:{self.terminal_id}:status"
+        if is_delta:
+            # 增量消息：合并到缓存中的上一份完整状态
+            cached_status = cache.get(cache_key)
+            if not cached_status:
+                # 缓存已过期或尚未收到全量状态，请求检测端重新上报
+                logger.info(f"终端 {self.terminal_id} 缺少基准状态，忽略增量并请求全量状态")
+                await self.send_command({'command': 'get_status', 'params': {}})
+                return
+            merged_status = dict(cached_status)
+            merged_status.update(status_data)
+            for key in data.get('removed', []) or []:
+                merged_status.pop(key, None)
+        else:
+            merged_status = status_data
+
         # 确保状态数据有时间戳
-        if 'timestamp' not in status_data:
-            status_data['timestamp'] = timezone.now().isoformat()
-            
-        # 更新数据库中的终端状态
+        merged_status['timestamp'] = data.get('timestamp') or timezone.now().isoformat()
+
+        # 更新数据库中的终端状态（仅写入本次变化的字段）
         await self.update_terminal_system_status(self.terminal_id, status_data)
-        
+        merged_status["terminal_online"] = True
+        status_data = merged_status
+
         # 更新Redis缓存 - 保留60秒
-        cache_key = f"terminal:{self.terminal_id}:status"
         cache.set(cache_key, status_data, timeout=60)
         
         # 广播状态消息给所有连接的客户端 - 不包括发送者
@@ -198,35 +236,21 @@ class TerminalConsumer(AsyncWebsocketConsumer):
             # 更新数据库中的模式
             await self.update_terminal_mode(self.terminal_id, status_data['mode'])
     
-    async def handle_log_message(self, data):
-        """处理日志消息"""
-        # 添加到日志缓存
-        cache_key = f"terminal:{self.terminal_id}:logs"
-        
-        # 获取现有日志
-        logs = cache.get(cache_key) or []
-        
-        # 添加新日志
-        log_entry = {
+    def _build_log_entry(self, data):
+        """规范化检测端上报的单条日志"""
+        return {
             'timestamp': data.get('timestamp', timezone.now().isoformat()),
             'level': data.get('level', 'info'),
             'message': data.get('message', ''),
             'source': data.get('source', 'system')
         }
-        
-        # 将新日志添加到列表开头
-        logs.insert(0, log_entry)
-        
-        # 限制日志数量
-        if len(logs) > 500:
-            logs = logs[:500]
-        
-        # 更新缓存，延长过期时间
-        try:
-            cache.set(cache_key, logs, timeout=1800)  # 30分钟过期
-            logger.debug(f"更新终端 {self.terminal_id} 日志缓存，当前日志数量: {len(logs)}")
-        except Exception as e:
-            logger.error(f"缓存日志时出错: {str(e)}")
+
+    async def handle_log_message(self, data):
+        """处理日志消息"""
+        log_entry = self._build_log_entry(data)
+
+        # 添加到日志缓存（原生Redis列表，自动截断与续期）
+        await database_sync_to_async(push_terminal_logs, thread_sensitive=False)(self.terminal_id, [log_entry])
         
         # 广播日志消息
         await self.channel_layer.group_send(
@@ -240,6 +264,31 @@ class TerminalConsumer(AsyncWebsocketConsumer):
                 }
             }
         )
+
+    async def handle_logs_batch(self, data):
+        """处理批量日志消息：整批一次写入缓存并一次广播"""
+        entries = [self._build_log_entry(item) for item in (data.get('logs') or []) if isinstance(item, dict)]
+        dropped = data.get('dropped', 0)
+        if dropped:
+            logger.info(f"终端 {self.terminal_id} 日志积压，采样丢弃 {dropped} 条低级别日志")
+        if not entries:
+            return
+
+        count = await database_sync_to_async(push_terminal_logs, thread_sensitive=False)(self.terminal_id, entries)
+        logger.debug(f"更新终端 {self.terminal_id} 日志缓存，本批写入: {count}")
+
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                'type': 'broadcast_message',
+                'message': {
+                    'type': 'logs_batch',
+                    'data': entries,
+                    'dropped': dropped,
+                    'timestamp': timezone.now().isoformat()
+                }
+            }
+        )
     
     async def handle_heartbeat(self, data):
         """处理心跳消息"""
@@ -336,9 +385,8 @@ class TerminalConsumer(AsyncWebsocketConsumer):
         # 特殊处理get_logs命令的响应 - 将日志数据保存到缓存
         elif command == 'get_logs' and success and result:
             try:
-                cache_key = f"terminal:{self.terminal_id}:logs"
                 # 保存日志数据到缓存，30分钟过期
-                cache.set(cache_key, result, timeout=1800)
+                await database_sync_to_async(replace_terminal_logs, thread_sensitive=False)(self.terminal_id, result)
                 logger.info(f"已将终端 {self.terminal_id} 的 {len(result)} 条日志保存到缓存")
             except Exception as e:
                 logger.error(f"保存终端 {self.terminal_id} 日志到缓存失败: {str(e)}")
@@ -419,49 +467,16 @@ class TerminalConsumer(AsyncWebsocketConsumer):
         try:
             terminal = ProcessTerminal.objects.get(id=terminal_id)
             
-            # 更新状态字段
-            if 'cpu_usage' in status_data:
-                terminal.cpu_usage = status_data['cpu_usage']
-            if 'memory_usage' in status_data:
-                terminal.memory_usage = status_data['memory_usage']
-            if 'disk_usage' in status_data:
-                terminal.disk_usage = status_data['disk_usage']
-            if 'disk_free' in status_data:
-                terminal.disk_free = status_data['disk_free']
-            if 'disk_total' in status_data:
-                terminal.disk_total = status_data['disk_total']
-            if 'memory_available' in status_data:
-                terminal.memory_available = status_data['memory_available']
-            if 'memory_total' in status_data:
-                terminal.memory_total = status_data['memory_total']
-            if 'push_running' in status_data:
-                terminal.push_running = status_data['push_running']
-            if 'pull_running' in status_data:
-                terminal.pull_running = status_data['pull_running']
-            if 'model_loaded' in status_data:
-                terminal.model_loaded = status_data['model_loaded']
-            if 'nodes' in status_data:
-                terminal.nodes = status_data['nodes']
-            if 'co2_level' in status_data:
-                terminal.co2_level = status_data['co2_level']
-            if 'system_uptime' in status_data:
-                terminal.system_uptime = status_data['system_uptime']
-            if 'frame_rate' in status_data:
-                terminal.frame_rate = status_data['frame_rate']
-            if 'total_frames' in status_data:
-                terminal.total_frames = status_data['total_frames']
-            if 'terminal_id' in status_data:
-                terminal.terminal_id = status_data['terminal_id']
-            if 'mode' in status_data:
-                terminal.mode = status_data['mode']
-            if 'last_detection' in status_data:
-                terminal.last_detection = status_data['last_detection']
-                
+            # 更新状态字段，只记录真正发生变化的字段
+            update_fields = []
+            for field in self.SYSTEM_STATUS_FIELDS:
+                if field in status_data and getattr(terminal, field) != status_data[field]:
+                    setattr(terminal, field, status_data[field])
+                    update_fields.append(field)
+
             terminal.last_active = timezone.now()
-            terminal.save()
-            
-            # 添加在线状态到缓存数据
-            status_data["terminal_online"] = True
+            update_fields.append('last_active')
+            terminal.save(update_fields=update_fields)
             
             return True
         except ProcessTerminal.DoesNotExist:
@@ -481,6 +496,28 @@ class TerminalConsumer(AsyncWebsocketConsumer):
                 if not node_id:
                     continue
                     
+                # 终端死区上报：保活消息表示结果与上次上报相同，两次上报之间的空档按未变化处理，
+                # 用一条 UPDATE 写入节点字段（不整行保存节点）并补一条历史记录
+                series = node_data.get('series') or {}
+                if series.get('unchanged'):
+                    now = timezone.now()
+                    fields = {'updated_at': now}
+                    for key in ('detected_count', 'temperature', 'humidity'):
+                        if node_data.get(key) is not None:
+                            fields[key] = node_data[key]
+                    if HardwareNode.objects.filter(id=node_id).update(**fields):
+                        updated_nodes.append(node_id)
+                        area = Area.objects.filter(bound_node_id=node_id).first()
+                        if area is not None and 'detected_count' in node_data:
+                            HistoricalData.objects.create(
+                                area=area,
+                                detected_count=node_data['detected_count'],
+                                timestamp=now
+                            )
+                    else:
+                        logger.warning(f"节点 {node_id} 不存在，无法更新数据")
+                    continue
+                    
                 try:
                     node = HardwareNode.objects.get(id=node_id)
                     
@@ -0,0 +1,68 @@
+import json
+import logging
+from django_redis import get_redis_connection
+
+logger = logging.getLogger('django')
+
+# 每个终端最多保留的日志条数与过期时间
+MAX_TERMINAL_LOGS = 500
+TERMINAL_LOGS_TTL = 1800  # 30分钟
+
+
+def _logs_key(terminal_id):
+    """终端日志列表的Redis键（原生list，最新的日志在表头）"""
+    return f"terminal:{terminal_id}:logs_list"
+
+
+def push_terminal_logs(terminal_id, entries):
+    """按时间顺序追加一批日志，整批在一个事务管道中完成 LPUSH/LTRIM/EXPIRE"""
+    if not entries:
+        return 0
+    try:
+        key = _logs_key(terminal_id)
+        conn = get_redis_connection("default")
+        pipe = conn.pipeline(transaction=True)
+        pipe.lpush(key, *[json.dumps(entry, ensure_ascii=False) for entry in entries])
+        pipe.ltrim(key, 0, MAX_TERMINAL_LOGS - 1)
+        pipe.expire(key, TERMINAL_LOGS_TTL)
+        pipe.execute()
+        return len(entries)
+    except Exception as e:
+        logger.error(f"写入终端 {terminal_id} 日志缓存失败: {str(e)}")
+        return 0
+
+
+def replace_terminal_logs(terminal_id, entries):
+    """用检测端返回的完整日志（最新在前）替换缓存"""
+    try:
+        key = _logs_key(terminal_id)
+        conn = get_redis_connection("default")
+        pipe = conn.pipeline(transaction=True)
+        pipe.delete(key)
+        if entries:
+            entries = list(entries)[:MAX_TERMINAL_LOGS]
+            pipe.rpush(key, *[json.dumps(entry, ensure_ascii=False) for entry in entries])
+            pipe.expire(key, TERMINAL_LOGS_TTL)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"替换终端 {terminal_id} 日志缓存失败: {str(e)}")
+        return False
+
+
+def get_terminal_logs(terminal_id, limit=100):
+    """读取最近的日志（最新在前）"""
+    try:
+        conn = get_redis_connection("default")
+        end = (int(limit) - 1) if limit and int(limit) > 0 else -1
+        raw_logs = conn.lrange(_logs_key(terminal_id), 0, end)
+        logs = []
+        for raw in raw_logs:
+            try:
+                logs.append(json.loads(raw))
+            except (TypeError, ValueError):
+                continue
+        return logs
+    except Exception as e:
+        logger.error(f"读取终端 {terminal_id} 日志缓存失败: {str(e)}")
+        return []
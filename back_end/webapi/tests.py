@@ -1,3 +1,52 @@
+from asgiref.sync import async_to_sync
 from django.test import TestCase
 
-# Create your tests here.
+from .consumers import TerminalConsumer
+from .models import Area, Building, HardwareNode, HistoricalData, ProcessTerminal
+
+
+class DeadbandKeepaliveTests(TestCase):
+    """终端死区上报的保活消息：一条 UPDATE 同步节点字段并补历史记录"""
+
+    def setUp(self):
+        terminal = ProcessTerminal.objects.create()
+        self.node = HardwareNode.objects.create(
+            name='节点1', terminal=terminal, detected_count=5, temperature=20.0, humidity=40.0
+        )
+        building = Building.objects.create(name='图书馆')
+        self.area = Area.objects.create(name='阅览室', bound_node=self.node, type=building)
+        self.consumer = TerminalConsumer()
+
+    def update_nodes_data(self, nodes_data):
+        return async_to_sync(self.consumer.update_nodes_data)(nodes_data)
+
+    def test_keepalive_updates_node_fields_together(self):
+        before = HardwareNode.objects.get(id=self.node.id).updated_at
+        updated = self.update_nodes_data([{
+            'id': self.node.id,
+            'detected_count': 6,
+            'temperature': 20.3,
+            'humidity': 41.0,
+            'series': {'mode': 'deadband', 'unchanged': True},
+        }])
+
+        self.assertEqual(updated, [self.node.id])
+        node = HardwareNode.objects.get(id=self.node.id)
+        self.assertEqual(node.detected_count, 6)
+        self.assertEqual(node.temperature, 20.3)
+        self.assertEqual(node.humidity, 41.0)
+        self.assertGreaterEqual(node.updated_at, before)
+        self.assertEqual(
+            list(HistoricalData.objects.filter(area=self.area).values_list('detected_count', flat=True)),
+            [6],
+        )
+
+    def test_keepalive_for_unknown_node_is_skipped(self):
+        updated = self.update_nodes_data([{
+            'id': self.node.id + 100,
+            'detected_count': 6,
+            'series': {'mode': 'deadband', 'unchanged': True},
+        }])
+
+        self.assertEqual(updated, [])
+        self.assertFalse(HistoricalData.objects.exists())
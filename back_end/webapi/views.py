@@ -13,6 +13,7 @@ from django.utils import timezone
 from .models import *
 from .serializers import *
 from .permissions import StaffEditSelected
+from .terminal_logs import get_terminal_logs
 
 
 
@@ -190,18 +191,9 @@ class ProcessTerminalViewSet(viewsets.ModelViewSet):
         """获取终端日志（仅从Redis缓存，不从数据库字段）"""
         terminal = self.get_object()
         limit = int(request.query_params.get('limit', 100))
-        cache_key = f"terminal:{pk}:logs"
-        cached_logs = cache.get(cache_key)
-        if cached_logs:
-            logger.debug(f"从缓存获取终端{pk}日志")
-            if limit and limit < len(cached_logs):
-                return Response(cached_logs[:limit])
-            return Response(cached_logs)
-        # 没有缓存则返回空列表并写入缓存
-        empty_logs = []
-        cache.set(cache_key, empty_logs, timeout=120)
-        logger.debug(f"设置空日志缓存: {cache_key}")
-        return Response(empty_logs)
+        logs = get_terminal_logs(pk, limit)
+        logger.debug(f"从缓存获取终端{pk}日志: {len(logs)} 条")
+        return Response(logs)
 
     @action(detail=True, methods=['get', 'post'])
     def config(self, request, pk=None):
@@ -589,6 +581,22 @@ class DataUploadView(APIView):
         except KeyError as e:
             return Response({"error": f"缺失字段: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
+        # 终端死区上报的保活结果：与上次上报相同，用一条 UPDATE 写入节点字段，不整行保存节点
+        series = request.data.get('series') or {}
+        if isinstance(series, dict) and series.get('unchanged'):
+            fields = {'detected_count': detected_count, 'updated_at': timestamp}
+            if temperature is not None:
+                fields['temperature'] = temperature
+            if humidity is not None:
+                fields['humidity'] = humidity
+            if not HardwareNode.objects.filter(id=hardware_node_id).update(**fields):
+                return Response({"error": "硬件节点不存在"}, status=status.HTTP_404_NOT_FOUND)
+            area = Area.objects.filter(bound_node_id=hardware_node_id).first()
+            if area is None:
+                return Response({"error": "硬件节点未绑定到任何区域"}, status=status.HTTP_404_NOT_FOUND)
+            HistoricalData.objects.create(area=area, detected_count=detected_count, timestamp=timestamp)
+            return Response({"message": "检测结果上传成功"}, status=status.HTTP_201_CREATED)
+
         try:
             # 获取硬件节点
             hardware_node = HardwareNode.objects.get(id=hardware_node_id)
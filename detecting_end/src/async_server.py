@@ -0,0 +1,128 @@
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from aiohttp import web
+    from multidict import CIMultiDict
+except ImportError:  # aiohttp 为可选依赖，缺失时回退到 Flask 开发服务器
+    web = None
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+logger = logging.getLogger('async_server')
+
+# WSGI 响应中由 aiohttp 自行处理的头部
+_SKIP_HEADERS = {'content-length', 'transfer-encoding', 'connection'}
+
+
+def is_available():
+    """是否安装了 aiohttp"""
+    return web is not None
+
+
+class AsyncHTTPServer:
+    """
+    异步HTTP服务器
+    与WebSocket客户端运行在同一个事件循环上：
+    - /api/push_frame/<node_id> 原生异步处理，解码与推理放到线程池执行
+    - 其余路由原样转交给 Flask 应用（在线程池中执行），保持路由与JSON格式不变
+    """
+
+    def __init__(self, flask_app, push_frame_handler, host='0.0.0.0', port=5000, workers=4):
+        self.flask_app = flask_app
+        self.push_frame_handler = push_frame_handler
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="HTTPWorker")
+        self.runner = None
+        # 在重建的事件循环上重启失败时置位，主线程据此回退到 Flask
+        self.failed = False
+
+    def _build_app(self):
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post(r'/api/push_frame/{node_id:\d+}', self.handle_push_frame)
+        app.router.add_route('*', '/{tail:.*}', self.handle_wsgi)
+        return app
+
+    async def start(self):
+        """在当前事件循环上启动服务器（事件循环重建后可再次调用）"""
+        if not is_available():
+            raise RuntimeError("未安装 aiohttp，无法启动异步HTTP服务器")
+        self.runner = web.AppRunner(self._build_app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        logger.info(f"异步HTTP服务器已启动: http://{self.host}:{self.port}")
+
+    async def stop(self, shutdown_executor=True):
+        """停止服务器；shutdown_executor=False 时保留线程池，用于事件循环重建后重启"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        if shutdown_executor:
+            self.executor.shutdown(wait=False)
+        logger.info("异步HTTP服务器已停止")
+
+    async def handle_push_frame(self, request):
+        """接收节点推送的图像与环境数据"""
+        node_id = int(request.match_info['node_id'])
+        try:
+            form = await request.post()
+            image_field = form.get('image')
+            image_data = image_field.file.read() if hasattr(image_field, 'file') else None
+            temperature = self._to_float(form.get('temperature'))
+            humidity = self._to_float(form.get('humidity'))
+        except Exception as e:
+            logger.error(f"解析推送数据失败: {str(e)}")
+            return self._json({"status": "error", "message": str(e)}, 400)
+
+        loop = asyncio.get_running_loop()
+        result, status_code = await loop.run_in_executor(
+            self.executor, self.push_frame_handler, node_id, image_data, temperature, humidity
+        )
+        return self._json(result, status_code)
+
+    async def handle_wsgi(self, request):
+        """将请求转交给 Flask 应用处理"""
+        body = await request.read()
+        builder = EnvironBuilder(
+            path=request.path,
+            method=request.method,
+            headers=list(request.headers.items()),
+            data=body,
+            query_string=request.query_string,
+        )
+        environ = builder.get_environ()
+        environ['REMOTE_ADDR'] = request.remote or ''
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(self.executor, self._call_wsgi, environ)
+        headers = [(key, value) for key, value in headers if key.lower() not in _SKIP_HEADERS]
+        return web.Response(body=content, status=status, headers=CIMultiDict(headers))
+
+    def _call_wsgi(self, environ):
+        app_iter, status, headers = run_wsgi_app(self.flask_app.wsgi_app, environ, buffered=True)
+        try:
+            content = b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        return int(status.split(' ', 1)[0]), list(headers.items()), content
+
+    @staticmethod
+    def _json(data, status_code=200):
+        response = web.Response(
+            text=json.dumps(data),  # 与 Flask jsonify 的默认编码保持一致
+            status=status_code,
+            content_type='application/json',
+        )
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    @staticmethod
+    def _to_float(value):
+        try:
+            return float(value) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,315 @@
+"""
+检测流水线基准测试：在本机启动 N 个模拟 ESP32 节点与模拟后端，驱动 DetectionManager 运行拉取/推送模式，
+报告吞吐量(fps)、各阶段耗时分位数、CPU 与内存占用。默认使用假模型，可完全离线运行。
+
+用法（在 src 目录下）：
+    python -m bench.run --nodes 4 --mode pull --duration 30
+    python -m bench.run --nodes 8 --mode push --push-fps 2 --backend fake --infer-ms 30 --workers 2
+    python -m bench.run --backend onnx --json report.json      # 使用真实模型
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+
+import psutil
+
+from config_manager import ConfigManager
+from node_manager import NodeManager
+from detection_manager import DetectionManager
+from image_archive import ImageArchive
+from websocket_client import TerminalWebSocketClient
+from metrics import metrics, STAGES
+from bench.sim_nodes import start_nodes
+from bench.stub_backend import StubBackend
+
+logger = logging.getLogger('bench')
+
+
+class ResourceSampler:
+    """周期采样本进程及子进程（推理工作进程）的 CPU 与内存"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.children = {}
+        self.cpu_samples = []
+        self.rss_peak = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _processes(self):
+        for child in self.process.children(recursive=True):
+            if child.pid not in self.children:
+                self.children[child.pid] = child
+                child.cpu_percent(None)
+        return [self.process] + list(self.children.values())
+
+    def _run(self):
+        self.process.cpu_percent(None)
+        while not self.stop_event.wait(self.interval):
+            cpu, rss = 0.0, 0
+            for proc in self._processes():
+                try:
+                    cpu += proc.cpu_percent(None)
+                    rss += proc.memory_info().rss
+                except psutil.Error:
+                    self.children.pop(proc.pid, None)
+            self.cpu_samples.append(cpu)
+            self.rss_peak = max(self.rss_peak, rss)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name='bench-sampler')
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        samples = self.cpu_samples or [0.0]
+        return {
+            'cpu_avg_percent': round(sum(samples) / len(samples), 1),
+            'cpu_max_percent': round(max(samples), 1),
+            'rss_peak_mb': round(self.rss_peak / 1024 / 1024, 1),
+            'cpu_count': psutil.cpu_count(),
+        }
+
+
+def build_config(args, nodes, backend_url):
+    """生成基准测试使用的终端配置"""
+    return {
+        'mode': args.mode,
+        'interval': args.interval,
+        'nodes': {
+            'data_nodes': {
+                node.node_id: {'type': 'data', 'ip': '127.0.0.1', 'port': node.port, 'name': f'模拟节点{node.node_id}'}
+                for node in nodes
+            },
+            'control_nodes': {},
+        },
+        'save_image': args.save_image,
+        'preload_model': False,
+        'terminal_id': 1,
+        'server_url': backend_url,
+        # 不可达地址：WebSocket 不可用时 HTTP 回退立即失败，不会访问外网
+        'api_url': 'http://127.0.0.1:9/api/upload/',
+        'inference': {'backend': args.backend, 'infer_ms': args.infer_ms, 'imgsz': args.imgsz},
+        'inference_workers': args.workers,
+        'change_gate': {'enabled': not args.no_gate},
+        'pull_schedule': {'enabled': args.adaptive},
+        'report_deadband': {'enabled': not args.no_deadband},
+    }
+
+
+def start_ws_client(url):
+    """在独立线程的事件循环中运行终端 WebSocket 客户端"""
+    client = TerminalWebSocketClient(f"{url}/ws/terminal/1/", 1)
+    loop = asyncio.new_event_loop()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        client.loop = loop
+        loop.create_task(client.start())
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True, name='bench-ws').start()
+    deadline = time.time() + 10
+    while not client.is_connected() and time.time() < deadline:
+        time.sleep(0.1)
+    if not client.is_connected():
+        logger.warning("终端未能连接模拟后端，结果将走HTTP回退")
+    return client, loop
+
+
+def stop_ws_client(client, loop):
+    try:
+        asyncio.run_coroutine_threadsafe(client.stop(), loop).result(timeout=5)
+    except Exception as e:
+        logger.warning(f"停止WebSocket客户端失败: {str(e)}")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def push_driver(detection_manager, node, fps, stop_event, results):
+    """模拟节点按固定帧率推送图像（直接调用推送处理流程，不经过HTTP层）"""
+    period = 1.0 / fps
+    next_time = time.perf_counter()
+    while not stop_event.is_set():
+        result = detection_manager.process_received_frame(node.node_id, node.next_frame())
+        results['ok' if result.get('status') == 'success' else 'error'] += 1
+        next_time += period
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            stop_event.wait(delay)
+        else:
+            # 处理跟不上推送帧率时不累积欠账
+            next_time = time.perf_counter()
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='detect_bench_')
+    backend = StubBackend().start()
+    nodes = start_nodes(
+        args.nodes,
+        frame_size=args.frame_size,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+    )
+    ws_client, ws_loop = start_ws_client(backend.url)
+
+    config_path = os.path.join(work_dir, 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(build_config(args, nodes, backend.url), f, ensure_ascii=False)
+    config_manager = ConfigManager(config_path)
+    node_manager = NodeManager(config_manager)
+    archive = None
+    if args.save_image:
+        archive = ImageArchive(os.path.join(work_dir, 'captures'))
+        archive.start()
+        node_manager.set_archive(archive)
+
+    detection_manager = DetectionManager(config_manager, node_manager, None, ws_client, None)
+    print(f"加载推理后端: {args.backend}（工作进程: {args.workers}）...")
+    if not detection_manager._load_model():
+        raise RuntimeError("模型加载失败")
+
+    push_stop = threading.Event()
+    push_results = {'ok': 0, 'error': 0}
+    push_threads = []
+    if args.mode in ('pull', 'both'):
+        detection_manager.start_pull()
+    if args.mode in ('push', 'both'):
+        detection_manager.start_push()
+        for node in nodes:
+            thread = threading.Thread(target=push_driver, daemon=True,
+                                      args=(detection_manager, node, args.push_fps, push_stop, push_results))
+            thread.start()
+            push_threads.append(thread)
+
+    try:
+        if args.warmup > 0:
+            print(f"预热 {args.warmup} 秒...")
+            time.sleep(args.warmup)
+        metrics.reset()
+        backend_before = backend.snapshot()
+        sampler = ResourceSampler()
+        sampler.start()
+        print(f"测量 {args.duration} 秒（{args.nodes} 个节点，模式 {args.mode}）...")
+        start = time.perf_counter()
+        time.sleep(args.duration)
+        elapsed = time.perf_counter() - start
+        resources = sampler.stop()
+        latency = metrics.summary()
+        backend_after = backend.snapshot()
+    finally:
+        push_stop.set()
+        for thread in push_threads:
+            thread.join(timeout=5)
+        if detection_manager.pull_running:
+            detection_manager.stop_pull()
+        if detection_manager.push_running:
+            detection_manager.stop_push()
+        detection_manager.stop_inference_pool()
+        if archive:
+            archive.stop()
+        stop_ws_client(ws_client, ws_loop)
+        for node in nodes:
+            node.stop()
+        backend.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    frames = (latency.get('e2e') or {}).get('count', 0)
+    inferences = (latency.get('infer') or {}).get('count', 0)
+    node_requests = sum(node.stats['requests'] for node in nodes)
+    node_failures = sum(node.stats['failures'] for node in nodes)
+    uplink = backend_after['node_entries'] - backend_before['node_entries']
+    return {
+        'config': {
+            'nodes': args.nodes,
+            'mode': args.mode,
+            'backend': args.backend,
+            'workers': args.workers,
+            'frame_size': list(args.frame_size),
+            'latency_ms': args.latency_ms,
+            'failure_rate': args.failure_rate,
+            'change_gate': not args.no_gate,
+            'deadband': not args.no_deadband,
+            'adaptive_schedule': args.adaptive,
+        },
+        'duration_s': round(elapsed, 2),
+        'frames': frames,
+        'fps': round(frames / elapsed, 2) if elapsed else 0.0,
+        'inferences': inferences,
+        'infer_fps': round(inferences / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {stage: latency[stage] for stage in STAGES if stage in latency},
+        'resources': resources,
+        'node_requests': node_requests,
+        'node_failures': node_failures,
+        'push_results': push_results if args.mode in ('push', 'both') else None,
+        'uplink_node_entries': uplink,
+    }
+
+
+def print_report(report):
+    print()
+    print(f"吞吐量: {report['fps']} fps（{report['frames']} 帧 / {report['duration_s']} 秒），"
+          f"实际推理 {report['infer_fps']} fps")
+    print(f"{'阶段':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'样本数':>10}")
+    for stage, summary in report['latency_ms'].items():
+        print(f"{stage:<10}{str(summary['p50_ms']):>10}{str(summary['p95_ms']):>10}{summary['count']:>10}")
+    resources = report['resources']
+    print(f"CPU: 平均 {resources['cpu_avg_percent']}% / 峰值 {resources['cpu_max_percent']}%"
+          f"（{resources['cpu_count']} 核），内存峰值 {resources['rss_peak_mb']} MB")
+    print(f"节点请求 {report['node_requests']} 次，失败 {report['node_failures']} 次；"
+          f"上行节点数据 {report['uplink_node_entries']} 条")
+
+
+def parse_frame_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检测流水线基准测试（模拟ESP32节点与后端）")
+    parser.add_argument('--nodes', type=int, default=4, help="模拟节点数")
+    parser.add_argument('--mode', choices=('pull', 'push', 'both'), default='pull', help="检测模式")
+    parser.add_argument('--duration', type=float, default=30, help="测量时长（秒）")
+    parser.add_argument('--warmup', type=float, default=5, help="预热时长（秒），不计入结果")
+    parser.add_argument('--interval', type=float, default=0, help="拉取模式轮询间隔（秒）")
+    parser.add_argument('--adaptive', action='store_true', help="启用自适应采样调度")
+    parser.add_argument('--push-fps', type=float, default=1.0, help="推送模式下每个节点的帧率")
+    parser.add_argument('--latency-ms', type=float, default=50, help="模拟节点平均响应延迟")
+    parser.add_argument('--jitter-ms', type=float, default=20, help="模拟节点延迟抖动（标准差）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="模拟节点请求失败率（0~1）")
+    parser.add_argument('--frame-size', type=parse_frame_size, default=(640, 480), help="帧尺寸，如 1024x768")
+    parser.add_argument('--backend', choices=('fake', 'pytorch', 'onnx'), default='fake', help="推理后端")
+    parser.add_argument('--infer-ms', type=float, default=20, help="假模型的模拟推理耗时")
+    parser.add_argument('--imgsz', type=int, default=640, help="推理输入尺寸")
+    parser.add_argument('--workers', type=int, default=0, help="推理工作进程数，0为主进程内推理")
+    parser.add_argument('--no-gate', action='store_true', help="关闭变化门控")
+    parser.add_argument('--no-deadband', action='store_true', help="关闭死区上报")
+    parser.add_argument('--save-image', action='store_true', help="同时测量图像归档开销")
+    parser.add_argument('--json', help="将报告写入JSON文件")
+    parser.add_argument('--verbose', action='store_true', help="输出检测端日志")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
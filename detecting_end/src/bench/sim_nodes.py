@@ -0,0 +1,146 @@
+"""
+模拟 ESP32-CAM 节点：本地 HTTP 服务，提供 /capture、/stream、/status、/environment、/control
+延迟、失败率与帧尺寸可配置，用于离线基准测试
+"""
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import cv2
+import numpy as np
+
+# 每个节点预先编码的帧数，循环返回，避免编码耗时干扰测量
+FRAME_POOL_SIZE = 8
+
+
+def make_frames(width, height, count=FRAME_POOL_SIZE, seed=0, quality=80):
+    """生成一组带移动色块的合成JPEG帧（相邻帧有变化，不会被变化门控全部跳过）"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+    frames = []
+    for index in range(count):
+        image = background.copy()
+        for _ in range(int(rng.integers(1, 6))):
+            x = int(rng.integers(0, max(1, width - width // 8)))
+            y = int(rng.integers(0, max(1, height - height // 4)))
+            color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+            cv2.rectangle(image, (x, y), (x + width // 8, y + height // 4), color, -1)
+        ok, encoded = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if ok:
+            frames.append(encoded.tobytes())
+    return frames
+
+
+class SimulatedNode:
+    """单个模拟节点，监听 127.0.0.1 的随机端口"""
+
+    def __init__(self, node_id, frame_size=(640, 480), latency_ms=50, jitter_ms=20, failure_rate=0.0, seed=None):
+        self.node_id = str(node_id)
+        self.frame_size = tuple(frame_size)
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.failure_rate = float(failure_rate)
+        self.random = random.Random(seed if seed is not None else node_id)
+        self.frames = make_frames(self.frame_size[0], self.frame_size[1], seed=int(self.random.random() * 1e6))
+        self.frame_index = 0
+        self.stats = {'requests': 0, 'failures': 0, 'frames': 0}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True,
+                                       name=f"sim-node-{self.node_id}")
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def next_frame(self):
+        with self.lock:
+            frame = self.frames[self.frame_index % len(self.frames)]
+            self.frame_index += 1
+            self.stats['frames'] += 1
+        return frame
+
+    def _delay_and_maybe_fail(self):
+        """模拟网络/采集延迟，按失败率返回 True 表示本次请求失败"""
+        delay = max(0.0, self.random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        time.sleep(delay)
+        with self.lock:
+            self.stats['requests'] += 1
+            failed = self.random.random() < self.failure_rate
+            if failed:
+                self.stats['failures'] += 1
+        return failed
+
+    def _make_handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.0'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, payload):
+                self._send(200, json.dumps(payload).encode('utf-8'), 'application/json')
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0].rstrip('/')
+                if node._delay_and_maybe_fail():
+                    self._send(500, b'simulated failure', 'text/plain')
+                    return
+                if path == '/capture':
+                    self._send(200, node.next_frame(), 'image/jpeg')
+                elif path == '/stream':
+                    # 只推送一帧的 MJPEG 流，与旧固件 /stream 的首帧读取逻辑一致
+                    frame = node.next_frame()
+                    boundary = 'frame'
+                    body = (f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(frame)}\r\n\r\n"
+                            .encode() + frame + f"\r\n--{boundary}\r\n".encode())
+                    self._send(200, body, f'multipart/x-mixed-replace; boundary={boundary}')
+                elif path == '/status':
+                    self._send_json({
+                        'device': {
+                            'type': 'data',
+                            'ip': '127.0.0.1',
+                            'rssi': -50,
+                            'uptime_ms': int((time.time() - node.started_at) * 1000),
+                            'capabilities': ['capture', 'stream', 'environment'],
+                        },
+                        'data': None,
+                    })
+                elif path == '/environment':
+                    self._send_json({'data': {
+                        'temperature': round(22 + node.random.uniform(-1, 1), 1),
+                        'humidity': round(45 + node.random.uniform(-3, 3), 1),
+                    }})
+                elif path == '/control':
+                    self._send(200, b'OK', 'text/plain')
+                else:
+                    self._send(404, b'not found', 'text/plain')
+
+        return Handler
+
+
+def start_nodes(count, first_id=1, **options):
+    """启动 count 个模拟节点，返回节点列表"""
+    return [SimulatedNode(first_id + index, **options).start() for index in range(count)]
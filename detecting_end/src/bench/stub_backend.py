@@ -0,0 +1,78 @@
+"""
+模拟后端 WebSocket 服务：接受终端连接 /ws/terminal/<id>/，统计收到的消息，不做任何回复
+"""
+import json
+import asyncio
+import threading
+from collections import Counter
+
+import websockets
+
+
+class StubBackend:
+    """在独立线程的事件循环中运行的 WebSocket 服务"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.message_types = Counter()
+        self.node_entries = 0
+        self.bytes_received = 0
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handler(self, websocket, path=None):
+        try:
+            async for raw in websocket:
+                try:
+                    message = json.loads(raw)
+                except (TypeError, ValueError):
+                    continue
+                with self.lock:
+                    self.bytes_received += len(raw)
+                    self.message_types[message.get('type', 'unknown')] += 1
+                    if message.get('type') == 'nodes_data':
+                        self.node_entries += len(message.get('nodes') or [])
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(websockets.serve(self._handler, self.host, self.port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+
+    def start(self, timeout=10):
+        self.thread = threading.Thread(target=self._run, daemon=True, name='stub-backend')
+        self.thread.start()
+        if not self.ready.wait(timeout):
+            raise RuntimeError("模拟后端启动超时")
+        return self
+
+    def stop(self):
+        if not self.loop:
+            return
+
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'messages': dict(self.message_types),
+                'node_entries': self.node_entries,
+                'bytes': self.bytes_received,
+            }
@@ -37,13 +37,64 @@ class ConfigManager:
         'light_control': {
             'default_angle': 90,
             'auto_return_time': 3
-        }
+        },
+        # 内存日志：条数上限，以及是否通过 mmap 持久化最近日志（重启后可恢复）
+        'max_memory_logs': 1000,
+        'persist_memory_logs': True,
+        'memory_log_file': 'logs/memory_logs.ring',  # 相对于项目根目录
+        'memory_log_slot_size': 512,  # 每条日志占用的字节数，超出部分截断
+        # 系统状态增量上报：每隔多少次上报发送一次全量状态
+        'status_full_every': 6,
+        # HTTP服务器：flask（默认开发服务器）或 async（aiohttp，与WebSocket共用事件循环）
+        'http_server': 'flask',
+        'http_workers': 4,  # 异步模式下处理推理与Flask路由的线程数
+        # 推理后端：pytorch（ultralytics）或 onnx（ONNX Runtime，首次启动时导出并缓存）
+        'inference': {
+            'backend': 'pytorch',
+            'threads': 0,   # ONNX Runtime 线程数，0 表示自动
+            'int8': False,  # 是否使用INT8动态量化模型
+            'imgsz': 640,
+        },
+        # 拉取模式自适应采样：按人数波动、时段与陈旧度为每个节点安排下次采样
+        'pull_schedule': {
+            'enabled': True,
+            'min_interval': None,   # 最短采样间隔（秒），未配置时使用 interval
+            'max_interval': 30,     # 最长采样间隔（秒）
+            'volatility_ref': 2.0,  # 平均每次采样人数变化达到该值时按最短间隔采样
+            'window': 10,           # 计算波动的最近采样数
+        },
+        # 死区上报：结果变化超过阈值或静默超过 max_silence 秒时才上报
+        'report_deadband': {
+            'enabled': True,
+            'count_threshold': 0,   # 人数变化超过该值时上报（0 表示任何变化都上报）
+            'env_threshold': 0.5,   # 温湿度变化超过该值时上报
+            'max_silence': 300,     # 最长静默时间（秒），到期发送保活结果
+        },
+        # 图像归档：后台写盘，按日期分目录，按总大小与天数清理
+        'archive': {
+            'max_queue': 64,       # 待写入队列长度，满时丢弃新图像
+            'max_size_mb': 2048,   # 归档总大小上限（MB），0 表示不限
+            'max_age_days': 7,     # 保存天数，0 表示不限
+            'quality': 90,         # 无原始JPEG时的编码质量
+        },
+        # 多进程推理工作进程数：0 为主进程内推理，负数为 CPU核数-1
+        'inference_workers': 0,
+        # 变化门控：与上一次推理帧相比变化很小时复用上次人数，跳过推理
+        'change_gate': {
+            'enabled': True,
+            'threshold': 0.01,     # 变化像素比例低于该值视为无变化
+            'pixel_delta': 25,     # 灰度差超过该值的像素计为变化
+            'max_staleness': 60,   # 最长复用时间（秒），超过后强制推理
+            'thumb_size': [64, 48],  # 比较用缩略图尺寸
+        },
     }
     
     def __init__(self, config_file='config.json'):
         """初始化配置管理器"""
         self.config_file = os.path.join(ROOT_DIR, config_file)
         self.config = self.load_config()
+        # 配置变更观察者：callback(changed_keys)
+        self.listeners = []
         
     def load_config(self):
         """从文件加载配置，如果文件不存在则使用默认配置"""
@@ -111,6 +162,22 @@ class ConfigManager:
             logger.error(f"保存配置失败: {e}")
             return False
     
+    def add_listener(self, callback):
+        """注册配置变更回调，set/update 修改配置后以变更的键列表调用"""
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    def _notify(self, changed_keys):
+        for callback in list(self.listeners):
+            try:
+                callback(changed_keys)
+            except Exception as e:
+                logger.error(f"配置变更回调出错: {e}")
+    
     def get(self, key, default=None):
         """获取配置项"""
         return self.config.get(key, default)
@@ -121,21 +188,24 @@ class ConfigManager:
             return False  # 值未改变
         
         self.config[key] = value
+        self._notify([key])
         return True
     
     def update(self, updates):
         """批量更新配置"""
-        changed = False
+        changed_keys = []
         
         for key, value in updates.items():
             if key in self.config and self.config[key] != value:
                 self.config[key] = value
-                changed = True
+                changed_keys.append(key)
             elif key not in self.config:
                 self.config[key] = value
-                changed = True
+                changed_keys.append(key)
         
-        return changed
+        if changed_keys:
+            self._notify(changed_keys)
+        return bool(changed_keys)
     
     def get_all(self):
         """获取所有配置，返回可安全序列化的副本"""
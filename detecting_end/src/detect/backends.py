@@ -0,0 +1,236 @@
+import os
+import time
+import logging
+import numpy as np
+import cv2
+
+logger = logging.getLogger('detect_backend')
+
+MODEL_DIR = os.path.dirname(__file__)
+PT_MODEL_PATH = os.path.join(MODEL_DIR, "detect_model.pt")
+# 导出的ONNX模型缓存目录
+ONNX_CACHE_DIR = os.path.join(MODEL_DIR, "onnx_cache")
+
+DEFAULT_INFERENCE_CONFIG = {
+    'backend': 'pytorch',  # pytorch（ultralytics）或 onnx（ONNX Runtime）
+    'threads': 0,          # ONNX Runtime 推理线程数，0 表示自动
+    'int8': False,         # 是否使用INT8动态量化模型
+    'imgsz': 640,          # 导出与推理的输入尺寸
+    'conf': 0.25,          # 置信度阈值
+    'iou': 0.7,            # NMS IoU阈值（与 ultralytics 默认值一致）
+}
+
+
+class Detections:
+    """统一的检测结果：boxes 为原图坐标 xyxy，scores/classes 为一维数组"""
+
+    def __init__(self, boxes=None, scores=None, classes=None):
+        self.boxes = boxes if boxes is not None else np.zeros((0, 4), dtype=np.float32)
+        self.scores = scores if scores is not None else np.zeros((0,), dtype=np.float32)
+        self.classes = classes if classes is not None else np.zeros((0,), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.classes)
+
+
+class UltralyticsBackend:
+    """PyTorch 后端（ultralytics YOLO）"""
+
+    name = 'pytorch'
+
+    def __init__(self, model_path=PT_MODEL_PATH, conf=0.25, iou=0.7, imgsz=640, **kwargs):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+
+    def predict(self, source, conf=None, iou=None, imgsz=None, classes=None):
+        results = self.model.predict(
+            source,
+            conf=self.conf if conf is None else conf,
+            iou=self.iou if iou is None else iou,
+            imgsz=imgsz or self.imgsz,
+            classes=classes,
+            verbose=False,
+        )
+        if not results or results[0].boxes is None:
+            return Detections()
+        boxes = results[0].boxes
+        return Detections(
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy().astype(np.int64),
+        )
+
+
+def export_onnx(model_path=PT_MODEL_PATH, imgsz=640, int8=False, cache_dir=ONNX_CACHE_DIR):
+    """
+    导出并缓存ONNX模型（.pt 比缓存新时重新导出），可选生成INT8动态量化版本
+    返回可直接加载的ONNX文件路径
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(model_path))[0]
+    onnx_path = os.path.join(cache_dir, f"{base_name}_{imgsz}.onnx")
+    pt_mtime = os.path.getmtime(model_path) if os.path.exists(model_path) else 0
+
+    if not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < pt_mtime:
+        logger.info(f"正在导出ONNX模型: {onnx_path}")
+        from ultralytics import YOLO
+        exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=False, simplify=False)
+        os.replace(exported, onnx_path)
+
+    if not int8:
+        return onnx_path
+
+    int8_path = os.path.join(cache_dir, f"{base_name}_{imgsz}_int8.onnx")
+    if not os.path.exists(int8_path) or os.path.getmtime(int8_path) < os.path.getmtime(onnx_path):
+        logger.info(f"正在生成INT8量化模型: {int8_path}")
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+def letterbox(image, size):
+    """等比缩放并填充到 size×size，返回 (图像, 缩放比例, (左侧填充, 顶部填充))"""
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (width, height) else image
+    pad_w, pad_h = (size - new_w) / 2, (size - new_h) / 2
+    left, top = int(round(pad_w - 0.1)), int(round(pad_h - 0.1))
+    right, bottom = size - new_w - left, size - new_h - top
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, ratio, (left, top)
+
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime CPU 后端（YOLOv8 导出格式：输出 [1, 4+类别数, 锚点数]）"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path=PT_MODEL_PATH, conf=0.25, iou=0.7, imgsz=640, threads=0, int8=False, **kwargs):
+        import onnxruntime as ort
+        self.ort = ort
+        self.model_path = model_path
+        self.threads = threads
+        self.int8 = int8
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        # 导出模型为固定输入尺寸，每个尺寸一个会话（按节点配置的 imgsz 惰性创建）
+        self.sessions = {}
+        self._session_for(imgsz)
+
+    def _session_for(self, imgsz):
+        session = self.sessions.get(imgsz)
+        if session is None:
+            onnx_path = export_onnx(self.model_path, imgsz=imgsz, int8=self.int8)
+            options = self.ort.SessionOptions()
+            options.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads:
+                options.intra_op_num_threads = int(self.threads)
+            options.inter_op_num_threads = 1
+            session = self.ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+            self.sessions[imgsz] = session
+            logger.info(f"ONNX Runtime 已加载: {onnx_path} (threads={self.threads or 'auto'}, int8={self.int8})")
+        return session
+
+    def _preprocess(self, image, imgsz):
+        padded, ratio, pad = letterbox(image, imgsz)
+        blob = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+        blob = np.ascontiguousarray(blob, dtype=np.float32)[np.newaxis] / 255.0
+        return blob, ratio, pad
+
+    def predict(self, source, conf=None, iou=None, imgsz=None, classes=None):
+        image = cv2.imread(source) if isinstance(source, str) else source
+        if image is None:
+            raise ValueError(f"无法读取图像: {source}")
+        conf = self.conf if conf is None else conf
+        iou = self.iou if iou is None else iou
+
+        imgsz = int(imgsz or self.imgsz)
+        session = self._session_for(imgsz)
+        blob, ratio, (pad_left, pad_top) = self._preprocess(image, imgsz)
+        output = session.run(None, {session.get_inputs()[0].name: blob})[0][0]
+        if output.shape[0] < output.shape[1]:
+            output = output.T  # [锚点数, 4+类别数]
+
+        class_scores = output[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores >= conf
+        if classes is not None:
+            keep &= np.isin(class_ids, classes)
+        if not keep.any():
+            return Detections()
+        output, class_ids, scores = output[keep], class_ids[keep], scores[keep]
+
+        # cxcywh -> xyxy，并映射回原图坐标
+        boxes = np.empty((len(output), 4), dtype=np.float32)
+        boxes[:, 0] = output[:, 0] - output[:, 2] / 2
+        boxes[:, 1] = output[:, 1] - output[:, 3] / 2
+        boxes[:, 2] = output[:, 0] + output[:, 2] / 2
+        boxes[:, 3] = output[:, 1] + output[:, 3] / 2
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad_left) / ratio
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad_top) / ratio
+        height, width = image.shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+        # 按类别偏移坐标后做一次NMS，等价于逐类别NMS
+        offset = class_ids[:, np.newaxis].astype(np.float32) * 7680
+        nms_boxes = boxes + offset
+        xywh = np.column_stack([nms_boxes[:, :2], nms_boxes[:, 2:] - nms_boxes[:, :2]])
+        indices = cv2.dnn.NMSBoxes(xywh.tolist(), scores.astype(float).tolist(), conf, iou)
+        indices = np.array(indices, dtype=np.int64).reshape(-1)
+        return Detections(boxes[indices], scores[indices].astype(np.float32), class_ids[indices].astype(np.int64))
+
+
+class FakeBackend:
+    """
+    离线基准测试用的假模型：不加载权重，按帧亮度生成稳定的检测框数量
+    infer_ms 为模拟的推理耗时（忙等待占用CPU，贴近真实推理的资源占用）
+    """
+
+    name = 'fake'
+
+    def __init__(self, infer_ms=20, max_people=10, **kwargs):
+        self.infer_ms = float(infer_ms)
+        self.max_people = int(max_people)
+
+    def predict(self, source, conf=None, iou=None, imgsz=None, classes=None):
+        image = cv2.imread(source) if isinstance(source, str) else source
+        if image is None:
+            raise ValueError(f"无法读取图像: {source}")
+        deadline = time.perf_counter() + self.infer_ms / 1000
+        while time.perf_counter() < deadline:
+            pass
+        count = int(image[::16, ::16].mean()) % (self.max_people + 1)
+        boxes = np.tile(np.array([[0, 0, 10, 10]], dtype=np.float32), (count, 1))
+        return Detections(boxes, np.ones(count, dtype=np.float32), np.zeros(count, dtype=np.int64))
+
+
+BACKENDS = {
+    'pytorch': UltralyticsBackend,
+    'onnx': OnnxRuntimeBackend,
+    'fake': FakeBackend,
+}
+
+
+def create_backend(config=None, model_path=PT_MODEL_PATH):
+    """按配置创建推理后端；ONNX 后端不可用时回退到 PyTorch"""
+    options = dict(DEFAULT_INFERENCE_CONFIG)
+    options.update(config or {})
+    backend_name = options.pop('backend', 'pytorch')
+    backend_cls = BACKENDS.get(backend_name)
+    if backend_cls is None:
+        logger.warning(f"未知的推理后端 {backend_name}，使用 pytorch")
+        backend_cls = UltralyticsBackend
+    try:
+        return backend_cls(model_path=model_path, **options)
+    except Exception as e:
+        if backend_cls is UltralyticsBackend:
+            raise
+        logger.error(f"{backend_name} 后端初始化失败，回退到 pytorch: {str(e)}")
+        return UltralyticsBackend(model_path=model_path, **options)
@@ -0,0 +1,72 @@
+"""
+推理后端一致性检查：比较 PyTorch 与 ONNX Runtime 后端在同一批图像上的人数与耗时
+
+用法（在 src 目录下）：
+    python -m detect.parity 图像1.jpg 图像2.jpg ... [--int8] [--threads 4] [--tolerance 0]
+"""
+import sys
+import time
+import argparse
+
+from detect.backends import create_backend
+from detect.run import count_people, PERSON_CLASS
+
+
+def check_parity(image_paths, onnx_config=None, tolerance=0):
+    """
+    返回 {'results': [...], 'mismatches': n, 'pytorch_ms': 平均耗时, 'onnx_ms': 平均耗时}
+    人数差的绝对值超过 tolerance 记为不一致
+    """
+    reference = create_backend({'backend': 'pytorch'})
+    candidate = create_backend(dict(onnx_config or {}, backend='onnx'))
+    if getattr(candidate, 'name', '') != 'onnx':
+        raise RuntimeError("ONNX 后端不可用，无法进行一致性检查")
+
+    results = []
+    timings = {'pytorch': 0.0, 'onnx': 0.0}
+    for path in image_paths:
+        counts = {}
+        for name, backend in (('pytorch', reference), ('onnx', candidate)):
+            start = time.perf_counter()
+            counts[name] = count_people(backend.predict(path, classes=[PERSON_CLASS]))
+            timings[name] += time.perf_counter() - start
+        results.append({
+            'image': path,
+            'pytorch': counts['pytorch'],
+            'onnx': counts['onnx'],
+            'match': abs(counts['pytorch'] - counts['onnx']) <= tolerance,
+        })
+
+    total = max(1, len(image_paths))
+    return {
+        'results': results,
+        'mismatches': sum(1 for item in results if not item['match']),
+        'pytorch_ms': round(timings['pytorch'] / total * 1000, 2),
+        'onnx_ms': round(timings['onnx'] / total * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较 PyTorch 与 ONNX Runtime 的人数检测结果")
+    parser.add_argument('images', nargs='+', help="用于比较的图像路径")
+    parser.add_argument('--int8', action='store_true', help="使用INT8量化模型")
+    parser.add_argument('--threads', type=int, default=0, help="ONNX Runtime 线程数，0 表示自动")
+    parser.add_argument('--imgsz', type=int, default=640, help="输入尺寸")
+    parser.add_argument('--tolerance', type=int, default=0, help="允许的人数差")
+    args = parser.parse_args(argv)
+
+    report = check_parity(
+        args.images,
+        {'int8': args.int8, 'threads': args.threads, 'imgsz': args.imgsz},
+        tolerance=args.tolerance,
+    )
+    for item in report['results']:
+        flag = "OK" if item['match'] else "MISMATCH"
+        print(f"[{flag}] {item['image']}: pytorch={item['pytorch']} onnx={item['onnx']}")
+    print(f"平均耗时: pytorch {report['pytorch_ms']} ms, onnx {report['onnx_ms']} ms")
+    print(f"不一致: {report['mismatches']}/{len(report['results'])}")
+    return 1 if report['mismatches'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
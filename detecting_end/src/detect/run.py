@@ -1,40 +1,104 @@
-from ultralytics import YOLO
-import os
+import cv2
+import numpy as np
 
-def load_model():
+from detect.backends import create_backend, PT_MODEL_PATH
+
+PERSON_CLASS = 0
+# 节点可覆盖的推理参数
+NODE_PARAM_KEYS = ('imgsz', 'conf', 'iou', 'classes')
+
+
+def load_model(config=None):
     """
-    预加载YOLO模型并返回
+    预加载检测模型并返回推理后端
+    config 为 config.json 中的 inference 配置（backend/threads/int8/imgsz/conf/iou）
     """
-    model_path = os.path.join(os.path.dirname(__file__), "detect_model.pt")
-    model = YOLO(model_path)
-    return model
+    return create_backend(config, model_path=PT_MODEL_PATH)
+
+
+def _roi_polygon(roi, width, height):
+    """ROI多边形转为像素坐标；所有坐标都不大于1时按相对坐标处理"""
+    polygon = np.asarray(roi, dtype=np.float32).reshape(-1, 2)
+    if len(polygon) < 3:
+        return None
+    if polygon.max() <= 1.0:
+        polygon = polygon * np.array([width, height], dtype=np.float32)
+    return polygon
+
+
+def _points_in_polygon(points, polygon):
+    """射线法批量判断点是否在多边形内（points: N×2, polygon: M×2）"""
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        intersect_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    inside = crosses & (x < intersect_x)
+    return np.count_nonzero(inside, axis=1) % 2 == 1
 
-def detect_series(image_paths, model=None):
+
+def _apply_roi(image, roi):
+    """按ROI外接矩形裁剪并遮盖多边形外区域，返回 (裁剪图像, 裁剪后坐标系下的多边形)"""
+    height, width = image.shape[:2]
+    polygon = _roi_polygon(roi, width, height)
+    if polygon is None:
+        return image, None
+    x0, y0 = np.floor(polygon.min(axis=0)).astype(int).clip(0, [width, height])
+    x1, y1 = np.ceil(polygon.max(axis=0)).astype(int).clip(0, [width, height])
+    if x1 <= x0 or y1 <= y0:
+        return image, None
+    local = polygon - np.array([x0, y0], dtype=np.float32)
+    cropped = image[y0:y1, x0:x1].copy()
+    mask = np.zeros(cropped.shape[:2], dtype=np.uint8)
+    cv2.fillPoly(mask, [np.round(local).astype(np.int32)], 255)
+    cropped[mask == 0] = 114
+    return cropped, local
+
+
+def count_people(detections, polygon=None):
+    """统计检测结果中的人数；给定ROI多边形时只统计框中心落在多边形内的目标"""
+    is_person = detections.classes == PERSON_CLASS
+    if polygon is not None and len(detections):
+        centers = (detections.boxes[:, :2] + detections.boxes[:, 2:]) / 2
+        is_person &= _points_in_polygon(centers, polygon)
+    return int(np.count_nonzero(is_person))
+
+
+def detect(file, model=None, params=None):
+    """
+    检测单张图像中的人数
+    params 为节点级推理参数：imgsz、conf、iou、classes（默认只检测人）与可选的 roi 多边形
+    """
     if model is None:
         model = load_model()
-    results = {}
-    
-    for image_path in image_paths:
-        image_results = model(image_path)
-        people_count = 0
-        for result in image_results[0].boxes:
-            if result.cls == 0:
-                people_count += 1
-        results[image_path] = people_count
-    
-    return results
+    params = params or {}
+    options = {key: params[key] for key in NODE_PARAM_KEYS if params.get(key) is not None}
+    options.setdefault('classes', [PERSON_CLASS])
+
+    source, polygon = file, None
+    if params.get('roi'):
+        image = cv2.imread(file) if isinstance(file, str) else file
+        if image is None:
+            raise ValueError(f"无法读取图像: {file}")
+        source, polygon = _apply_roi(image, params['roi'])
+
+    return count_people(model.predict(source, **options), polygon)
 
-def detect(file, model=None):
+
+def detect_series(image_paths, model=None, params=None, params_by_image=None):
+    """批量检测；params 作用于全部图像，params_by_image 可按图像覆盖"""
     if model is None:
         model = load_model()
-    results = model(file)
-    people_count = 0
-    for result in results[0].boxes:
-        if result.cls == 0:
-            people_count += 1
-    return people_count
+    results = {}
+
+    for image_path in image_paths:
+        image_params = (params_by_image or {}).get(image_path, params)
+        results[image_path] = detect(image_path, model=model, params=image_params)
+
+    return results
 
 if __name__ == "__main__":
     file_path = "../test.png"  # 替换为你的图片路径
     count = detect(file_path)
-    print(f"检测到人数: {count}")
\ No newline at end of file
+    print(f"检测到人数: {count}")
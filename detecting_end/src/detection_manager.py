@@ -2,7 +2,6 @@ import time
 import os
 import datetime
 import threading
-import asyncio
 import cv2
 import logging
 import requests
@@ -11,6 +10,9 @@ from threading import Thread, Event, Lock
 import psutil
 import importlib
 import numpy as np  # 新增：被动接收模式需要
+from inference_pool import InferencePool, default_worker_count, POOL_START_TIMEOUT
+from sampling_scheduler import SamplingScheduler
+from metrics import metrics
 
 logger = logging.getLogger('detection_manager')
 headers = {
@@ -46,6 +48,15 @@ class DetectionManager:
         self.model_loading = False
         self.model_loaded = False
         self.model_lock = Lock()
+        # 多进程推理池（inference_workers 非0时启用，替代主进程内的模型）
+        self.inference_pool = None
+        # 拉取模式的节点自适应采样调度器
+        self.scheduler = SamplingScheduler()
+        
+        # 死区上报：记录每个节点最近一次上报的数据
+        self.report_state = {}
+        self.report_stats = {'sent': 0, 'suppressed': 0}
+        self.report_lock = Lock()
         
         # 检测统计
         self.stats_lock = Lock()
@@ -84,7 +95,10 @@ class DetectionManager:
         # 等待模型加载完成
         logger.info("等待YOLO模型加载完成...")
         wait_time = 0
-        max_wait = 60  # 最长等待60秒
+        max_wait = 60  # 主进程内加载最长等待60秒
+        if int(self.config_manager.get('inference_workers', 0) or 0) != 0:
+            # 推理进程池启动可能耗时更久，且失败后还会回退到主进程内加载
+            max_wait += POOL_START_TIMEOUT
         while not self.model_loaded:
             if not self.model_loading:
                 self.load_model_async()
@@ -140,18 +154,21 @@ class DetectionManager:
         try:
             logger.info("正在加载YOLO模型...")
             
+            if self._start_inference_pool():
+                return True
+            
             # 动态导入detect模块，避免循环导入
             detect_module = importlib.import_module('detect.run')
             
             with self.model_lock:
-                self.model = detect_module.load_model()
+                self.model = detect_module.load_model(self.config_manager.get('inference', {}))
                 self.model_loaded = True
                 self.model_loading = False
             
             with self.status_lock:
                 self.system_status['model_loaded'] = True
             
-            logger.info("YOLO模型加载完成")
+            logger.info(f"YOLO模型加载完成（推理后端: {getattr(self.model, 'name', 'pytorch')}）")
                       
             return True
         except Exception as e:
@@ -167,6 +184,38 @@ class DetectionManager:
                     
             return False
     
+    def _start_inference_pool(self):
+        """按 inference_workers 配置启动多进程推理池，失败时回退到主进程内推理"""
+        workers = int(self.config_manager.get('inference_workers', 0) or 0)
+        if workers == 0:
+            return False
+        if workers < 0:
+            workers = default_worker_count()
+        
+        pool = InferencePool(workers, self.config_manager.get('inference', {}))
+        if not pool.start():
+            logger.error("推理进程池启动失败，回退到主进程内推理")
+            return False
+        
+        with self.model_lock:
+            self.inference_pool = pool
+            self.model_loaded = True
+            self.model_loading = False
+        
+        with self.status_lock:
+            self.system_status['model_loaded'] = True
+        
+        logger.info(f"YOLO模型加载完成（多进程推理: {workers} 个工作进程）")
+        return True
+    
+    def stop_inference_pool(self):
+        """停止多进程推理池"""
+        pool, self.inference_pool = self.inference_pool, None
+        if pool is not None:
+            pool.stop()
+            with self.model_lock:
+                self.model_loaded = self.model is not None
+    
     def start_push(self):
         """启动被动接收模式"""
         if self.push_running:
@@ -311,6 +360,29 @@ class DetectionManager:
         
         return True
     
+    def _pull_schedule_config(self):
+        """读取自适应采样配置并应用到调度器；min_interval 未配置时使用全局 interval"""
+        schedule = dict(self.config_manager.DEFAULT_CONFIG['pull_schedule'])
+        schedule.update(self.config_manager.get('pull_schedule', {}) or {})
+        self.scheduler.configure(
+            min_interval=schedule.get('min_interval') or self.config_manager.get('interval', 1),
+            max_interval=schedule.get('max_interval'),
+            volatility_ref=schedule.get('volatility_ref'),
+            window=schedule.get('window'),
+        )
+        return schedule
+    
+    def _wait_pull(self, seconds):
+        """分段等待，以便更快响应停止信号；返回 False 表示收到停止信号"""
+        remaining = seconds
+        while remaining > 0 and not self.stop_pull_event.is_set():
+            wait_time = min(1.0, remaining)
+            if self.stop_pull_event.wait(wait_time):
+                logger.info("等待间隔期间检测到停止信号")
+                return False
+            remaining -= wait_time
+        return not self.stop_pull_event.is_set()
+    
     def _pull_mode_handler(self):
         """主动拉取模式处理函数"""
         logger.info("开始主动拉取...")
@@ -338,10 +410,18 @@ class DetectionManager:
                     images_to_process = []
                     env_data_to_process = []
                     
+                    # 自适应采样：只拉取已到期的节点；关闭时每轮拉取全部节点
+                    schedule = self._pull_schedule_config()
+                    nodes = self.node_manager.get_nodes()
+                    if schedule.get('enabled', True):
+                        self.scheduler.sync_nodes(nodes)
+                        nodes = self.scheduler.pop_due()
+                    sampled = set()
                     
                     # 收集多个摄像头的图像和环境数据
-                    nodes = self.node_manager.get_nodes()
+                    round_started = {}
                     for node_id in nodes:
+                        round_started[node_id] = time.perf_counter()
                         try:
                             # 添加摄像头处理日志
                             logger.info(f"尝试获取节点 {node_id} 的数据")
@@ -364,7 +444,8 @@ class DetectionManager:
                                 # 捕获图像，添加重试机制
                                 for retry in range(2):
                                     try:
-                                        image = self.node_manager.capture_image(node_id)
+                                        with metrics.timer('capture', node_id):
+                                            image = self.node_manager.capture_image(node_id)
                                         if image is None:
                                             logger.warning(f"摄像头 {node_id} 图像获取失败，重试 {retry+1}/2")
                                             time.sleep(1)
@@ -374,8 +455,9 @@ class DetectionManager:
                                 
                                 if image is not None:
                                     self.node_manager.update_node_status(node_id, '在线')
+                                    jpeg_bytes = self.node_manager.pop_last_jpeg(node_id)
                                     if self.config_manager.get('save_image', True):
-                                        self.node_manager.save_image(image, node_id)
+                                        self.node_manager.save_image(image, node_id, jpeg_bytes=jpeg_bytes)
                                     images_to_process.append((image, node_id))
                                 else:
                                     self.node_manager.update_node_status(node_id, '离线', "捕获图像失败，已尝试2次")
@@ -390,39 +472,14 @@ class DetectionManager:
                             logger.error(error_msg)
                             self.node_manager.update_node_status(node_id, '离线', str(e))
                 
-                    if env_data_to_process:
-                        nodes_data = []
-                        for node_id, env_data in env_data_to_process:
-                            node_data = {"id": node_id}
-                            
-                            if 'temperature' in env_data:
-                                node_data["temperature"] = env_data['temperature']
-                            if 'humidity' in env_data:
-                                node_data["humidity"] = env_data['humidity']
-                            
-                            nodes_data.append(node_data)
-                        
-                        # 通过WebSocket发送环境数据
-                        if nodes_data and self.ws_client and self.ws_client.connected:
-                            try:
-                                # 容错：线程中安全获取事件循环
-                                try:
-                                    loop = asyncio.get_event_loop()
-                                except RuntimeError:
-                                    loop = asyncio.new_event_loop()
-                                    asyncio.set_event_loop(loop)
-                                asyncio.run_coroutine_threadsafe(
-                                    self.ws_client.send_nodes_data(nodes_data),
-                                    loop
-                                )
-                            except Exception as e:
-                                logger.error(f"发送环境数据失败: {str(e)}")
-                    
                     # 处理图像
                     if images_to_process:
                         try:
                             results = self.analyze_images(images_to_process)
                             for node_id, detected_count in results.items():
+                                if schedule.get('enabled', True):
+                                    self.scheduler.record(node_id, detected_count)
+                                sampled.add(node_id)
                                 # 修复：合并为单条日志
                                 logger.info(f"节点 {node_id} 检测到人数: {detected_count}")
                                 
@@ -435,9 +492,40 @@ class DetectionManager:
                                 
                                 # 上传包含环境数据的结果
                                 self.upload_result(node_id, detected_count, env_data)
+                                if node_id in round_started:
+                                    metrics.observe('e2e', node_id, time.perf_counter() - round_started[node_id])
                         except Exception as e:
                             error_msg = f"批量处理失败: {str(e)}"
                             logger.error(error_msg)
+                    
+                    # 有检测结果的节点已随 upload_result 按死区规则上报环境数据，
+                    # 这里只单独发送没有得到检测结果的节点的环境数据
+                    if env_data_to_process:
+                        nodes_data = []
+                        for node_id, env_data in env_data_to_process:
+                            if node_id in sampled:
+                                continue
+                            node_data = {"id": node_id}
+                            
+                            if 'temperature' in env_data:
+                                node_data["temperature"] = env_data['temperature']
+                            if 'humidity' in env_data:
+                                node_data["humidity"] = env_data['humidity']
+                            
+                            nodes_data.append(node_data)
+                        
+                        # 通过WebSocket出站总线发送环境数据（非阻塞）
+                        if nodes_data and self.ws_client and self.ws_client.connected:
+                            try:
+                                self.ws_client.post_nodes_data(nodes_data)
+                            except Exception as e:
+                                logger.error(f"发送环境数据失败: {str(e)}")
+                    
+                    # 本轮未得到结果的节点按失败退避重新排期，避免从调度中丢失
+                    if schedule.get('enabled', True):
+                        for node_id in nodes:
+                            if node_id not in sampled:
+                                self.scheduler.record_failure(node_id)
                 
                 except Exception as e:
                     self.error_count += 1
@@ -458,17 +546,13 @@ class DetectionManager:
                     logger.info("检测到停止信号，中断拉取循环")
                     break
                 
-                # 使用更短的等待间隔，提高响应性
+                # 自适应采样时等待到最早到期的节点，否则按全局间隔等待
                 interval = self.config_manager.get('interval', 1)
-                # 将长等待分解为多个短等待，以便更快响应停止信号
-                short_interval = min(1.0, interval)
-                remaining = interval
-                while remaining > 0 and not self.stop_pull_event.is_set():
-                    wait_time = min(short_interval, remaining)
-                    if self.stop_pull_event.wait(wait_time):
-                        logger.info("等待间隔期间检测到停止信号")
-                        break
-                    remaining -= wait_time
+                if self._pull_schedule_config().get('enabled', True):
+                    next_due = self.scheduler.next_due()
+                    interval = max(0.1, next_due - time.time()) if next_due is not None else interval
+                if not self._wait_pull(interval):
+                    break
                 
                 # 再次检查停止信号
                 if self.stop_pull_event.is_set():
@@ -508,20 +592,29 @@ class DetectionManager:
                 logger.warning("模型正在加载中，请稍后再试")
         
         try:
-            # 保存图像到临时文件
-            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            temp_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp", f"node_{node_id}")
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_path = os.path.join(temp_dir, f"{timestamp}.jpg")
-            
-            cv2.imwrite(temp_path, image)
-            
+            # 画面与上次推理帧相比无明显变化时直接复用上次人数
+            changed, cached_count, thumb = self.node_manager.check_frame_change(node_id, image)
+            if not changed and cached_count is not None:
+                logger.debug(f"节点 {node_id} 画面无明显变化，复用上次人数: {cached_count}")
+                return cached_count
+
+            # 多进程推理：帧经共享内存交给工作进程，不占用主进程的GIL
+            if self.inference_pool is not None:
+                with metrics.timer('infer', node_id):
+                    count = self.inference_pool.detect(image, self.node_manager.get_inference_params(node_id))
+                self.node_manager.record_inferred_frame(node_id, thumb, count)
+                with self.frames_lock:
+                    self.frames_processed += 1
+                return count
+
             # 导入检测模块
             detect_module = importlib.import_module('detect.run')
             
-            # 使用模型进行检测
-            with self.model_lock:
-                count = detect_module.detect(temp_path, model=self.model)
+            # 直接对内存中的图像检测，不再经临时文件中转（归档由 ImageArchive 异步完成）
+            with self.model_lock, metrics.timer('infer', node_id):
+                count = detect_module.detect(image, model=self.model,
+                                             params=self.node_manager.get_inference_params(node_id))
+            self.node_manager.record_inferred_frame(node_id, thumb, count)
             
             # 增加帧统计
             with self.frames_lock:
@@ -550,72 +643,104 @@ class DetectionManager:
             else:
                 raise Exception("模型正在加载中，请稍后再试")
         
-        temp_paths = []
-        path_to_node = {}
+        node_thumbs = {}
+        pool_items = []
+        local_items = []
+        # 画面无明显变化的节点直接复用上次人数
+        node_results = {}
         
-        # 保存所有图像到文件
         for image, node_id in images_data:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            temp_dir = os.path.join("temp", f"node_{node_id}")
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_path = os.path.join(temp_dir, f"{timestamp}.jpg")
-            
-            cv2.imwrite(temp_path, image)
-            temp_paths.append(temp_path)
-            path_to_node[temp_path] = node_id
+            changed, cached_count, thumb = self.node_manager.check_frame_change(node_id, image)
+            if not changed and cached_count is not None:
+                node_results[node_id] = cached_count
+                continue
+            node_thumbs[node_id] = thumb
+            if self.inference_pool is not None:
+                pool_items.append((node_id, image, self.node_manager.get_inference_params(node_id)))
+            else:
+                local_items.append((node_id, image))
         
         # 导入检测模块
         detect_module = importlib.import_module('detect.run')
         
-        # 批量处理图像
-        with self.model_lock:
-            results = detect_module.detect_series(temp_paths, model=self.model)
-        
-        # 整理结果
-        node_results = {}
-        for path, count in results.items():
-            node_id = path_to_node[path]
-            node_results[node_id] = count
-        
-        # 准备节点数据用于WebSocket发送
-        nodes_data = []
-        for node_id, count in node_results.items():
-            nodes_data.append({
-                "node_id": node_id,
-                "count": count
-            })
-        
-        # 使用WebSocket发送数据（如果可用）
-        if self.ws_client and self.ws_client.connected:
-            try:
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                asyncio.run_coroutine_threadsafe(
-                    self.ws_client.send_nodes_data(nodes_data),
-                    loop
-                )
-            except Exception:
-                # 发送失败忽略，走回退路径
-                pass
-
-        # 修复：按配置删除临时文件（配置项名称修正为 save_image）
-        if not self.config_manager.get('save_image', True):
-            for temp_path in temp_paths:
-                try:
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-                except Exception as e:
-                    logger.warning(f"删除临时文件失败: {temp_path}, 错误: {str(e)}")
+        # 主进程内逐帧检测内存中的图像
+        if local_items:
+            with self.model_lock:
+                for node_id, image in local_items:
+                    with metrics.timer('infer', node_id):
+                        count = detect_module.detect(image, model=self.model,
+                                                     params=self.node_manager.get_inference_params(node_id))
+                    node_results[node_id] = count
+                    self.node_manager.record_inferred_frame(node_id, node_thumbs.get(node_id), count)
+        
+        # 多进程推理：各节点的帧并行交给工作进程
+        if pool_items:
+            # 并行推理无法区分单帧耗时，按整批耗时记录到每个节点
+            batch_start = time.perf_counter()
+            pool_results = self.inference_pool.detect_many(pool_items)
+            batch_elapsed = time.perf_counter() - batch_start
+            for node_id, count in pool_results.items():
+                metrics.observe('infer', node_id, batch_elapsed)
+                node_results[node_id] = count
+                self.node_manager.record_inferred_frame(node_id, node_thumbs.get(node_id), count)
+        
+        # 结果由调用方经 upload_result 按死区规则上报，这里不再重复发送
         
         return node_results
     
+    def _report_deadband_config(self):
+        """读取死区上报配置，缺失项使用默认值"""
+        deadband = dict(self.config_manager.DEFAULT_CONFIG['report_deadband'])
+        deadband.update(self.config_manager.get('report_deadband', {}) or {})
+        return deadband
+    
+    def _check_deadband(self, node_id, detected_count, env_values):
+        """
+        判断本次结果是否需要上报，返回 (是否上报, 序列元数据)
+        人数变化超过 count_threshold、温湿度变化超过 env_threshold 或距上次上报超过 max_silence 时上报；
+        因静默超时而上报、且人数与温湿度都与上次上报完全相同的保活消息标记 unchanged
+        """
+        deadband = self._report_deadband_config()
+        if not deadband.get('enabled', True):
+            return True, None
+        
+        now = time.time()
+        series = {
+            'mode': 'deadband',
+            'count_threshold': deadband.get('count_threshold', 0),
+            'max_silence': deadband.get('max_silence', 300),
+            'unchanged': False,
+        }
+        with self.report_lock:
+            last = self.report_state.get(node_id)
+            if last is not None:
+                changed = abs(detected_count - last['count']) > series['count_threshold']
+                for key, value in env_values.items():
+                    previous = last['env'].get(key)
+                    if previous is None or abs(value - previous) > float(deadband.get('env_threshold', 0.5)):
+                        changed = True
+                silent_for = now - last['sent_at']
+                if not changed and silent_for < float(series['max_silence']):
+                    self.report_stats['suppressed'] += 1
+                    return False, series
+                # 阈值内的小变化仍按正常结果上报，只有与上次上报完全相同时才标记保活
+                series['unchanged'] = (
+                    not changed
+                    and detected_count == last['count']
+                    and dict(env_values) == last['env']
+                )
+            
+            self.report_state[node_id] = {'count': detected_count, 'env': dict(env_values), 'sent_at': now}
+            self.report_stats['sent'] += 1
+        return True, series
+    
+    def _forget_report(self, node_id):
+        """上报失败时清除死区状态，确保下一次结果会重新上报"""
+        with self.report_lock:
+            self.report_state.pop(node_id, None)
+    
     def upload_result(self, node_id, detected_count, env_data=None):
-        """上传检测结果和环境数据到服务器（优先通过WebSocket）"""
-        api_url = self.config_manager.get('api_url')
-
+        """上传检测结果和环境数据到服务器（优先通过WebSocket），按死区规则抑制未变化的结果"""
         data = {
             "id": node_id,
             "detected_count": detected_count,
@@ -629,9 +754,18 @@ class DetectionManager:
             if 'humidity' in env_data and env_data['humidity'] is not None:
                 data['humidity'] = env_data['humidity']
 
+        # 死区上报：未变化的结果只更新本地状态，不上传
+        env_values = {key: data[key] for key in ('temperature', 'humidity') if key in data}
+        should_send, series = self._check_deadband(node_id, detected_count, env_values)
+        if not should_send:
+            self._record_upload(node_id, detected_count)
+            logger.debug(f"节点 {node_id} 人数未变化({detected_count})，本次不上报")
+            return True
+        if series:
+            data["series"] = series
 
-        # 优先通过WebSocket发送
-        ws_sent = False
+
+        # 优先通过WebSocket出站总线发送，不阻塞检测线程；发送失败时再回退HTTP
         if self.ws_client and getattr(self.ws_client, "is_connected", lambda: False)():
             try:
                 node_data = {
@@ -643,63 +777,69 @@ class DetectionManager:
                     node_data["temperature"] = data["temperature"]
                 if "humidity" in data:
                     node_data["humidity"] = data["humidity"]
+                if "series" in data:
+                    node_data["series"] = data["series"]
 
-                # 线程中安全获取事件循环
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
+                upload_start = time.perf_counter()
+                future = self.ws_client.post_nodes_data([node_data])
+                if not (future.done() and not future.result()):
+                    # 已入队：先记录结果，若最终发送失败再回退HTTP
+                    self._record_upload(node_id, detected_count)
+                    logger.info(f"节点 {node_id} 检测结果已提交WebSocket发送")
 
-                future = asyncio.run_coroutine_threadsafe(
-                    self.ws_client.send_nodes_data([node_data]),
-                    loop
-                )
-                ws_sent = future.result(timeout=5)
-                if ws_sent:
-                    self.node_manager.update_node_status(node_id, '在线')
-                    self.node_manager.update_detection_count(node_id, detected_count)
-                    logger.info(f"节点 {node_id} 检测并通过WebSocket上传成功")
-                    self.update_detection_stats(detected_count)
-                    with self.status_lock:
-                        node_status = self.node_manager.get_node_status()
-                        if node_id in node_status:
-                            self.system_status["last_detection"] = {
-                                "node_id": node_id,
-                                "count": detected_count,
-                                "time": node_status[node_id]['last_capture']
-                            }
+                    def on_sent(fut, node_id=node_id, data=data):
+                        if fut.result():
+                            metrics.observe('upload', node_id, time.perf_counter() - upload_start)
+                        else:
+                            logger.warning(f"节点 {node_id} 通过WebSocket上传失败，回退HTTP")
+                            Thread(target=self._upload_result_http,
+                                   args=(node_id, detected_count, data, False), daemon=True).start()
+
+                    future.add_done_callback(on_sent)
                     return True
             except Exception as e:
                 logger.error(f"节点 {node_id} 通过WebSocket上传失败: {e}")
 
-        # 如果WebSocket不可用或失败则回退HTTP
+        # 如果WebSocket不可用或入队失败则回退HTTP
+        return self._upload_result_http(node_id, detected_count, data)
+
+    def _record_upload(self, node_id, detected_count):
+        """上传成功后更新节点状态、统计与最后检测信息"""
+        self.node_manager.update_node_status(node_id, '在线')
+        self.node_manager.update_detection_count(node_id, detected_count)
+        self.update_detection_stats(detected_count)
+        with self.status_lock:
+            node_status = self.node_manager.get_node_status()
+            if node_id in node_status:
+                self.system_status["last_detection"] = {
+                    "node_id": node_id,
+                    "count": detected_count,
+                    "time": node_status[node_id]['last_capture']
+                }
+
+    def _upload_result_http(self, node_id, detected_count, data, record=True):
+        """通过HTTP接口上传检测结果"""
+        api_url = self.config_manager.get('api_url')
         try:
-            response = requests.post(api_url, json=data, timeout=5)
+            with metrics.timer('upload', node_id):
+                response = requests.post(api_url, json=data, timeout=5)
             if response.status_code != 201:
                 error_msg = f"上传警告: 状态码 {response.status_code}, 响应: {response.text}"
                 # 修复：单条日志，避免额外参数
                 logger.warning(f"{error_msg} | 摄像头 {node_id}")
+                self._forget_report(node_id)
                 self.node_manager.update_node_status(node_id, '错误', response.text)
             else:
-                self.node_manager.update_node_status(node_id, '在线')
-                self.node_manager.update_detection_count(node_id, detected_count)
                 # 修复：单条日志，避免额外参数
                 logger.info(f"摄像头 {node_id} 检测到人数: {detected_count}")
-                self.update_detection_stats(detected_count)
-                with self.status_lock:
-                    node_status = self.node_manager.get_node_status()
-                    if node_id in node_status:
-                        self.system_status["last_detection"] = {
-                            "node_id": node_id,
-                            "count": detected_count,
-                            "time": node_status[node_id]['last_capture']
-                        }
+                if record:
+                    self._record_upload(node_id, detected_count)
             return True
         except Exception as e:
             error_msg = f"上传结果失败: {str(e)}"
             # 修复：单条日志，避免额外参数
             logger.error(f"{error_msg} | 摄像头 {node_id}")
+            self._forget_report(node_id)
             self.node_manager.update_node_status(node_id, '离线', str(e))
             return False
 
@@ -743,30 +883,39 @@ class DetectionManager:
             # 合并摄像头状态
             status = self.system_status.copy()
             status['nodes'] = self.node_manager.get_node_status()
+            if self.inference_pool is not None:
+                status['inference_pool'] = self.inference_pool.stats()
+            if self.pull_running:
+                status['pull_schedule'] = self.scheduler.snapshot()
+            with self.report_lock:
+                status['report'] = dict(self.report_stats)
             return status
     
-    def process_received_frame(self, node_id, image_data):
-        """处理接收到的图像帧（用于被动接收模式）"""
+    def process_received_frame(self, node_id, image_data, env_data=None):
+        """处理接收到的图像帧（用于被动接收模式），env_data 为随帧推送的温湿度"""
         if not self.push_running:
             return {'status': 'error', 'message': '被动接收模式未启动'}
         
         try:
+            frame_start = time.perf_counter()
             # 将图像数据转换为OpenCV格式
             nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            with metrics.timer('decode', node_id):
+                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             
             if image is None:
                 return {'status': 'error', 'message': '无效的图像数据'}
             
-            # 如果配置为保存图像，则保存图像
+            # 如果配置为保存图像，则原样归档接收到的JPEG
             if self.config_manager.get('save_image', True):
-                self.node_manager.save_image(image, node_id)
+                self.node_manager.save_image(image, node_id, jpeg_bytes=image_data)
             
             # 分析图像
             count = self.analyze_image(image, node_id)
             
             # 上传结果
-            self.upload_result(node_id, count)
+            self.upload_result(node_id, count, env_data)
+            metrics.observe('e2e', node_id, time.perf_counter() - frame_start)
             
             return {'status': 'success', 'detected_count': count}
         except Exception as e:
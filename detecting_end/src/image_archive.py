@@ -0,0 +1,209 @@
+import os
+import time
+import queue
+import logging
+import datetime
+import threading
+from collections import deque
+
+import cv2
+
+logger = logging.getLogger('image_archive')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class ImageArchive:
+    """
+    异步图像归档：后台线程写盘，检测线程只负责入队
+    - 有界队列，队列满时丢弃并计数，不阻塞采集与推理
+    - 提供原始JPEG字节时直接落盘，不做解码/重新编码
+    - 按日期分区：<root>/node_<id>/<YYYYMMDD>/<HHMMSS_微秒>.jpg
+    - 按总大小与保存天数清理，最旧的文件先删除
+    - 内存索引记录每个节点的最新图片，查询为 O(1)
+    """
+
+    def __init__(self, root_dir, max_queue=64, max_size_mb=2048, max_age_days=7, quality=90,
+                 retention_interval=60):
+        self.root_dir = root_dir
+        self.max_bytes = int(float(max_size_mb) * 1024 * 1024) if max_size_mb else 0
+        self.max_age = float(max_age_days) * 86400 if max_age_days else 0
+        self.quality = int(quality)
+        self.retention_interval = retention_interval
+        self.queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        # 按写入时间排序的文件列表 (mtime, path, size)，用于按时间/大小淘汰
+        self.files = deque()
+        self.total_bytes = 0
+        # node_id -> 最新图片路径
+        self.latest_index = {}
+        self.lock = threading.Lock()
+        self.stats = {'written': 0, 'dropped': 0, 'deleted': 0, 'errors': 0}
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, name='image-archive', daemon=True)
+        self.thread.start()
+        logger.info(f"图像归档已启动: {self.root_dir}")
+
+    def stop(self, timeout=5):
+        """停止写入线程，队列中剩余的图像会先写完"""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self.thread:
+            self.thread.join(timeout)
+        logger.info("图像归档已停止")
+
+    def _target_path(self, node_id, now):
+        day_dir = os.path.join(self.root_dir, f"node_{node_id}", now.strftime("%Y%m%d"))
+        return os.path.join(day_dir, now.strftime("%H%M%S_%f") + ".jpg")
+
+    def submit(self, node_id, image=None, jpeg_bytes=None):
+        """
+        提交一张图像归档（非阻塞），优先使用原始JPEG字节
+        返回将要写入的路径；队列已满时返回 None
+        """
+        if image is None and not jpeg_bytes:
+            return None
+        path = self._target_path(node_id, datetime.datetime.now())
+        try:
+            self.queue.put_nowait((str(node_id), path, image, jpeg_bytes))
+        except queue.Full:
+            with self.lock:
+                self.stats['dropped'] += 1
+            logger.debug(f"图像归档队列已满，丢弃节点 {node_id} 的图像")
+            return None
+        return path
+
+    def latest(self, node_id):
+        """节点最新归档图片的路径，没有时返回 None"""
+        with self.lock:
+            path = self.latest_index.get(str(node_id))
+        return path if path and os.path.exists(path) else None
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['queued'] = self.queue.qsize()
+            stats['files'] = len(self.files)
+            stats['size_mb'] = round(self.total_bytes / 1024 / 1024, 2)
+        return stats
+
+    def _writer_loop(self):
+        self._scan_existing()
+        next_retention = time.time()
+        while True:
+            if time.time() >= next_retention:
+                self._apply_retention()
+                next_retention = time.time() + self.retention_interval
+            try:
+                item = self.queue.get(timeout=1)
+            except queue.Empty:
+                if not self.running:
+                    break
+                continue
+            if item is None:
+                if self.running:
+                    continue
+                # 写完停止前已入队的图像
+                while not self.queue.empty():
+                    pending = self.queue.get_nowait()
+                    if pending is not None:
+                        self._write(*pending)
+                break
+            self._write(*item)
+
+    def _write(self, node_id, path, image, jpeg_bytes):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if jpeg_bytes:
+                data = bytes(jpeg_bytes)
+            else:
+                ok, encoded = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+                if not ok:
+                    raise ValueError("JPEG编码失败")
+                data = encoded.tobytes()
+            with open(path, 'wb') as f:
+                f.write(data)
+            with self.lock:
+                self.files.append((time.time(), path, len(data)))
+                self.total_bytes += len(data)
+                self.latest_index[node_id] = path
+                self.stats['written'] += 1
+        except Exception as e:
+            with self.lock:
+                self.stats['errors'] += 1
+            logger.error(f"归档节点 {node_id} 图像失败: {path}, 错误: {str(e)}")
+
+    def _scan_existing(self):
+        """启动时扫描已有文件（含旧版未分区的文件），建立淘汰列表与最新图片索引"""
+        found = []
+        if os.path.isdir(self.root_dir):
+            for dirpath, _, filenames in os.walk(self.root_dir):
+                for name in filenames:
+                    if not name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, path, st.st_size))
+        found.sort()
+
+        latest = {}
+        for _, path, _ in found:
+            relative = os.path.relpath(path, self.root_dir).split(os.sep)
+            if relative[0].startswith('node_'):
+                latest[relative[0][len('node_'):]] = path
+
+        with self.lock:
+            # 扫描期间新写入的文件排在后面
+            self.files = deque(found + list(self.files))
+            self.total_bytes += sum(size for _, _, size in found)
+            for node_id, path in latest.items():
+                self.latest_index.setdefault(node_id, path)
+        logger.info(f"图像归档已有 {len(found)} 个文件，共 {round(self.total_bytes / 1024 / 1024, 2)} MB")
+
+    def _apply_retention(self):
+        """删除超过保存天数的文件，并在总大小超限时从最旧的文件开始删除"""
+        cutoff = time.time() - self.max_age if self.max_age else None
+        removed = []
+        with self.lock:
+            while self.files:
+                mtime, path, size = self.files[0]
+                too_old = cutoff is not None and mtime < cutoff
+                too_big = self.max_bytes and self.total_bytes > self.max_bytes
+                if not (too_old or too_big):
+                    break
+                self.files.popleft()
+                self.total_bytes -= size
+                removed.append(path)
+
+        for path in removed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除归档图像失败: {path}, 错误: {str(e)}")
+                continue
+            # 日期目录删空后一并移除
+            directory = os.path.dirname(path)
+            if directory != self.root_dir:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+        if removed:
+            with self.lock:
+                self.stats['deleted'] += len(removed)
+            logger.info(f"图像归档清理了 {len(removed)} 个文件")
@@ -0,0 +1,294 @@
+import os
+import time
+import queue
+import logging
+import threading
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger('inference_pool')
+
+# 工作进程崩溃时，其未完成任务最多重新派发的次数
+MAX_TASK_RETRIES = 1
+
+# 启动时等待工作进程完成模型加载的最长时间（秒）
+POOL_START_TIMEOUT = 120
+
+
+def _worker_main(index, inference_config, task_queue, result_queue):
+    """
+    推理工作进程：加载独立的模型实例，从共享内存读取帧并把人数写回结果队列
+    任务格式 (task_id, shm_name, shape, dtype, params)，None 表示退出
+    """
+    import importlib
+    detect_module = importlib.import_module('detect.run')
+    try:
+        model = detect_module.load_model(inference_config)
+    except Exception as e:
+        result_queue.put(('failed', index, None, str(e)))
+        return
+    result_queue.put(('ready', index, None, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, shm_name, shape, dtype, params = task
+        shm = None
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            # 拷贝一份后立即释放共享内存，避免推理期间占用
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+            shm.close()
+            shm = None
+            count = detect_module.detect(image, model=model, params=params)
+            result_queue.put(('result', index, task_id, count))
+        except Exception as e:
+            result_queue.put(('error', index, task_id, str(e)))
+        finally:
+            if shm is not None:
+                shm.close()
+
+
+class InferencePool:
+    """
+    多进程推理池：每个工作进程持有独立模型，帧通过共享内存传递，结果经队列返回
+    工作进程异常退出时自动重启，并重新派发其未完成的任务
+    """
+
+    def __init__(self, workers=2, inference_config=None):
+        self.workers = max(1, int(workers))
+        self.inference_config = dict(inference_config or {})
+        # 使用 spawn，避免 fork 继承 Flask/WebSocket 线程与已加载的模型
+        self.ctx = multiprocessing.get_context('spawn')
+        self.result_queue = self.ctx.Queue()
+        self.processes = [None] * self.workers
+        self.task_queues = [None] * self.workers
+        self.ready = [False] * self.workers
+        # 模型加载失败的进程不再重启，避免反复拉起
+        self.disabled = set()
+        # task_id -> {'future', 'shm', 'shape', 'dtype', 'params', 'worker', 'retries'}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.task_ids = itertools.count(1)
+        self.restarts = 0
+        self.completed = 0
+        self.running = False
+        self.collector_thread = None
+        self.ready_event = threading.Event()
+
+    def start(self, wait_timeout=POOL_START_TIMEOUT):
+        """启动全部工作进程，等待至少一个进程完成模型加载"""
+        if self.running:
+            return True
+        self.running = True
+        for index in range(self.workers):
+            self._spawn_worker(index)
+        self.collector_thread = threading.Thread(target=self._collect_results, daemon=True)
+        self.collector_thread.start()
+        deadline = time.time() + wait_timeout
+        while not self.ready_event.wait(1):
+            # 全部进程模型加载失败或等待超时
+            if len(self.disabled) >= self.workers or time.time() >= deadline:
+                break
+        if not self.ready_event.is_set():
+            logger.error("推理进程池启动失败，没有可用的工作进程")
+            self.stop()
+            return False
+        logger.info(f"推理进程池已启动: {self.workers} 个工作进程")
+        return True
+
+    def _spawn_worker(self, index):
+        task_queue = self.ctx.Queue()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(index, self.inference_config, task_queue, self.result_queue),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.task_queues[index] = task_queue
+        self.processes[index] = process
+        self.ready[index] = False
+
+    def _pick_worker(self):
+        """选择未完成任务最少的就绪进程（调用方需持有 self.lock）"""
+        candidates = [index for index in range(self.workers) if index not in self.disabled]
+        if not candidates:
+            raise RuntimeError("没有可用的推理工作进程")
+        loads = {index: 0 for index in candidates if self.ready[index]}
+        if not loads:
+            loads = {index: 0 for index in candidates}
+        for task in self.pending.values():
+            if task['worker'] in loads:
+                loads[task['worker']] += 1
+        return min(loads, key=loads.get)
+
+    def _dispatch(self, task_id, task):
+        """派发任务到工作进程（调用方需持有 self.lock）"""
+        index = self._pick_worker()
+        task['worker'] = index
+        self.task_queues[index].put((task_id, task['shm'].name, task['shape'], task['dtype'], task['params']))
+
+    def submit(self, image, params=None):
+        """提交一帧图像，返回 concurrent.futures.Future，结果为人数"""
+        if not self.running:
+            raise RuntimeError("推理进程池未启动")
+        image = np.ascontiguousarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+        future = Future()
+        task = {
+            'future': future,
+            'shm': shm,
+            'shape': image.shape,
+            'dtype': image.dtype.str,
+            'params': dict(params or {}),
+            'worker': None,
+            'retries': 0,
+        }
+        with self.lock:
+            task_id = next(self.task_ids)
+            try:
+                self._dispatch(task_id, task)
+            except Exception:
+                self._release(task)
+                raise
+            self.pending[task_id] = task
+        return future
+
+    def detect(self, image, params=None, timeout=60):
+        """同步检测单帧"""
+        return self.submit(image, params).result(timeout)
+
+    def detect_many(self, items, timeout=60):
+        """并行检测多帧，items 为 [(key, image, params)]，返回 {key: 人数}；失败的帧不在结果中"""
+        futures = {key: self.submit(image, params) for key, image, params in items}
+        results = {}
+        deadline = time.time() + timeout
+        for key, future in futures.items():
+            try:
+                results[key] = future.result(max(0.0, deadline - time.time()))
+            except Exception as e:
+                logger.error(f"推理任务 {key} 失败: {str(e)}")
+        return results
+
+    def _finish(self, task_id, count=None, error=None):
+        with self.lock:
+            task = self.pending.pop(task_id, None)
+            if task is not None and error is None:
+                self.completed += 1
+        if task is None:
+            return
+        self._release(task)
+        if error is None:
+            task['future'].set_result(count)
+        else:
+            task['future'].set_exception(RuntimeError(error))
+
+    @staticmethod
+    def _release(task):
+        try:
+            task['shm'].close()
+            task['shm'].unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"释放共享内存失败: {str(e)}")
+
+    def _collect_results(self):
+        """结果收集线程：分发结果，并定期检查工作进程存活状态"""
+        while self.running:
+            try:
+                kind, index, task_id, payload = self.result_queue.get(timeout=1)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == 'ready':
+                self.ready[index] = True
+                self.ready_event.set()
+                logger.info(f"推理进程 {index} 模型加载完成")
+            elif kind == 'failed':
+                self.disabled.add(index)
+                logger.error(f"推理进程 {index} 模型加载失败: {payload}")
+            elif kind == 'result':
+                self._finish(task_id, count=payload)
+            elif kind == 'error':
+                self._finish(task_id, error=payload)
+            self._check_workers()
+
+    def _check_workers(self):
+        """重启异常退出的工作进程，并重新派发其未完成任务"""
+        for index, process in enumerate(self.processes):
+            if not self.running or process is None or process.is_alive():
+                continue
+            failed = []
+            with self.lock:
+                if index in self.disabled:
+                    self.processes[index] = None
+                    self.ready[index] = False
+                else:
+                    logger.warning(f"推理进程 {index} 已退出(exitcode={process.exitcode})，正在重启")
+                    self.restarts += 1
+                    self._spawn_worker(index)
+                for task_id, task in list(self.pending.items()):
+                    if task['worker'] != index:
+                        continue
+                    if task['retries'] < MAX_TASK_RETRIES:
+                        task['retries'] += 1
+                        try:
+                            self._dispatch(task_id, task)
+                            continue
+                        except RuntimeError:
+                            pass
+                    failed.append(task_id)
+            for task_id in failed:
+                self._finish(task_id, error=f"推理进程 {index} 异常退出")
+
+    def stats(self):
+        """进程池状态，供系统状态上报"""
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'alive': sum(1 for p in self.processes if p is not None and p.is_alive()),
+                'ready': sum(1 for r in self.ready if r),
+                'pending': len(self.pending),
+                'completed': self.completed,
+                'restarts': self.restarts,
+            }
+
+    def stop(self, timeout=5):
+        """停止全部工作进程并释放未完成任务的共享内存"""
+        if not self.running:
+            return
+        self.running = False
+        for task_queue in self.task_queues:
+            if task_queue is not None:
+                try:
+                    task_queue.put(None)
+                except Exception:
+                    pass
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for task in pending.values():
+            self._release(task)
+            task['future'].set_exception(RuntimeError("推理进程池已停止"))
+        logger.info("推理进程池已停止")
+
+
+def default_worker_count():
+    """默认工作进程数：保留一个核心给 Flask/WebSocket 等主进程线程"""
+    return max(1, (os.cpu_count() or 2) - 1)
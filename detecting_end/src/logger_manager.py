@@ -4,6 +4,12 @@ from datetime import datetime
 from logging.handlers import RotatingFileHandler
 import threading
 import asyncio
+import time
+import json
+import mmap
+import struct
+from collections import deque
+from itertools import islice
 
 # 定义日志级别的颜色代码
 COLORS = {
@@ -50,16 +56,264 @@ class ColoredFormatter(logging.Formatter):
         colored_message = color + super().format(record) + COLORS['reset']
         return colored_message
 
+# 日志级别优先级，积压时优先丢弃低级别日志
+LEVEL_PRIORITY = {
+    'debug': 0,
+    'info': 1,
+    'detection': 2,
+    'warning': 3,
+    'error': 4
+}
+
+class MemoryLogStore:
+    """内存日志环形缓冲：O(1) 追加，按偏移/级别/来源读取时不复制整个缓冲
+
+    可选 persist_file：使用 mmap 映射的定长槽位文件保存最近日志，重启后自动恢复
+    """
+
+    _HEADER = struct.Struct('<4sIIQ')  # 魔数, 槽位数, 槽位大小, 累计写入条数
+    _HEADER_SIZE = 32
+    _MAGIC = b'LOGR'
+    _LEN = struct.Struct('<I')
+
+    def __init__(self, max_logs=1000, persist_file=None, slot_size=512):
+        self.max_logs = max_logs
+        self.slot_size = slot_size
+        self.logs = deque(maxlen=max_logs)  # 左侧最老，右侧最新
+        self.lock = threading.Lock()
+        self._mm = None
+        self._file = None
+        self._written = 0
+        if persist_file:
+            try:
+                self._open_persist(persist_file)
+            except Exception as e:
+                print(f"打开持久化日志文件失败: {str(e)}")
+                self._close_persist()
+
+    def _open_persist(self, path):
+        """打开（或重建）mmap 环形文件并恢复其中的日志"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        size = self._HEADER_SIZE + self.max_logs * self.slot_size
+        new_file = not os.path.exists(path) or os.path.getsize(path) != size
+        self._file = open(path, 'w+b' if new_file else 'r+b')
+        if new_file:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+        magic, slots, slot_size, written = self._HEADER.unpack_from(self._mm, 0)
+        if new_file or magic != self._MAGIC or slots != self.max_logs or slot_size != self.slot_size:
+            written = 0
+            self._HEADER.pack_into(self._mm, 0, self._MAGIC, self.max_logs, self.slot_size, 0)
+        self._written = written
+
+        # 按写入顺序恢复（最老 -> 最新）
+        start = max(0, written - self.max_logs)
+        for seq in range(start, written):
+            entry = self._read_slot(seq % self.max_logs)
+            if entry:
+                self.logs.append(entry)
+
+    def _read_slot(self, slot):
+        offset = self._HEADER_SIZE + slot * self.slot_size
+        (length,) = self._LEN.unpack_from(self._mm, offset)
+        if not 0 < length <= self.slot_size - self._LEN.size:
+            return None
+        try:
+            start = offset + self._LEN.size
+            return json.loads(self._mm[start:start + length].decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def _write_slot(self, entry):
+        """写入下一个槽位（调用方持有锁），超长消息会被截断"""
+        limit = self.slot_size - self._LEN.size
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        if len(data) > limit:
+            trimmed = dict(entry)
+            overflow = len(data) - limit + 8
+            message = trimmed.get('message', '').encode('utf-8')
+            trimmed['message'] = message[:max(0, len(message) - overflow)].decode('utf-8', 'ignore') + '...'
+            data = json.dumps(trimmed, ensure_ascii=False).encode('utf-8')[:limit]
+        offset = self._HEADER_SIZE + (self._written % self.max_logs) * self.slot_size
+        self._LEN.pack_into(self._mm, offset, len(data))
+        self._mm[offset + self._LEN.size:offset + self._LEN.size + len(data)] = data
+        self._written += 1
+        self._HEADER.pack_into(self._mm, 0, self._MAGIC, self.max_logs, self.slot_size, self._written)
+
+    def _close_persist(self):
+        try:
+            if self._mm:
+                self._mm.flush()
+                self._mm.close()
+            if self._file:
+                self._file.close()
+        except Exception:
+            pass
+        self._mm = None
+        self._file = None
+
+    def append(self, entry):
+        """追加一条日志"""
+        with self.lock:
+            self.logs.append(entry)
+            if self._mm:
+                try:
+                    self._write_slot(entry)
+                except Exception as e:
+                    print(f"写入持久化日志失败: {str(e)}")
+
+    def get(self, count=None, offset=0, level=None, source=None):
+        """按最新在前的顺序读取日志，可按级别/来源过滤"""
+        with self.lock:
+            items = reversed(self.logs)
+            if level or source:
+                levels = {level} if isinstance(level, str) else set(level or [])
+                items = (log for log in items
+                         if (not levels or log.get('level') in levels)
+                         and (not source or log.get('source') == source))
+            stop = None if count is None else offset + count
+            return list(islice(items, offset, stop))
+
+    def __len__(self):
+        return len(self.logs)
+
+    def close(self):
+        """刷新并关闭持久化文件"""
+        with self.lock:
+            self._close_persist()
+
+class LogShipper:
+    """日志批量发送器：有界缓冲 + 单一后台线程，按条数或时间阈值发送 logs_batch"""
+
+    def __init__(self, manager, batch_size=50, flush_interval=1.0, max_pending=2000, sample_every=10):
+        self.manager = manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # 最长等待时间（秒）
+        self.max_pending = max_pending
+        self.sample_every = max(1, sample_every)  # 积压时低级别日志每N条保留1条
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self._sample_counter = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """启动发送线程"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="LogShipperThread")
+        self.thread.start()
+
+    def stop(self):
+        """停止发送线程"""
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=2)
+
+    def enqueue(self, entry):
+        """非阻塞入队，缓冲已满时按级别采样丢弃"""
+        with self.cond:
+            if len(self.pending) >= self.max_pending and not self._make_room(entry):
+                self.dropped += 1
+                return False
+            self.pending.append(entry)
+            if len(self.pending) >= self.batch_size:
+                self.cond.notify()
+            return True
+
+    def _make_room(self, entry):
+        """缓冲已满时腾出空间（调用方持有锁），返回是否接收新日志"""
+        priority = LEVEL_PRIORITY.get(entry.get('level'), 1)
+        if priority <= LEVEL_PRIORITY['info']:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_every != 0:
+                return False
+        # 优先淘汰最老的低级别日志
+        for level in ('debug', 'info'):
+            if LEVEL_PRIORITY[level] > priority:
+                break
+            for index, item in enumerate(self.pending):
+                if item.get('level') == level:
+                    del self.pending[index]
+                    self.dropped += 1
+                    return True
+        # 缓冲中全是高级别日志，只有警告及以上才顶替最老的一条
+        if priority >= LEVEL_PRIORITY['warning']:
+            self.pending.popleft()
+            self.dropped += 1
+            return True
+        return False
+
+    def _run(self):
+        """发送循环：攒够一批或等待超时后发送"""
+        while self.running:
+            with self.cond:
+                if len(self.pending) < self.batch_size:
+                    self.cond.wait(timeout=self.flush_interval)
+                if not self.running:
+                    break
+                if not self.pending:
+                    continue
+
+            ws_client = self.manager.ws_client
+            if not self.manager._is_ws_connected():
+                time.sleep(self.flush_interval)
+                continue
+
+            with self.cond:
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                dropped, self.dropped = self.dropped, 0
+
+            if not self._send(ws_client, batch, dropped):
+                # 发送失败，按原顺序放回队首，等待下次重试
+                with self.cond:
+                    self.pending.extendleft(reversed(batch))
+                    self.dropped += dropped
+                    while len(self.pending) > self.max_pending:
+                        self.pending.popleft()
+                        self.dropped += 1
+                time.sleep(self.flush_interval)
+
+    def _send(self, ws_client, batch, dropped):
+        """投递到WebSocket客户端的出站总线，并等待本批发送结果"""
+        try:
+            if hasattr(ws_client, 'post_logs_batch'):
+                future = ws_client.post_logs_batch(batch, dropped)
+            else:
+                loop = getattr(ws_client, 'loop', None)
+                if not loop or loop.is_closed() or not loop.is_running():
+                    return False
+                future = asyncio.run_coroutine_threadsafe(ws_client.send_logs_batch(batch, dropped), loop)
+            return bool(future.result(timeout=10))
+        except Exception as e:
+            # 不再递归调用日志方法避免无限循环
+            print(f"批量发送日志失败: {str(e)}")
+            return False
+
 class LogManager:
     """日志管理器，负责记录和管理系统日志"""
     
-    def __init__(self, log_dir='logs', max_memory_logs=1000, ws_client=None):
+    def __init__(self, log_dir='logs', max_memory_logs=1000, ws_client=None,
+                 ship_batch_size=50, ship_interval=1.0, ship_max_pending=2000,
+                 persist_memory_logs=False, persist_file=None, persist_slot_size=512):
         """初始化日志管理器"""
         self.log_dir = log_dir
         self.max_memory_logs = max_memory_logs
-        self.memory_logs = []
         self.ws_client = ws_client
         self.lock = threading.Lock()
+
+        # 内存日志环形缓冲，可选持久化到 persist_file（默认 logs/memory_logs.ring）
+        if persist_memory_logs:
+            persist_file = persist_file or os.path.join(log_dir, 'memory_logs.ring')
+        else:
+            persist_file = None
+        self.memory_logs = MemoryLogStore(max_memory_logs, persist_file=persist_file,
+                                          slot_size=persist_slot_size)
         
         # 确保日志目录存在
         os.makedirs(log_dir, exist_ok=True)
@@ -69,6 +323,12 @@ class LogManager:
         
         # 获取模块级日志记录器
         self.logger = logging.getLogger('log_manager')
+
+        # 新增：批量日志发送器，替代逐条发送
+        self.shipper = LogShipper(self, batch_size=ship_batch_size,
+                                  flush_interval=ship_interval, max_pending=ship_max_pending)
+        self.shipper.start()
+
         self.logger.info("日志管理器初始化完成")
     
     # 新增：统一的内存日志追加方法
@@ -80,10 +340,7 @@ class LogManager:
             'source': source or 'system',
             'color_class': CSS_COLORS.get(level, '')
         }
-        with self.lock:
-            if len(self.memory_logs) >= self.max_memory_logs:
-                self.memory_logs.pop()  # 移除最老的
-            self.memory_logs.insert(0, log_entry)  # 新日志放前面
+        self.memory_logs.append(log_entry)
         return log_entry
 
     def _setup_logger(self):
@@ -117,7 +374,7 @@ class LogManager:
     def log(self, level, message, source=None):
         """记录日志并通过WebSocket发送（如果可用）"""
         # 先写内存
-        self._append_memory_log(level, message, source)
+        log_entry = self._append_memory_log(level, message, source)
         
         # 写入日志文件（走标准 logging）
         logger = logging.getLogger('System')
@@ -132,67 +389,25 @@ class LogManager:
         elif level == 'detection':
             logger.info(f"[Detection] {message}")
         
-        # 通过 WebSocket 发送（兼容属性或方法）
-        connected = False
-        if self.ws_client:
-            if hasattr(self.ws_client, 'is_connected'):
-                try:
-                    connected = bool(self.ws_client.is_connected())
-                except Exception:
-                    connected = False
-            elif hasattr(self.ws_client, 'connected'):
-                try:
-                    connected = bool(getattr(self.ws_client, 'connected'))
-                except Exception:
-                    connected = False
-        if connected:
-            self._send_log_to_websocket(level, message, source)
-
-    def _send_log_to_websocket(self, level, message, source=None):
-        """安全地通过WebSocket发送日志，处理异步问题"""
+        # 交给批量发送器，断线期间在有界缓冲中暂存
+        self._ship_log(log_entry)
+
+    def _is_ws_connected(self):
+        """检查WebSocket连接状态（兼容属性或方法）"""
+        wc = self.ws_client
+        if not wc:
+            return False
         try:
-            # 优先使用同步方法发送日志
-            if hasattr(self.ws_client, 'send_log_safe'):
-                self.ws_client.send_log_safe(level, message, source)
-                return
-                
-            # 如果没有同步方法，使用异步方法
-            try:
-                # 获取当前事件循环或创建新的
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    # 如果当前线程没有事件循环，创建一个新的
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                
-                if loop.is_running():
-                    # 如果循环正在运行，安排协程执行
-                    asyncio.run_coroutine_threadsafe(
-                        self.ws_client.send_log(level, message, source), 
-                        loop
-                    )
-                else:
-                    # 创建单独的线程运行事件循环
-                    def run_in_thread():
-                        new_loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(new_loop)
-                        try:
-                            new_loop.run_until_complete(
-                                self.ws_client.send_log(level, message, source)
-                            )
-                        finally:
-                            new_loop.close()
-                    
-                    threading.Thread(target=run_in_thread, daemon=True).start()
-            
-            except Exception as e:
-                # 记录错误但不再递归调用日志方法避免无限循环
-                print(f"通过WebSocket发送日志失败: {str(e)}")
-        
-        except Exception as e:
-            # 记录错误但不再递归调用日志方法避免无限循环
-            print(f"WebSocket日志发送器错误: {str(e)}")
+            if hasattr(wc, 'is_connected'):
+                return bool(wc.is_connected())
+            return bool(getattr(wc, 'connected', False))
+        except Exception:
+            return False
+
+    def _ship_log(self, log_entry):
+        """将日志放入批量发送缓冲（非阻塞）"""
+        if self.ws_client:
+            self.shipper.enqueue(log_entry)
 
     def info(self, message, source=None):
         """记录信息级别的日志"""
@@ -215,18 +430,9 @@ class LogManager:
         # 修复：使用统一入口 self.log，移除未定义属性引用
         self.log('debug', message, source)
 
-    def get_logs(self, count=None):
-        """获取最近的日志"""
-        with self.lock:
-            # 确保每条日志都有颜色类
-            logs = self.memory_logs.copy()
-            for log in logs:
-                if 'color_class' not in log:
-                    log['color_class'] = CSS_COLORS.get(log['level'], '')
-                    
-            if count is None:
-                return logs
-            return logs[:count]
+    def get_logs(self, count=None, offset=0, level=None, source=None):
+        """获取最近的日志（最新在前），支持分页与级别/来源过滤"""
+        return self.memory_logs.get(count, offset=offset, level=level, source=source)
     
     # 添加同步日志记录方法
     def info_sync(self, message, source=None):
@@ -284,24 +490,9 @@ class LogManager:
                     lvl = 'info'
                 else:
                     lvl = 'debug'
-                # 仅写入内存并尝试 WS，不再回写 logging，防止递归
-                self.manager._append_memory_log(lvl, msg, source=record.name)
-                # WS 尝试发送（按当前连接状态）
-                connected = False
-                wc = self.manager.ws_client
-                if wc:
-                    if hasattr(wc, 'is_connected'):
-                        try:
-                            connected = bool(wc.is_connected())
-                        except Exception:
-                            connected = False
-                    elif hasattr(wc, 'connected'):
-                        try:
-                            connected = bool(getattr(wc, 'connected'))
-                        except Exception:
-                            connected = False
-                if connected:
-                    self.manager._send_log_to_websocket(lvl, msg, source=record.name)
+                # 仅写入内存并交给批量发送器，不再回写 logging，防止递归
+                log_entry = self.manager._append_memory_log(lvl, msg, source=record.name)
+                self.manager._ship_log(log_entry)
             except Exception:
                 pass
 
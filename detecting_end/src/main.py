@@ -3,8 +3,9 @@ import sys
 import time
 import logging
 import asyncio
+import functools
 from threading import Thread
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory
 import traceback
 
 from flask_cors import CORS
@@ -19,6 +20,8 @@ from config_manager import ConfigManager
 from logger_manager import LogManager
 from node_manager import NodeManager
 from detection_manager import DetectionManager
+from image_archive import ImageArchive
+from metrics import metrics
 from utils import ensure_dirs_exist, fix_ws_url, get_system_info
 # 导入系统监控模块
 from system_monitor import SystemMonitor
@@ -37,12 +40,14 @@ detection_manager = None
 ws_client = None
 system_monitor = None  # 添加系统监控实例
 buzzer_manager = None  # 添加蜂鸣器管理实例
+async_http_server = None  # 异步HTTP服务器（http_server=async 时启用）
+image_archive = None  # 异步图像归档
 
 logger = logging.getLogger('main')
 # 初始化应用
 def initialize_app():
     """初始化应用程序"""
-    global config_manager, log_manager, node_manager, detection_manager, ws_client, system_monitor, buzzer_manager
+    global config_manager, log_manager, node_manager, detection_manager, ws_client, system_monitor, buzzer_manager, image_archive
     
     # 创建必要的目录，确保它们位于根目录而非src目录下
     ensure_dirs_exist(
@@ -56,7 +61,13 @@ def initialize_app():
     config_manager = ConfigManager(os.path.join(ROOT_DIR, './config.json'))
     
     # 初始化日志管理器，使用根目录下的日志目录
-    log_manager = LogManager(log_dir=os.path.join(ROOT_DIR, 'logs'), max_memory_logs=1000)
+    log_manager = LogManager(
+        log_dir=os.path.join(ROOT_DIR, 'logs'),
+        max_memory_logs=config_manager.get('max_memory_logs', 1000),
+        persist_memory_logs=config_manager.get('persist_memory_logs', True),
+        persist_file=os.path.join(ROOT_DIR, config_manager.get('memory_log_file', 'logs/memory_logs.ring')),
+        persist_slot_size=config_manager.get('memory_log_slot_size', 512),
+    )
 
     # 将标准 logging 输出桥接到 LogManager 的内存与 WS
     log_manager.attach_bridge()
@@ -64,6 +75,13 @@ def initialize_app():
     # 初始化摄像头管理器
     node_manager = NodeManager(config_manager)
     
+    # 初始化异步图像归档，图像保存不再占用采集与推理线程
+    archive_config = dict(ConfigManager.DEFAULT_CONFIG['archive'])
+    archive_config.update(config_manager.get('archive', {}) or {})
+    image_archive = ImageArchive(os.path.join(ROOT_DIR, 'captures'), **archive_config)
+    image_archive.start()
+    node_manager.set_archive(image_archive)
+    
     # 初始化WebSocket客户端
     ws_client = init_websocket_client()
     
@@ -130,6 +148,7 @@ def init_websocket_client():
 
     def start_ws_client():
         # 若事件循环意外停止，自动重建并继续运行，直到外部设置 client.running=False
+        rebuilt = False
         while True:
             try:
                 loop = asyncio.new_event_loop()
@@ -154,6 +173,13 @@ def init_websocket_client():
                 loop.set_exception_handler(exception_handler)
 
                 async def boot():
+                    # 事件循环重建后，异步HTTP服务器需要在新循环上重新启动
+                    if rebuilt and async_http_server:
+                        try:
+                            await async_http_server.start()
+                        except Exception as e:
+                            logger.error(f'异步HTTP服务器重启失败: {e}')
+                            async_http_server.failed = True
                     try:
                         await client.start()
                     except Exception as e:
@@ -167,6 +193,12 @@ def init_websocket_client():
                 log_manager.error(f'WebSocket线程循环错误: {str(e)}')
                 log_manager.error(f'异常详情: {traceback.format_exc()}')
             finally:
+                if async_http_server:
+                    try:
+                        # 释放绑定在旧循环上的监听端口，线程池保留以便重启
+                        loop.run_until_complete(async_http_server.stop(shutdown_executor=False))
+                    except Exception:
+                        pass
                 try:
                     # 关闭前清理异步生成器
                     loop.run_until_complete(loop.shutdown_asyncgens())
@@ -183,12 +215,54 @@ def init_websocket_client():
 
             # 若并非正常停止，说明 loop 意外退出；短暂等待后重建
             logger.warning("WebSocket事件循环意外停止，1秒后重建并继续运行...")
+            rebuilt = True
             time.sleep(1)
 
     ws_thread = Thread(target=start_ws_client, daemon=True)
     ws_thread.start()
     return client
 
+def request_status_resync():
+    """命令改变了检测状态：请求系统监控立即发送全量状态，保持与增量上报的快照一致"""
+    if system_monitor:
+        system_monitor.request_full_status()
+
+async def run_blocking(func, *args):
+    """在线程池中执行阻塞操作（启停检测、加载模型、重载节点等），避免阻塞与异步HTTP服务器共用的事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+def apply_config_update(config_data):
+    """应用服务端下发的配置，返回是否有变更"""
+    # 保存原始配置用于比较
+    old_config = config_manager.get_all()
+    
+    # 应用新配置
+    changed = config_manager.update(config_data)
+    if changed:
+        config_manager.save_config()
+        logger.info("配置已更新并保存")
+        
+        # 如果摄像头配置变更，重新加载摄像头
+        if 'nodes' in config_data:
+            node_manager._load_nodes()
+            logger.info("摄像头配置已重新加载")
+
+        # 如果模式变更，应用新模式
+        if 'mode' in config_data and config_data['mode'] != old_config.get('mode'):
+            detection_manager.change_mode(config_data['mode'])
+            logger.info(f"检测模式已更改为: {config_data['mode']}")
+
+        # 如果拉取间隔变更，更新
+        if 'interval' in config_data and config_data['interval'] != old_config.get('interval'):
+            detection_manager.update_interval(config_data['interval'])
+            logger.info(f"拉取间隔已更新为: {config_data['interval']}秒")
+    return changed
+
+def update_nodes_config(nodes):
+    config_manager.set('nodes', nodes)
+    config_manager.save_config()
+    node_manager._load_nodes()
+
 # WebSocket命令处理函数
 async def handle_ws_command(command_data):
     """处理从服务器接收到的WebSocket命令"""
@@ -202,22 +276,13 @@ async def handle_ws_command(command_data):
             success = False
             
             if mode == "push" or mode == "both":
-                success = detection_manager.start_push()
+                success = await run_blocking(detection_manager.start_push)
                 
             if mode == "pull" or mode == "both":
-                success = detection_manager.start_pull()
+                success = await run_blocking(detection_manager.start_pull)
                            
             # 发送更新后的状态
-            status_data = detection_manager.get_system_status()
-            status_data['terminal_id'] = config_manager.get('terminal_id')
-            # 注入节点详情
-            try:
-                node_details = node_manager.get_node_status()
-                status_data['node_details'] = node_details
-                status_data['nodes'] = {nid: (st.get('status', '未知') or '未知') for nid, st in node_details.items()}
-            except Exception as _:
-                pass
-            await ws_client.send_status(status_data)
+            request_status_resync()
             
             # 发送命令执行结果
             await ws_client.send_command_response(command, {"success": success, "mode": mode}, success=True)
@@ -230,25 +295,16 @@ async def handle_ws_command(command_data):
             pull_success = False
             
             if mode == "push" or mode == "both":
-                push_success = detection_manager.stop_push()
+                push_success = await run_blocking(detection_manager.stop_push)
                 
             if mode == "pull" or mode == "both":
-                pull_success = detection_manager.stop_pull()
+                pull_success = await run_blocking(detection_manager.stop_pull)
                 
             # 综合结果
             success = (mode == "push" and push_success) or (mode == "pull" and pull_success) or (mode == "both" and (push_success or pull_success))
                  
             # 发送更新后的状态
-            status_data = detection_manager.get_system_status()
-            status_data['terminal_id'] = config_manager.get('terminal_id')
-            # 注入节点详情
-            try:
-                node_details = node_manager.get_node_status()
-                status_data['node_details'] = node_details
-                status_data['nodes'] = {nid: (st.get('status', '未知') or '未知') for nid, st in node_details.items()}
-            except Exception as _:
-                pass
-            await ws_client.send_status(status_data)
+            request_status_resync()
             
             # 发送命令执行结果
             response_data = {
@@ -264,47 +320,33 @@ async def handle_ws_command(command_data):
         elif command == "set_mode":
             mode = params.get("mode")
             if mode in ["push", "pull", "both"]:
-                detection_manager.change_mode(mode)
+                await run_blocking(detection_manager.change_mode, mode)
             else:
                 logger.warning(f"无效的模式: {mode}")
         
         elif command == "set_interval":
             interval = params.get("interval")
             if isinstance(interval, (int, float)) and interval > 0:
-                detection_manager.update_interval(interval)
+                await run_blocking(detection_manager.update_interval, interval)
             else:
                 logger.warning(f"无效的间隔值: {interval}")        
         
         elif command == "update_nodes":
             nodes = params.get("nodes")
             if isinstance(nodes, dict):
-                # 更新配置
-                config_manager.set('nodes', nodes)
-                config_manager.save_config()
-                
-                # 重新加载节点
-                node_manager._load_nodes()
-                
+                # 更新配置并重新加载节点
+                await run_blocking(update_nodes_config, nodes)
             else:
                 logger.warning(f"无效的摄像头配置: {nodes}")
         
         elif command == "restart":
             logger.info("正在重启服务...")
-            time.sleep(2)  # 模拟重启延迟
+            await asyncio.sleep(2)  # 模拟重启延迟
             os.execv(sys.executable, ['python'] + sys.argv)
         
         elif command == "get_status":
-            # 发送当前系统状态
-            status_data = detection_manager.get_system_status()
-            status_data['terminal_id'] = config_manager.get('terminal_id')
-            # 注入节点详情
-            try:
-                node_details = node_manager.get_node_status()
-                status_data['node_details'] = node_details
-                status_data['nodes'] = {nid: (st.get('status', '未知') or '未知') for nid, st in node_details.items()}
-            except Exception as _:
-                pass
-            await ws_client.send_status(status_data)
+            # 服务端缓存缺失时请求全量状态：由系统监控发送，保证与增量上报的快照一致
+            request_status_resync()
         
         elif command == "get_config":
             # 获取并返回当前配置 - 增强错误处理
@@ -339,7 +381,7 @@ async def handle_ws_command(command_data):
             try:
                 # 获取最近的日志
                 count = params.get("count", 100)  # 默认获取100条日志
-                logs_data = log_manager.get_logs(count)
+                logs_data = log_manager.get_logs(count, level=params.get("level"), source=params.get("source"))
 
                 logger.info(f"返回 {len(logs_data)} 条日志数据")
 
@@ -369,7 +411,7 @@ async def handle_ws_command(command_data):
             if action == "beep":
                 # 简单鸣叫
                 duration = params.get("duration", 0.5)
-                buzzer_manager.beep(duration)
+                await run_blocking(buzzer_manager.beep, duration)
                 await ws_client.send_command_response(command, {"success": True}, success=True)
                 
             elif action == "start":
@@ -419,7 +461,7 @@ async def handle_ws_command(command_data):
                 if angle_val < 0 or angle_val > 180:
                     await ws_client.send_command_response(command, {"error": "角度必须在 0-180 之间"}, success=False)
                     return
-                ok = node_manager.rotate_light(node_id_int, angle_val)
+                ok = await run_blocking(node_manager.rotate_light, node_id_int, angle_val)
                 await ws_client.send_command_response(
                     command,
                     {"success": bool(ok), "node_id": node_id, "angle": angle_val},
@@ -435,41 +477,10 @@ async def handle_ws_command(command_data):
                 await ws_client.send_command_response(command, {"error": "无效的配置数据"}, success=False)
                 return
                 
-            # 保存原始配置用于比较
-            old_config = config_manager.get_all()
-            
-            # 应用新配置
-            changed = config_manager.update(config_data)
+            changed = await run_blocking(apply_config_update, config_data)
             if changed:
-                config_manager.save_config()
-                logger.info("配置已更新并保存")
-                
-                # 如果摄像头配置变更，重新加载摄像头
-                if 'nodes' in config_data:
-                    node_manager._load_nodes()
-                    logger.info("摄像头配置已重新加载")
-
-                # 如果模式变更，应用新模式
-                if 'mode' in config_data and config_data['mode'] != old_config.get('mode'):
-                    detection_manager.change_mode(config_data['mode'])
-                    logger.info(f"检测模式已更改为: {config_data['mode']}")
-
-                # 如果拉取间隔变更，更新
-                if 'interval' in config_data and config_data['interval'] != old_config.get('interval'):
-                    detection_manager.update_interval(config_data['interval'])
-                    logger.info(f"拉取间隔已更新为: {config_data['interval']}秒")
-
                 # 发送更新后的状态
-                status_data = detection_manager.get_system_status()
-                status_data['terminal_id'] = config_manager.get('terminal_id')
-                # 注入节点详情
-                try:
-                    node_details = node_manager.get_node_status()
-                    status_data['node_details'] = node_details
-                    status_data['nodes'] = {nid: (st.get('status', '未知') or '未知') for nid, st in node_details.items()}
-                except Exception as _:
-                    pass
-                await ws_client.send_status(status_data)
+                request_status_resync()
                 
                 # 发送命令执行结果
                 await ws_client.send_command_response(command, {"success": True, "changed": changed}, success=True)
@@ -495,16 +506,7 @@ async def handle_ws_command(command_data):
         
         # 如果出现异常，确保上传最新状态
         try:
-            status_data = detection_manager.get_system_status()
-            status_data['terminal_id'] = config_manager.get('terminal_id')
-            # 注入节点详情
-            try:
-                node_details = node_manager.get_node_status()
-                status_data['node_details'] = node_details
-                status_data['nodes'] = {nid: (st.get('status', '未知') or '未知') for nid, st in node_details.items()}
-            except Exception as _:
-                pass
-            await ws_client.send_status(status_data)
+            request_status_resync()
         except Exception as status_err:
             logger.error(f"发送状态更新失败: {str(status_err)}")
 
@@ -561,6 +563,10 @@ def get_status():
         # 兜底字段，防止前端报错
         status.setdefault('node_details', {})
         status.setdefault('nodes', {})
+
+    # 新增：出站消息总线的背压统计
+    if ws_client and hasattr(ws_client, 'get_outbox_stats'):
+        status['ws_outbox'] = ws_client.get_outbox_stats()
     
     return jsonify(status)
 
@@ -570,12 +576,23 @@ def get_system():
     """获取系统详细信息"""
     return jsonify(get_system_info())
 
+# API路由 - 分阶段耗时指标（Prometheus 文本格式）
+@app.route('/api/metrics')
+def get_metrics():
+    """导出采集/解码/推理/上传/端到端各阶段的耗时直方图"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 # API路由 - 日志
 @app.route('/api/logs/')
 def get_logs():
     """获取日志"""
     count = request.args.get('count', default=None, type=int)
-    return jsonify(log_manager.get_logs(count))
+    offset = request.args.get('offset', default=0, type=int)
+    level = request.args.get('level') or None
+    source = request.args.get('source') or None
+    if level and ',' in level:
+        level = [lvl.strip() for lvl in level.split(',') if lvl.strip()]
+    return jsonify(log_manager.get_logs(count, offset=offset, level=level, source=source))
 
 # API路由 - 日志统计
 @app.route('/api/logs/stats/')
@@ -695,26 +712,21 @@ def control_detection():
         return jsonify({"status": "error", "message": "无效的操作"}), 400
 
 
-# API路由 - 接收图像
-@app.route('/api/push_frame/<int:node_id>', methods=['POST'])
-def receive_frame(node_id):
-    """接收并处理上传的图像和环境数据"""
+def handle_push_frame(node_id, image_data=None, temperature=None, humidity=None):
+    """处理节点推送的图像与环境数据，返回 (响应数据, 状态码)，供 Flask 与异步服务器共用"""
     if not detection_manager.push_running:
-        return jsonify({"status": "error", "message": "被动接收模式未启动"}), 400
+        return {"status": "error", "message": "被动接收模式未启动"}, 400
     
     try:
-        # 获取环境数据（如果有）
-        temperature = request.form.get('temperature', type=float)
-        humidity = request.form.get('humidity', type=float)
-        
         # 处理图像
-        image_file = request.files.get('image')
-        if image_file:
-            # 读取图像数据
-            image_data = image_file.read()
-            
-            # 处理接收到的帧
-            result = process_received_frame(node_id, image_data)
+        if image_data:
+            env_data = {}
+            if temperature is not None:
+                env_data['temperature'] = temperature
+            if humidity is not None:
+                env_data['humidity'] = humidity
+            # 处理接收到的帧，环境数据随检测结果按死区规则一并上报
+            result = process_received_frame(node_id, image_data, env_data)
             
             # 如果有环境数据，更新到结果中
             if temperature is not None:
@@ -727,30 +739,13 @@ def receive_frame(node_id):
                     node_manager.update_environment_data(node_id, temperature, humidity)
             except Exception as _:
                 pass
-            # 如果有环境数据，通过WebSocket发送
-            if (temperature is not None or humidity is not None) and ws_client and ws_client.connected:
+            # 图像处理失败时环境数据没有随结果上报，单独发送
+            if env_data and result.get('status') != 'success' and ws_client and ws_client.connected:
                 try:
-                    node_data = {
-                        "id": node_id,
-                        "temperature": temperature,
-                        "humidity": humidity
-                    }
-                    if 'detected_count' in result and result['status'] == 'success':
-                        node_data["detected_count"] = result['detected_count']
-
-                    log_manager.info(f"接收到节点{node_id}的数据: 温度={temperature}, 湿度={humidity}, 检测结果={node_data.get('detected_count', 'N/A')}")
-                    # 使用 WebSocket 线程事件循环发送
-                    loop = getattr(ws_client, 'loop', None)
-                    if loop and ws_client.connected:
-                        asyncio.run_coroutine_threadsafe(
-                            ws_client.send_nodes_data([node_data]),
-                            loop
-                        )
-                    else:
-                        log_manager.warning("WebSocket循环不可用或未连接，跳过环境数据上报")
+                    ws_client.post_nodes_data([dict(env_data, id=node_id)])
                 except Exception as e:
                     log_manager.error(f"通过WebSocket发送环境数据失败: {str(e)}")
-            return jsonify(result)
+            return result, 200
         else:
             # 仅处理环境数据，没有图像
             if temperature is not None or humidity is not None:
@@ -768,22 +763,27 @@ def receive_frame(node_id):
                 # 通过WebSocket发送
                 if ws_client and ws_client.connected:
                     try:
-                        loop = getattr(ws_client, 'loop', None)
-                        if loop and ws_client.connected:
-                            asyncio.run_coroutine_threadsafe(
-                                ws_client.send_nodes_data([node_data]),
-                                loop
-                            )
-                        else:
-                            log_manager.warning("WebSocket循环不可用或未连接，跳过环境数据上报")
+                        ws_client.post_nodes_data([node_data])
                     except Exception as e:
                         log_manager.error(f"通过WebSocket发送环境数据失败: {str(e)}")
-                return jsonify({"status": "success", "message": "环境数据已接收"})
+                return {"status": "success", "message": "环境数据已接收"}, 200
             else:
-                return jsonify({"status": "error", "message": "未接收到图像或环境数据"}), 400
+                return {"status": "error", "message": "未接收到图像或环境数据"}, 400
     except Exception as e:
         log_manager.error(f"处理接收帧或环境数据失败: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return {"status": "error", "message": str(e)}, 500
+
+# API路由 - 接收图像
+@app.route('/api/push_frame/<int:node_id>', methods=['POST'])
+def receive_frame(node_id):
+    """接收并处理上传的图像和环境数据"""
+    # 获取环境数据（如果有）
+    temperature = request.form.get('temperature', type=float)
+    humidity = request.form.get('humidity', type=float)
+    image_file = request.files.get('image')
+    image_data = image_file.read() if image_file else None
+    result, status_code = handle_push_frame(node_id, image_data, temperature, humidity)
+    return jsonify(result), status_code
 
 # 新增 - 专门用于环境数据的API
 @app.route('/api/environmental_data/<int:node_id>', methods=['POST'])
@@ -806,22 +806,21 @@ def receive_environmental_data(node_id):
         # 通过WebSocket发送环境数据
         if ws_client and ws_client.connected:
             try:
-                if co2_level is not None:
-                    status_data = system_monitor.get_status()
-                    status_data["co2_level"] = co2_level
-                    # 注入节点详情
-                    try:
-                        node_details = node_manager.get_node_status()
-                        status_data['node_details'] = node_details
-                        status_data['nodes'] = {nid: (st.get('status', '未知') or '未知') for nid, st in node_details.items()}
-                    except Exception as _:
-                        pass
+                if co2_level is not None and system_monitor:
+                    # 写入监控状态，由系统监控随下一次状态上报发送
+                    system_monitor.status["co2_level"] = co2_level
                 if temperature is not None or humidity is not None:
                     # 同步写入本地节点环境数据
                     try:
                         node_manager.update_environment_data(node_id, temperature, humidity)
                     except Exception as _:
                         pass
+                    node_data = {"id": node_id}
+                    if temperature is not None:
+                        node_data["temperature"] = temperature
+                    if humidity is not None:
+                        node_data["humidity"] = humidity
+                    ws_client.post_nodes_data([node_data])
                    
             except Exception as e:
                 log_manager.error(f"通过WebSocket发送环境数据失败: {str(e)}")
@@ -853,31 +852,34 @@ def serve_static(path):
         return jsonify({"error": "Internal server error"}), 500
 
 # 修改帧处理函数，更新帧率计数
-def process_received_frame(node_id, image_data):
-    """处理接收到的图像帧（用于被动接收模式）"""
+def process_received_frame(node_id, image_data, env_data=None):
+    """处理接收到的图像帧（用于被动接收模式），env_data 为随帧推送的温湿度"""
     if not detection_manager.push_running:
         return {'status': 'error', 'message': '被动接收模式未启动'}
     
     try:
+        frame_start = time.perf_counter()
         # 将图像数据转换为OpenCV格式
         import numpy as np
         import cv2
         
         nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with metrics.timer('decode', node_id):
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
         if image is None:
             return {'status': 'error', 'message': '无效的图像数据'}
         
-        # 如果配置为保存图像，则保存图像
+        # 如果配置为保存图像，则原样归档接收到的JPEG
         if config_manager.get('save_image', True):
-            node_manager.save_image(image, node_id)
+            node_manager.save_image(image, node_id, jpeg_bytes=image_data)
         
         # 分析图像
         count = detection_manager.analyze_image(image, node_id)
         
         # 上传结果
-        detection_manager.upload_result(node_id, count)
+        detection_manager.upload_result(node_id, count, env_data)
+        metrics.observe('e2e', node_id, time.perf_counter() - frame_start)
         
         # 更新帧率统计
         system_monitor.add_frame_processed()
@@ -1090,6 +1092,11 @@ def get_light_status(node_id):
 def get_last_image(node_id):
     """获取指定数据节点最近一次保存的图片"""
     try:
+        # 优先使用归档索引，O(1) 定位最新图片
+        latest_path = image_archive.latest(node_id) if image_archive else None
+        if latest_path:
+            return send_file(latest_path, mimetype='image/jpeg')
+        
         base_dir = os.path.join(ROOT_DIR, 'captures', f'node_{node_id}')
         if not os.path.exists(base_dir):
             return jsonify({'error': '未找到该节点的图片目录'}), 404
@@ -1133,7 +1140,21 @@ def cleanup():
             if detection_manager.push_running:
                 log_manager.info("停止被动接收模式...")
                 detection_manager.stop_push()
+            if detection_manager.inference_pool is not None:
+                log_manager.info("停止推理进程池...")
+                detection_manager.stop_inference_pool()
         
+        if image_archive:
+            log_manager.info("停止图像归档...")
+            image_archive.stop()
+        
+        if async_http_server and getattr(ws_client, 'loop', None):
+            log_manager.info("停止异步HTTP服务器...")
+            try:
+                asyncio.run_coroutine_threadsafe(async_http_server.stop(), ws_client.loop).result(timeout=5)
+            except Exception as e:
+                log_manager.warning(f"停止异步HTTP服务器失败: {str(e)}")
+
         if ws_client:
             log_manager.info("关闭WebSocket连接...")
             try:
@@ -1162,6 +1183,35 @@ def cleanup():
             log_manager.error(error_msg)
             log_manager.error(f"异常堆栈: {traceback.format_exc()}")
 
+def start_async_http_server(port):
+    """在WebSocket客户端的事件循环上启动异步HTTP服务器，失败时返回False以回退Flask"""
+    global async_http_server
+    import async_server
+    if not async_server.is_available():
+        log_manager.warning("未安装 aiohttp，回退到 Flask 服务器")
+        return False
+
+    # 等待WebSocket线程创建并暴露事件循环
+    deadline = time.time() + 5
+    while time.time() < deadline and not getattr(ws_client, 'loop', None):
+        time.sleep(0.05)
+    loop = getattr(ws_client, 'loop', None)
+    if not loop:
+        log_manager.warning("WebSocket事件循环不可用，回退到 Flask 服务器")
+        return False
+
+    async_http_server = async_server.AsyncHTTPServer(
+        app, handle_push_frame, host='0.0.0.0', port=port,
+        workers=config_manager.get('http_workers', 4)
+    )
+    try:
+        asyncio.run_coroutine_threadsafe(async_http_server.start(), loop).result(timeout=10)
+        return True
+    except Exception as e:
+        log_manager.error(f"启动异步HTTP服务器失败，回退到 Flask 服务器: {str(e)}")
+        async_http_server = None
+        return False
+
 # 主程序入口点
 if __name__ == "__main__":
     # 初始化应用
@@ -1172,11 +1222,21 @@ if __name__ == "__main__":
         debug = config_manager.get('debug', False)
         
         log_manager.info(f"服务启动在端口 {port}")
+        if config_manager.get('http_server', 'flask') == 'async' and start_async_http_server(port):
+            # 异步服务器运行在WebSocket线程的事件循环上，主线程仅保持存活；
+            # 事件循环重建后重启失败时回退到 Flask
+            while not async_http_server.failed:
+                time.sleep(1)
+            log_manager.error("异步HTTP服务器不可用，回退到 Flask 服务器")
+            async_http_server.executor.shutdown(wait=False)
+            async_http_server = None
         app.run(
             host='0.0.0.0', 
             port=port, 
             debug=debug, 
         )
+    except KeyboardInterrupt:
+        log_manager.info("收到中断信号，准备退出")
     finally:
         # 确保程序退出时清理资源
         cleanup()
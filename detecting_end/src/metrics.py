@@ -0,0 +1,118 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# 检测流水线的阶段：采集、解码、推理、上传、端到端
+STAGES = ('capture', 'decode', 'infer', 'upload', 'e2e')
+
+# 直方图桶上界（秒），与 Prometheus 默认桶相近并补充长尾
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 每个序列保留用于计算分位数的最近样本数
+RECENT_SAMPLES = 256
+
+
+class LatencyHistogram:
+    """固定桶直方图 + 最近样本环形缓冲，内存占用与样本总数无关"""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[index] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _summarize(samples, count):
+    values = sorted(samples)
+    p50, p95 = _percentile(values, 0.5), _percentile(values, 0.95)
+    return {
+        'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+        'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        'count': count,
+    }
+
+
+class LatencyMetrics:
+    """按 (阶段, 节点) 记录耗时，导出 Prometheus 文本格式与 p50/p95 摘要"""
+
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, node_id, seconds):
+        key = (stage, str(node_id))
+        with self.lock:
+            histogram = self.series.get(key)
+            if histogram is None:
+                histogram = self.series[key] = LatencyHistogram()
+            histogram.observe(max(0.0, float(seconds)))
+
+    @contextmanager
+    def timer(self, stage, node_id):
+        """计时上下文：with metrics.timer('infer', node_id): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, node_id, time.perf_counter() - start)
+
+    def summary(self):
+        """各阶段整体与分节点的 p50/p95（毫秒），用于系统状态上报"""
+        with self.lock:
+            snapshot = [(stage, node_id, list(h.recent), h.count) for (stage, node_id), h in self.series.items()]
+        result = {}
+        merged = {}
+        for stage, node_id, samples, count in snapshot:
+            result.setdefault('nodes', {}).setdefault(node_id, {})[stage] = _summarize(samples, count)
+            entry = merged.setdefault(stage, ([], 0))
+            merged[stage] = (entry[0] + samples, entry[1] + count)
+        for stage, (samples, count) in merged.items():
+            result[stage] = _summarize(samples, count)
+        return result
+
+    def render_prometheus(self):
+        """导出 Prometheus 文本格式（histogram 类型）"""
+        name = 'detection_stage_latency_seconds'
+        lines = [
+            f'# HELP {name} Detection pipeline stage latency in seconds',
+            f'# TYPE {name} histogram',
+        ]
+        with self.lock:
+            items = sorted(
+                (key, list(h.bucket_counts), h.count, h.total) for key, h in self.series.items()
+            )
+        for (stage, node_id), bucket_counts, count, total in items:
+            labels = f'stage="{stage}",node="{node_id}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+
+# 进程内共享的计时注册表
+metrics = LatencyMetrics()
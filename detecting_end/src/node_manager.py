@@ -6,6 +6,7 @@ import datetime
 import logging
 import time
 from threading import Lock
+from metrics import metrics
 
 logger = logging.getLogger('node_manager')
 
@@ -68,6 +69,11 @@ class NodeManager:
         self.data_nodes = {}  # 存储数据节点信息（key 统一为 str）
         self.control_nodes = {}  # 存储控制节点信息（key 统一为 str）
         self.node_status = {}  # 存储节点状态（key 统一为 str）
+        # 变化门控状态：{node_id: {'thumb', 'count', 'last_infer', 'frames', 'skipped'}}
+        self.frame_gate = {}
+        # 异步图像归档（由主程序注入）与最近一次采集的原始JPEG，用于免重新编码归档
+        self.archive = None
+        self.last_jpeg = {}
         self.lock = Lock()
         
         # 从配置中加载节点设置
@@ -122,6 +128,8 @@ class NodeManager:
                 st.setdefault('data', None)
                 new_status[nid] = st
             self.node_status = new_status
+            # 节点配置（含ROI等推理参数）可能已变化，缓存的人数不再可信
+            self.frame_gate = {}
         
         logger.info(f"已加载 {len(self.data_nodes)} 个数据节点和 {len(self.control_nodes)} 个控制节点")
     
@@ -329,8 +337,10 @@ class NodeManager:
                     content_type = response.headers.get("Content-Type", "")
                     if "image/jpeg" in content_type:
                         image_array = np.frombuffer(response.content, dtype=np.uint8)
-                        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+                        with metrics.timer('decode', node_id):
+                            image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
                         if image is not None:
+                            self.last_jpeg[self._normalize_node_id(node_id)] = response.content
                             logger.info(f"从 {capture_url} 成功获取图像")
                             self.update_node_status(node_id, '在线')
                             return image
@@ -349,9 +359,11 @@ class NodeManager:
                 if "image/jpeg" in content_type:
                     # 单帧JPEG
                     image_array = np.frombuffer(response.content, dtype=np.uint8)
-                    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+                    with metrics.timer('decode', node_id):
+                        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
                     response.close()
                     if image is not None:
+                        self.last_jpeg[self._normalize_node_id(node_id)] = response.content
                         logger.info(f"从 {stream_url} 成功获取图像")
                         self.update_node_status(node_id, '在线')
                         return image
@@ -379,8 +391,10 @@ class NodeManager:
                         if a != -1 and b != -1:
                             jpg = bytes_data[a:b+2]
                             response.close()
-                            image = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                            with metrics.timer('decode', node_id):
+                                image = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
                             if image is not None:
+                                self.last_jpeg[self._normalize_node_id(node_id)] = jpg
                                 logger.info(f"从 {stream_url} 成功获取MJPEG流首帧")
                                 self.update_node_status(node_id, '在线')
                                 return image
@@ -458,12 +472,88 @@ class NodeManager:
                 }
             return None
     
-    def save_image(self, image, node_id, directory='captures'):
-        """保存图像到指定目录"""
-        if image is None:
+    def get_inference_params(self, node_id):
+        """获取节点级推理参数（imgsz/conf/iou/classes/roi），未配置时返回空字典"""
+        node_id = self._normalize_node_id(node_id)
+        with self.lock:
+            node = self.data_nodes.get(node_id)
+            if isinstance(node, dict) and isinstance(node.get('inference'), dict):
+                return dict(node['inference'])
+            return {}
+    
+    def _change_gate_config(self):
+        """读取变化门控配置，缺失项使用默认值"""
+        gate = dict(self.config_manager.DEFAULT_CONFIG['change_gate'])
+        gate.update(self.config_manager.get('change_gate', {}) or {})
+        return gate
+
+    def check_frame_change(self, node_id, image):
+        """
+        与该节点上一次实际推理的帧比较（缩小灰度图逐像素差分）
+        返回 (是否需要推理, 可复用的人数, 当前帧缩略图)；变化像素比例低于阈值且未超过最大复用时长时跳过推理
+        """
+        node_id = self._normalize_node_id(node_id)
+        gate = self._change_gate_config()
+        if not gate.get('enabled', True) or image is None:
+            return True, None, None
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        width, height = gate.get('thumb_size') or (64, 48)
+        thumb = cv2.resize(gray, (int(width), int(height)), interpolation=cv2.INTER_AREA)
+
+        with self.lock:
+            state = self.frame_gate.setdefault(node_id, {'thumb': None, 'count': None, 'last_infer': 0, 'frames': 0, 'skipped': 0})
+            state['frames'] += 1
+            changed = True
+            previous = state['thumb']
+            if (previous is not None and previous.shape == thumb.shape
+                    and time.time() - state['last_infer'] < float(gate.get('max_staleness', 60))):
+                moved = np.count_nonzero(cv2.absdiff(thumb, previous) > int(gate.get('pixel_delta', 25)))
+                changed = moved / thumb.size >= float(gate.get('threshold', 0.01))
+            if not changed:
+                state['skipped'] += 1
+            self._update_skip_stats(node_id, state)
+            return changed, (None if changed else state['count']), thumb
+
+    def record_inferred_frame(self, node_id, thumb, count):
+        """记录实际推理的帧与结果，作为后续帧的比较基准"""
+        if thumb is None:
+            return
+        node_id = self._normalize_node_id(node_id)
+        with self.lock:
+            state = self.frame_gate.setdefault(node_id, {'thumb': None, 'count': None, 'last_infer': 0, 'frames': 1, 'skipped': 0})
+            state['thumb'] = thumb
+            state['count'] = count
+            state['last_infer'] = time.time()
+
+    def _update_skip_stats(self, node_id, state):
+        """将跳过率写入节点状态（调用方需持有 self.lock）"""
+        status = self.node_status.get(node_id)
+        if status is None:
+            return
+        status['frames_skipped'] = state['skipped']
+        status['skip_rate'] = round(state['skipped'] / state['frames'], 3) if state['frames'] else 0.0
+
+    def set_archive(self, archive):
+        """设置异步图像归档，设置后 save_image 只入队，不在调用线程写盘"""
+        self.archive = archive
+    
+    def pop_last_jpeg(self, node_id):
+        """取出节点最近一次采集的原始JPEG字节（没有时返回 None）"""
+        return self.last_jpeg.pop(self._normalize_node_id(node_id), None)
+    
+    def save_image(self, image, node_id, directory='captures', jpeg_bytes=None):
+        """保存图像到指定目录；启用归档时交给后台线程，提供 jpeg_bytes 时原样保存"""
+        if image is None and not jpeg_bytes:
             logger.warning("尝试保存空图像")
             return None
         
+        if self.archive is not None:
+            return self.archive.submit(self._normalize_node_id(node_id), image=image, jpeg_bytes=jpeg_bytes)
+        
+        if image is None:
+            image = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        
         # 确保目录存在
         node_dir = os.path.join(directory, f"node_{node_id}")
         os.makedirs(node_dir, exist_ok=True)
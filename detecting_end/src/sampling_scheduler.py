@@ -0,0 +1,159 @@
+import time
+import heapq
+import datetime
+import threading
+from collections import deque
+
+# 按小时学习的活跃度衰减系数（EWMA）
+HOURLY_ALPHA = 0.2
+
+
+class SamplingScheduler:
+    """
+    拉取模式的节点自适应采样调度器（优先队列，按到期时间取节点）
+    - 近期人数波动越大，采样间隔越接近 min_interval；长期不变则逐步放宽到 max_interval
+    - 新节点在积累满 window 个样本之前按 min_interval 采样，避免启动后数据过稀
+    - 按小时学习每个节点的历史波动，进入该节点的繁忙时段时提前加密采样
+    - 采样失败按指数退避，最长不超过 max_interval；任何节点的间隔都不超过 max_interval（陈旧度上限）
+    """
+
+    def __init__(self, min_interval=1, max_interval=30, volatility_ref=2.0, window=10):
+        self.min_interval = max(0.1, float(min_interval))
+        self.max_interval = max(self.min_interval, float(max_interval))
+        # 平均每次采样人数变化达到该值时视为最活跃
+        self.volatility_ref = max(0.1, float(volatility_ref))
+        self.window = max(2, int(window))
+        self.heap = []
+        # node_id -> {'due', 'counts', 'hourly', 'failures', 'last_sample', 'interval'}
+        self.nodes = {}
+        self.lock = threading.Lock()
+        self._seq = 0
+
+    def configure(self, min_interval=None, max_interval=None, volatility_ref=None, window=None):
+        """更新调度参数，已有节点的下次到期时间在下一次采样后生效"""
+        with self.lock:
+            if min_interval is not None:
+                self.min_interval = max(0.1, float(min_interval))
+            if max_interval is not None:
+                self.max_interval = float(max_interval)
+            self.max_interval = max(self.min_interval, self.max_interval)
+            if volatility_ref is not None:
+                self.volatility_ref = max(0.1, float(volatility_ref))
+            if window is not None:
+                self.window = max(2, int(window))
+
+    def _push(self, node_id, due):
+        """入队（调用方需持有 self.lock）；旧条目在出队时按到期时间不一致惰性丢弃"""
+        self._seq += 1
+        self.nodes[node_id]['due'] = due
+        heapq.heappush(self.heap, (due, self._seq, node_id))
+
+    def sync_nodes(self, node_ids, now=None):
+        """与当前节点列表同步：新节点立即到期，已删除的节点移出调度"""
+        now = time.time() if now is None else now
+        node_ids = set(node_ids)
+        with self.lock:
+            for node_id in list(self.nodes):
+                if node_id not in node_ids:
+                    del self.nodes[node_id]
+            for node_id in node_ids:
+                if node_id not in self.nodes:
+                    self.nodes[node_id] = {
+                        'due': now,
+                        'counts': deque(maxlen=self.window),
+                        'hourly': [0.0] * 24,
+                        'failures': 0,
+                        'last_sample': None,
+                        'interval': self.min_interval,
+                    }
+                    self._push(node_id, now)
+                elif self.nodes[node_id]['due'] is None:
+                    # 上一轮取出后未能重新排期（如拉取循环异常），立即补排
+                    self._push(node_id, now)
+
+    def pop_due(self, now=None):
+        """取出所有已到期的节点，按到期先后排序（越陈旧越靠前）"""
+        now = time.time() if now is None else now
+        due_nodes = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due, _, node_id = heapq.heappop(self.heap)
+                state = self.nodes.get(node_id)
+                if state is None or state['due'] != due:
+                    continue
+                state['due'] = None
+                due_nodes.append(node_id)
+        return due_nodes
+
+    def next_due(self):
+        """最早的到期时间；没有节点时返回 None"""
+        with self.lock:
+            while self.heap:
+                due, _, node_id = self.heap[0]
+                state = self.nodes.get(node_id)
+                if state is not None and state['due'] == due:
+                    return due
+                heapq.heappop(self.heap)
+            return None
+
+    def _activity(self, state, hour):
+        """节点活跃度（0~1）：近期波动与该时段历史波动取较大者"""
+        counts = list(state['counts'])
+        recent = 0.0
+        if len(counts) >= 2:
+            recent = sum(abs(b - a) for a, b in zip(counts, counts[1:])) / (len(counts) - 1)
+        expected = state['hourly'][hour]
+        return min(1.0, max(recent, expected) / self.volatility_ref)
+
+    def record(self, node_id, count, now=None):
+        """记录一次成功采样并重新安排下次到期时间，返回新的采样间隔"""
+        now = time.time() if now is None else now
+        hour = datetime.datetime.fromtimestamp(now).hour
+        with self.lock:
+            state = self.nodes.get(node_id)
+            if state is None:
+                return None
+            counts = state['counts']
+            if counts:
+                change = abs(count - counts[-1])
+                state['hourly'][hour] += HOURLY_ALPHA * (change - state['hourly'][hour])
+            counts.append(count)
+            state['failures'] = 0
+            state['last_sample'] = now
+
+            if len(counts) < counts.maxlen:
+                # 样本不足以判断波动，按最短间隔采样
+                activity = 1.0
+            else:
+                # 下一个小时的历史波动也计入，提前为繁忙时段加密采样
+                activity = max(self._activity(state, hour), self._activity(state, (hour + 1) % 24) * 0.5)
+            interval = self.max_interval - (self.max_interval - self.min_interval) * activity
+            state['interval'] = interval
+            self._push(node_id, now + interval)
+            return interval
+
+    def record_failure(self, node_id, now=None):
+        """记录一次采样失败，按指数退避重新安排"""
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self.nodes.get(node_id)
+            if state is None:
+                return None
+            state['failures'] += 1
+            interval = min(self.max_interval, self.min_interval * (2 ** state['failures']))
+            self._push(node_id, now + interval)
+            return interval
+
+    def snapshot(self, now=None):
+        """各节点调度状态，供系统状态上报"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return {
+                node_id: {
+                    'interval': round(state['interval'], 2),
+                    'due_in': round(max(0.0, state['due'] - now), 2) if state['due'] is not None else 0.0,
+                    'staleness': round(now - state['last_sample'], 1) if state['last_sample'] else None,
+                    'failures': state['failures'],
+                }
+                for node_id, state in self.nodes.items()
+            }
@@ -1,14 +1,16 @@
 import os
+import copy
 import time
 import psutil
 import logging
 import threading
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, Any, Optional
 
 # 导入CO2传感器模块
 from sgp30_reader import SGP30Reader
+from metrics import metrics
 
 logger = logging.getLogger('system_monitor')
 
@@ -16,6 +18,7 @@ class SystemMonitor:
     """
     系统监控模块
     独立于检测服务运行，持续监控系统资源和摄像头状态
+    各项监控为独立的周期任务，按各自间隔调度；配置变更由 ConfigManager 回调通知
     """
     
     def __init__(self, config_manager=None, node_manager=None, 
@@ -60,11 +63,12 @@ class SystemMonitor:
         self.is_running = False
         self.update_interval = 3  # 状态更新间隔（秒）
         self.ws_update_interval = 10  # WebSocket更新间隔（秒）
-        self.last_ws_update = 0
+        # 唤醒监控线程（配置变更、停止）
+        self.wake_event = threading.Event()
         
-        # 添加配置监控相关属性
+        # 配置变更：回调只做标记，差异比较与应用在监控线程中进行
         self.last_config = {}
-        self.last_config_hash = 0
+        self.config_dirty = False
         
         # 初始化CO2传感器
         self.co2_reader = None
@@ -93,14 +97,34 @@ class SystemMonitor:
 
         if config_manager:
             self.last_config = config_manager.get_all()
-            self.last_config_hash = self._get_config_hash()
 
         # 新增：节点状态主动轮询控制
         self.node_ping_interval = (self.config_manager.get('node_ping_interval', 10)
                                    if self.config_manager else 10)  # 每个节点轮询间隔(秒)
         self.node_ping_batch = (self.config_manager.get('node_ping_batch', 3)
-                                if self.config_manager else 3)      # 每周期最多轮询的节点数
+                                if self.config_manager else 3)      # 同时进行的节点轮询数
         self._node_last_ping: Dict[Any, float] = {}
+        # 节点 /status 请求在线程池中并发执行，不阻塞监控线程
+        self.ping_executor = None
+        self._pings_in_flight = set()
+        self._ping_lock = threading.Lock()
+
+        # 周期任务：名称 -> 执行函数，间隔见 _job_intervals
+        self.jobs = {
+            'resources': self._update_resources_job,
+            'nodes': self._update_node_status,
+            'co2': self._update_co2_data,
+            'ws_status': self._send_ws_status_update,
+        }
+
+        # 新增：状态增量上报，记录服务端最后确认的状态快照
+        self.status_full_every = (self.config_manager.get('status_full_every', 6)
+                                  if self.config_manager else 6)  # 每N次上报发送一次全量
+        self._last_sent_status: Optional[Dict[str, Any]] = None
+        self._sends_since_full = 0
+        self._last_ws_epoch = None
+        # 服务端请求全量状态（缓存缺失）时置位，下次上报强制全量
+        self._force_full = False
 
     def start(self):
         """启动监控线程"""
@@ -109,6 +133,13 @@ class SystemMonitor:
             return
             
         self.is_running = True
+        self.wake_event.clear()
+        self.ping_executor = ThreadPoolExecutor(
+            max_workers=max(1, int(self.node_ping_batch or 1)),
+            thread_name_prefix="NodePing"
+        )
+        if self.config_manager and hasattr(self.config_manager, 'add_listener'):
+            self.config_manager.add_listener(self._on_config_event)
         self.monitor_thread = threading.Thread(
             target=self._monitor_loop,
             daemon=True,
@@ -124,70 +155,96 @@ class SystemMonitor:
             return
             
         self.is_running = False
+        self.wake_event.set()
+        if self.config_manager and hasattr(self.config_manager, 'remove_listener'):
+            self.config_manager.remove_listener(self._on_config_event)
         if self.monitor_thread and self.monitor_thread.is_alive():
             self.monitor_thread.join(timeout=5)
+        if self.ping_executor:
+            self.ping_executor.shutdown(wait=False)
+            self.ping_executor = None
             
         logger.info("系统监控已停止")
         if self.log_manager:
             self.log_manager.info("系统监控已停止", source="monitor")
     
+    def _job_intervals(self):
+        """各周期任务的当前间隔（秒），每次调度时读取，运行中修改即时生效"""
+        return {
+            'resources': self.update_interval,
+            'nodes': self.update_interval,
+            'co2': self.co2_read_interval,
+            'ws_status': self.ws_update_interval,
+        }
+    
     def _monitor_loop(self):
-        """监控循环"""
+        """监控循环：执行到期的周期任务，其余时间等待下一个任务到期或被唤醒"""
+        # 非阻塞CPU采样以两次调用之间的时间为统计区间，这里先建立基准
+        psutil.cpu_percent(interval=None)
+        now = time.monotonic()
+        next_run = {name: now for name in self.jobs}
+        next_run['resources'] = now + 0.5
+        
         while self.is_running:
-            try:
-                # 更新系统资源使用情况
-                self._update_system_resources()
-                
-                # 更新摄像头状态
-                self._update_node_status()
-                
-                # 更新帧率
-                self._update_frame_rate()
-                
-                # 更新CO2数据
-                self._update_co2_data()
-                
-                # 计算系统运行时间
-                uptime = int(time.time() - psutil.boot_time())
-                self.status["system_uptime"] = uptime
-                
-                # 通过WebSocket定期发送状态更新到服务端
-                # 无论检测模式是否运行，都要发送状态
-                current_time = time.time()
-                if (current_time - self.last_ws_update) >= self.ws_update_interval:
+            self.wake_event.clear()
+            if self.config_dirty:
+                self._apply_config_changes()
+            if self._force_full:
+                # 立即补发全量，并从此刻重新计算上报周期
+                try:
                     self._send_ws_status_update()
-                    self.last_ws_update = current_time
-                
-                # 检查配置是否变更
-                if self.config_manager:
-                    current_hash = self._get_config_hash()
-                    if current_hash != self.last_config_hash:
-                        # 配置已变更
-                        try:
-                            new_config = self.config_manager.get_all()
-                            self.on_config_changed(self.last_config, new_config)
-                            # 更新配置哈希和备份
-                            self.last_config = new_config
-                            self.last_config_hash = current_hash
-                        except Exception as config_error:
-                            # 如果配置变更处理失败，记录错误但继续运行
-                            logger.error(f"处理配置变更失败: {str(config_error)}")
-                            # 使用安全的日志记录
-                            self._safe_log('error', f"处理配置变更失败: {str(config_error)}")
-                
-                # 延时
-                time.sleep(self.update_interval)
-            except Exception as e:
-                logger.error(f"系统监控循环出错: {str(e)}")
-                # 使用安全的日志记录方式
-                self._safe_log('error', f"系统监控出错: {str(e)}")
-                time.sleep(5)  # 出错后等待一段时间再继续
+                except Exception as e:
+                    logger.error(f"发送全量状态失败: {str(e)}")
+                next_run['ws_status'] = time.monotonic() + max(0.1, float(self.ws_update_interval or 1))
+            
+            now = time.monotonic()
+            intervals = self._job_intervals()
+            for name, job in self.jobs.items():
+                if next_run[name] > now:
+                    continue
+                try:
+                    job()
+                except Exception as e:
+                    logger.error(f"系统监控任务 {name} 出错: {str(e)}")
+                    self._safe_log('error', f"系统监控出错: {str(e)}")
+                interval = max(0.1, float(intervals[name] or 1))
+                # 按计划时间推进保证周期稳定，落后一个周期以上时从当前时间重新对齐
+                next_run[name] += interval
+                if next_run[name] <= now:
+                    next_run[name] = now + interval
+            
+            self.wake_event.wait(max(0.0, min(next_run.values()) - time.monotonic()))
+    
+    def _on_config_event(self, changed_keys):
+        """ConfigManager 变更回调：可能在任意线程中调用，只做标记并唤醒监控线程"""
+        self.config_dirty = True
+        self.wake_event.set()
+    
+    def _apply_config_changes(self):
+        """比较并应用配置变更"""
+        self.config_dirty = False
+        new_config = self.config_manager.get_all()
+        if new_config == self.last_config:
+            return
+        try:
+            self.on_config_changed(self.last_config, new_config)
+            self.last_config = new_config
+        except Exception as config_error:
+            # 如果配置变更处理失败，记录错误但继续运行
+            logger.error(f"处理配置变更失败: {str(config_error)}")
+            self._safe_log('error', f"处理配置变更失败: {str(config_error)}")
+    
+    def _update_resources_job(self):
+        """系统资源、帧率与运行时间"""
+        self._update_system_resources()
+        self._update_frame_rate()
+        self.status["system_uptime"] = int(time.time() - psutil.boot_time())
     
     def _update_system_resources(self):
         """更新系统资源使用情况"""
         try:
-            # CPU使用率
-            self.status["cpu_usage"] = psutil.cpu_percent(interval=0.5)
+            # CPU使用率（自上次采样以来的平均值，不阻塞）
+            self.status["cpu_usage"] = psutil.cpu_percent(interval=None)
             
             # 内存使用率
             memory = psutil.virtual_memory()
@@ -219,19 +276,12 @@ class SystemMonitor:
             if hasattr(self.node_manager, 'get_control_nodes'):
                 node_ids.update(self.node_manager.get_control_nodes().keys())
 
-            # 新增：主动轮询到期节点，限制每周期的请求数量
+            # 主动轮询到期节点：并发提交，结果写入 NodeManager 缓存，下个周期汇总
             now = time.time()
-            polled = 0
             for node_id in sorted(list(node_ids)):
                 last = self._node_last_ping.get(node_id, 0)
-                if (now - last) >= self.node_ping_interval and polled < self.node_ping_batch:
-                    try:
-                        # 触发 /status 请求与 NodeManager 缓存更新
-                        self.node_manager.check_node_connection(node_id)
-                    except Exception as e:
-                        logger.debug(f"主动轮询节点 {node_id} 失败: {e}")
+                if (now - last) >= self.node_ping_interval and self._submit_ping(node_id):
                     self._node_last_ping[node_id] = now
-                    polled += 1
 
             # 读取 NodeManager 的状态缓存并汇总
             status_map = self.node_manager.get_node_status() if hasattr(self.node_manager, 'get_node_status') else {}
@@ -253,6 +303,33 @@ class SystemMonitor:
                 for node_id, node in self.node_manager.nodes.items():
                     logger.debug(f"摄像头 {node_id} 的类型: {type(node)}")
     
+    def _submit_ping(self, node_id):
+        """提交节点 /status 轮询，同一节点上一次请求未完成时不重复提交"""
+        if not self.ping_executor:
+            return False
+        with self._ping_lock:
+            if node_id in self._pings_in_flight:
+                return False
+            self._pings_in_flight.add(node_id)
+        try:
+            self.ping_executor.submit(self._ping_node, node_id)
+        except RuntimeError:
+            # 线程池已关闭（监控停止中）
+            with self._ping_lock:
+                self._pings_in_flight.discard(node_id)
+            return False
+        return True
+    
+    def _ping_node(self, node_id):
+        try:
+            # 触发 /status 请求与 NodeManager 缓存更新
+            self.node_manager.check_node_connection(node_id)
+        except Exception as e:
+            logger.debug(f"主动轮询节点 {node_id} 失败: {e}")
+        finally:
+            with self._ping_lock:
+                self._pings_in_flight.discard(node_id)
+    
     def _update_co2_data(self):
         """更新CO2数据"""
         if not self.co2_enabled or not self.co2_reader:
@@ -267,10 +344,6 @@ class SystemMonitor:
 
         current_time = time.time()
 
-        # 检查是否到了读取CO2数据的时间
-        if current_time - self.co2_last_read_time < self.co2_read_interval:
-            return
-
         try:
             # 读取CO2数据
             prev_level = self.status.get("co2_level", -1)
@@ -366,40 +439,56 @@ class SystemMonitor:
 
         try:
             status_data = self.get_status()
+            payload, is_delta, removed = self._build_status_payload(status_data)
+            if is_delta and not payload and not removed:
+                logger.debug("系统状态无变化，跳过本次上报")
+                return
 
-            # 兼容不同的发送方法
-            send_coro = None
-            if hasattr(self.ws_client, 'send_system_status'):
-                send_coro = self.ws_client.send_system_status(status_data)
-            elif hasattr(self.ws_client, 'send_status'):
-                send_coro = self.ws_client.send_status(status_data)
+            # 投递到WebSocket客户端的出站总线，由其事件循环上的发送协程发送
+            if hasattr(self.ws_client, 'post_system_status'):
+                future = self.ws_client.post_system_status(payload, delta=is_delta, removed=removed)
+                future.add_done_callback(
+                    lambda fut: self._ack_status(status_data, is_delta, bool(fut.result())))
             else:
                 logger.warning("WebSocket客户端不支持发送系统状态的方法")
-                return
-
-            # 使用线程安全的方式发送WebSocket消息
-            try:
-                import asyncio
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(send_coro)
-                loop.close()
-                logger.debug("通过WebSocket发送状态更新成功")
-            except RuntimeError as async_error:
-                if "Event loop is closed" in str(async_error):
-                    logger.warning("检测到事件循环已关闭，尝试使用新的事件循环")
-                    import asyncio
-                    new_loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(new_loop)
-                    try:
-                        new_loop.run_until_complete(send_coro)
-                    finally:
-                        new_loop.close()
-                else:
-                    raise
 
         except Exception as e:
+            # 发送异常时丢弃快照，下次强制全量
+            self._last_sent_status = None
             logger.error(f"通过WebSocket发送状态更新失败: {str(e)}")
+
+    def _build_status_payload(self, status_data: Dict[str, Any]):
+        """根据上次确认的快照构建上报内容，返回 (payload, is_delta, removed)"""
+        epoch = getattr(self.ws_client, 'connection_epoch', None)
+        need_full = (
+            self._force_full
+            or self._last_sent_status is None
+            or epoch != self._last_ws_epoch  # 发生重连，服务端缓存可能已失效
+            or self._sends_since_full + 1 >= max(1, int(self.status_full_every or 1))
+        )
+        if need_full:
+            self._force_full = False
+            return dict(status_data), False, []
+
+        last = self._last_sent_status
+        changed = {k: v for k, v in status_data.items() if k not in last or last[k] != v}
+        removed = [k for k in last if k not in status_data]
+        return changed, True, removed
+
+    def _ack_status(self, status_data: Dict[str, Any], is_delta: bool, sent: bool):
+        """发送成功后更新已确认快照，失败则在下次发送全量"""
+        if not sent:
+            self._last_sent_status = None
+            return
+        self._last_sent_status = copy.deepcopy(status_data)
+        self._last_ws_epoch = getattr(self.ws_client, 'connection_epoch', None)
+        self._sends_since_full = self._sends_since_full + 1 if is_delta else 0
+    
+    def request_full_status(self):
+        """服务端请求全量状态：丢弃已确认快照，由监控线程立即发送全量"""
+        self._last_sent_status = None
+        self._force_full = True
+        self.wake_event.set()
     
     def set_update_interval(self, interval: float):
         """设置状态更新间隔"""
@@ -478,6 +567,11 @@ class SystemMonitor:
         # 7. 更新保存图像设置
         if 'save_image' in new_config and new_config['save_image'] != old_config.get('save_image', True):
             self._safe_log('info', f"保存图像设置已更改: {old_config.get('save_image', True)} -> {new_config['save_image']}")
+
+        # 8. 更新全量状态上报周期
+        if 'status_full_every' in new_config and new_config['status_full_every'] != old_config.get('status_full_every', 6):
+            self.status_full_every = new_config['status_full_every']
+            self._last_sent_status = None
         
        
         logger.info("配置更改已应用")
@@ -501,6 +595,9 @@ class SystemMonitor:
         if self.config_manager:
             status_data['terminal_id'] = self.config_manager.get('terminal_id')
         
+        # 各阶段耗时 p50/p95（毫秒）
+        status_data['latency'] = metrics.summary()
+        
         return status_data
     
     def add_frame_processed(self):
@@ -511,15 +608,5 @@ class SystemMonitor:
     def update_ws_client(self, ws_client):
         """更新WebSocket客户端引用"""
         self.ws_client = ws_client
-    
-    def _get_config_hash(self):
-        """获取配置的哈希值，用于检测配置更改"""
-        if not self.config_manager:
-            return 0
-            
-        try:
-            config_str = json.dumps(self.config_manager.get_all(), sort_keys=True)
-            return hash(config_str)
-        except Exception as e:
-            logger.error(f"计算配置哈希失败: {str(e)}")
-            return 0
+        # 客户端变化后需要重新发送全量状态
+        self._last_sent_status = None
@@ -0,0 +1,90 @@
+"""
+死区上报测试：在 detecting_end/src 下运行 python -m pytest test_deadband.py
+不需要摄像头与模型，节点管理器与配置使用简单替身
+"""
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('numpy')
+pytest.importorskip('psutil')
+pytest.importorskip('requests')
+
+import detection_manager
+from config_manager import ConfigManager
+from detection_manager import DetectionManager
+
+
+class FakeConfig:
+    DEFAULT_CONFIG = ConfigManager.DEFAULT_CONFIG
+
+    def __init__(self, **overrides):
+        self.config = {'api_url': 'http://127.0.0.1:1/api/upload/'}
+        self.config.update(overrides)
+
+    def get(self, key, default=None):
+        return self.config.get(key, default)
+
+
+class FakeNodeManager:
+    def __init__(self):
+        self.statuses = {}
+
+    def update_node_status(self, node_id, status, message=None):
+        self.statuses[node_id] = status
+
+    def update_detection_count(self, node_id, count):
+        pass
+
+    def get_node_status(self):
+        return {}
+
+
+def make_manager(**deadband):
+    config = FakeConfig(report_deadband=dict(ConfigManager.DEFAULT_CONFIG['report_deadband'], **deadband))
+    return DetectionManager(config, FakeNodeManager(), None, None, None)
+
+
+def test_changes_within_threshold_are_suppressed():
+    manager = make_manager(count_threshold=2)
+
+    assert manager._check_deadband(1, 10, {'temperature': 22.0})[0]
+    send, _ = manager._check_deadband(1, 12, {'temperature': 22.3})
+    assert not send
+    send, series = manager._check_deadband(1, 13, {'temperature': 22.3})
+    assert send and not series['unchanged']
+    assert manager.report_stats == {'sent': 2, 'suppressed': 1}
+
+
+def test_max_silence_keepalive_is_marked_unchanged():
+    manager = make_manager(count_threshold=2, max_silence=300)
+    manager._check_deadband(1, 10, {'temperature': 22.0, 'humidity': 40.0})
+
+    # 静默超时后，与上次完全相同的结果作为保活消息发送
+    manager.report_state[1]['sent_at'] -= 301
+    send, series = manager._check_deadband(1, 10, {'temperature': 22.0, 'humidity': 40.0})
+    assert send and series['unchanged']
+
+    # 阈值内的小变化在超时后按正常结果发送，不能标记保活
+    manager.report_state[1]['sent_at'] -= 301
+    send, series = manager._check_deadband(1, 11, {'temperature': 22.0, 'humidity': 40.0})
+    assert send and not series['unchanged']
+
+
+def test_failed_http_fallback_forgets_report(monkeypatch):
+    manager = make_manager()
+
+    def refuse(*args, **kwargs):
+        raise ConnectionError('refused')
+
+    monkeypatch.setattr(detection_manager.requests, 'post', refuse)
+    assert not manager.upload_result(1, 10, {'temperature': 22.0})
+    assert 1 not in manager.report_state
+    assert manager.node_manager.statuses[1] == '离线'
+
+    # 上报失败后同样的结果必须重新上报，而不是被死区抑制
+    sent = []
+    monkeypatch.setattr(detection_manager.requests, 'post',
+                        lambda url, json, timeout: sent.append(json) or type('R', (), {'status_code': 201})())
+    assert manager.upload_result(1, 10, {'temperature': 22.0})
+    assert sent and sent[0]['detected_count'] == 10
+    assert 1 in manager.report_state
@@ -5,6 +5,8 @@ import logging
 import time
 import re
 import traceback
+from collections import deque
+from concurrent.futures import Future
 from threading import Lock
 from urllib.parse import urlparse
 import ssl
@@ -14,7 +16,8 @@ logger = logging.getLogger('websocket_client')
 class TerminalWebSocketClient:
     """WebSocket客户端，用于与Django后端通信"""
     
-    def __init__(self, server_url, terminal_id, on_command=None):
+    def __init__(self, server_url, terminal_id, on_command=None,
+                 outbox_max=1000, outbox_batch_size=50):
         self.server_url = server_url
         self.terminal_id = terminal_id
         self.ws = None
@@ -39,6 +42,28 @@ class TerminalWebSocketClient:
         self.tasks = set()
         self.tasks_lock = Lock()
         self.loop = None
+        # 连接代次：每次成功建立连接加一，供上层判断是否发生过重连
+        self.connection_epoch = 0
+
+        # 新增：统一出站消息总线，任意线程非阻塞入队，由事件循环上的单一发送协程发出
+        self.outbox = deque()
+        self.outbox_lock = Lock()
+        self.outbox_max = outbox_max
+        self.outbox_batch_size = outbox_batch_size
+        self.outbox_event = None
+        self.outbox_task = None
+        self.outbox_stats = {
+            'queued': 0,          # 当前排队数
+            'high_watermark': 0,  # 历史最大排队数
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'dropped': 0,         # 队列已满或未连接被拒绝
+            'coalesced': 0,       # 合并进其他消息的条数
+            'frames': 0,          # 实际发送的WebSocket帧数
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+        }
     
     def is_connected(self):
         """返回当前WebSocket连接状态"""
@@ -50,6 +75,9 @@ class TerminalWebSocketClient:
         self.reconnect_attempts = 0
         # 仅绑定当前线程正在运行的事件循环
         self.loop = asyncio.get_running_loop()
+        # 出站总线的唤醒事件与发送协程需要创建在本循环上
+        self.outbox_event = asyncio.Event()
+        self.outbox_task = self._create_task(self._outbox_sender())
         await self.connect()
         # 首次连接失败则启动重连循环
         if not self.connected and self.running:
@@ -70,6 +98,9 @@ class TerminalWebSocketClient:
                     except Exception as e:
                         logger.error(f"取消任务时出错: {str(e)}")
             self.tasks.clear()
+
+        # 未发送的出站消息全部以失败结束，避免调用方等待
+        self._fail_outbox()
             
         # 断开连接
         await self.disconnect()
@@ -199,6 +230,7 @@ class TerminalWebSocketClient:
                 timeout=15
             )
             self.connected = True
+            self.connection_epoch += 1
             # 重连成功后清零计数
             self.reconnect_attempts = 0
             logger.info(f"WebSocket连接已建立: {ws_url}")
@@ -326,10 +358,131 @@ class TerminalWebSocketClient:
             logger.info(f"收到消息: {data}")
     
     async def send_message(self, data):
-        """发送消息到服务器"""
+        """发送消息到服务器（经由出站总线，在事件循环内等待发送结果）"""
         if not self.connected or not self.ws:
             logger.warning("尝试在未连接状态下发送消息")
             return False
+        return await asyncio.wrap_future(self.post(data))
+
+    def post(self, data):
+        """线程安全的非阻塞入队，返回 concurrent.futures.Future，结果为是否发送成功"""
+        future = Future()
+        loop = self.loop
+        if not self.running or not self.is_connected() or not loop or loop.is_closed() or not self.outbox_event:
+            self.outbox_stats['dropped'] += 1
+            future.set_result(False)
+            return future
+        with self.outbox_lock:
+            if len(self.outbox) >= self.outbox_max:
+                self.outbox_stats['dropped'] += 1
+                future.set_result(False)
+                return future
+            self.outbox.append((data, [future], time.monotonic()))
+            queued = len(self.outbox)
+            self.outbox_stats['enqueued'] += 1
+            self.outbox_stats['queued'] = queued
+            if queued > self.outbox_stats['high_watermark']:
+                self.outbox_stats['high_watermark'] = queued
+        try:
+            loop.call_soon_threadsafe(self.outbox_event.set)
+        except RuntimeError:
+            # 事件循环已关闭，等待下次启动时由 _fail_outbox 清理
+            pass
+        return future
+
+    def post_nodes_data(self, nodes_data):
+        """线程安全地投递节点数据"""
+        return self.post(self._build_nodes_message(nodes_data))
+
+    def post_system_status(self, status_data, delta=False, removed=None):
+        """线程安全地投递系统状态"""
+        return self.post(self._build_status_message(status_data, delta, removed))
+
+    def post_logs_batch(self, logs, dropped=0):
+        """线程安全地投递一批日志"""
+        return self.post(self._build_logs_message(logs, dropped))
+
+    def get_outbox_stats(self):
+        """获取出站总线的背压统计"""
+        with self.outbox_lock:
+            stats = dict(self.outbox_stats)
+            stats['queued'] = len(self.outbox)
+        sent = stats['sent'] + stats['failed']
+        stats['wait_ms_avg'] = round(stats['wait_ms_total'] / sent, 2) if sent else 0.0
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 2)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 2)
+        return stats
+
+    async def _outbox_sender(self):
+        """单一发送协程：批量取出消息，合并同类消息后依次发送"""
+        while self.running:
+            try:
+                await self.outbox_event.wait()
+                self.outbox_event.clear()
+                while self.running:
+                    with self.outbox_lock:
+                        count = min(self.outbox_batch_size, len(self.outbox))
+                        batch = [self.outbox.popleft() for _ in range(count)]
+                        self.outbox_stats['queued'] = len(self.outbox)
+                    if not batch:
+                        break
+                    for data, futures, enqueued_at in self._coalesce(batch):
+                        ok = await self._send_now(data) if self.is_connected() else False
+                        self._finish(futures, ok, enqueued_at)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"出站消息发送协程异常: {str(e)}")
+                logger.error(f"异常堆栈: {traceback.format_exc()}")
+
+    def _coalesce(self, batch):
+        """合并相邻的 nodes_data / logs_batch 消息，减少发送帧数"""
+        merged = []
+        for data, futures, enqueued_at in batch:
+            msg_type = data.get('type') if isinstance(data, dict) else None
+            if merged and msg_type in ('nodes_data', 'logs_batch') and merged[-1][0].get('type') == msg_type:
+                last, last_futures, _ = merged[-1]
+                if msg_type == 'nodes_data':
+                    last['nodes'] = list(last['nodes']) + list(data.get('nodes', []))
+                else:
+                    last['logs'] = list(last['logs']) + list(data.get('logs', []))
+                    last['dropped'] = last.get('dropped', 0) + data.get('dropped', 0)
+                last['timestamp'] = data.get('timestamp', last.get('timestamp'))
+                last_futures.extend(futures)
+                self.outbox_stats['coalesced'] += 1
+            else:
+                if msg_type in ('nodes_data', 'logs_batch'):
+                    data = dict(data)  # 复制一份，合并时不修改调用方的数据
+                merged.append((data, list(futures), enqueued_at))
+        return merged
+
+    def _finish(self, futures, ok, enqueued_at):
+        """记录统计并设置调用方的发送结果"""
+        wait_ms = (time.monotonic() - enqueued_at) * 1000
+        stats = self.outbox_stats
+        stats['frames'] += 1
+        stats['sent' if ok else 'failed'] += len(futures)
+        stats['wait_ms_total'] += wait_ms * len(futures)
+        stats['wait_ms_max'] = max(stats['wait_ms_max'], wait_ms)
+        for future in futures:
+            if not future.done():
+                future.set_result(bool(ok))
+
+    def _fail_outbox(self):
+        """清空出站队列，全部以失败结束"""
+        with self.outbox_lock:
+            pending = list(self.outbox)
+            self.outbox.clear()
+            self.outbox_stats['queued'] = 0
+        for _, futures, _ in pending:
+            for future in futures:
+                if not future.done():
+                    future.set_result(False)
+
+    async def _send_now(self, data):
+        """直接在当前连接上发送一帧（仅由出站发送协程调用）"""
+        if not self.connected or not self.ws:
+            return False
         
         try:
             # 确保数据可以序列化为JSON
@@ -393,16 +546,18 @@ class TerminalWebSocketClient:
             logger.error(f"异常堆栈: {traceback.format_exc()}")
             return False
 
-    async def send_nodes_data(self, nodes_data):
-        """发送节点数据到服务器（主动推送节点配置）"""
-        if not nodes_data:
-            return False
-        message = {
+    def _build_nodes_message(self, nodes_data):
+        return {
             'type': 'nodes_data',
             'nodes': nodes_data,
             'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
         }
-        return await self.send_message(message)
+
+    async def send_nodes_data(self, nodes_data):
+        """发送节点数据到服务器（主动推送节点配置）"""
+        if not nodes_data:
+            return False
+        return await self.send_message(self._build_nodes_message(nodes_data))
 
     async def send_log(self, level, message, source=None):
         """发送日志消息到服务器（主动推送日志）"""
@@ -419,6 +574,20 @@ class TerminalWebSocketClient:
             logger.error(f"发送日志消息失败: {str(e)}")
             return False
 
+    def _build_logs_message(self, logs, dropped=0):
+        return {
+            'type': 'logs_batch',
+            'logs': logs,
+            'dropped': dropped,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+
+    async def send_logs_batch(self, logs, dropped=0):
+        """批量发送日志到服务器"""
+        if not logs:
+            return True
+        return await self.send_message(self._build_logs_message(logs, dropped))
+
     async def heartbeat_loop(self):
         """心跳循环，定期发送心跳消息"""
         while self.connected and self.running:
@@ -492,20 +661,29 @@ class TerminalWebSocketClient:
         finally:
             self.reconnect_task = None
 
-    async def send_system_status(self, status_data):
-        """发送系统状态到服务器（用于系统监控主动推送）"""
-        # 确保有终端ID
-        if 'terminal_id' not in status_data and self.terminal_id:
+    def _build_status_message(self, status_data, delta=False, removed=None):
+        # 确保有终端ID（增量消息不补充，避免把未变化字段混入）
+        if not delta and 'terminal_id' not in status_data and self.terminal_id:
             status_data['terminal_id'] = self.terminal_id
         message = {
             'type': 'system_status',
             'status': status_data,
+            'delta': bool(delta),
             'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
         }
+        if delta and removed:
+            message['removed'] = list(removed)
+        return message
+
+    async def send_system_status(self, status_data, delta=False, removed=None):
+        """发送系统状态到服务器（用于系统监控主动推送）
+
+        delta=True 时 status_data 仅包含变化的字段，removed 为已删除的字段名列表
+        """
         if not self.is_connected():
             logger.warning("WebSocket未连接，无法发送系统状态")
             return False
-        return await self.send_message(message)
+        return await self.send_message(self._build_status_message(status_data, delta, removed))
        
     async def send_status(self, status_data):
-        return await self.send_system_status(status_data)
\ No newline at end of file
+        return await self.send_system_status(status_data)